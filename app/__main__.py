@@ -0,0 +1,6 @@
+import uvicorn
+
+# Entry point for `python -m app`. Image worker processes re-import the main module when they start,
+# except a package's __main__ like this one, so starting here keeps app.main out of every worker.
+if __name__ == "__main__":
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000)
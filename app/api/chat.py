@@ -1,10 +1,12 @@
-import uuid
-import tempfile
-import shutil
-import os
-from fastapi import APIRouter, Form, UploadFile, HTTPException
-from fastapi.responses import HTMLResponse
+import asyncio
+import json
+from fastapi import APIRouter, Form, UploadFile, HTTPException, Request
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+from app.api.uploader import read_limited_image
+from app.config import config
 from app.services.multimodal_chat import GalleryChat
+from app.services.model_registry import model_registry
+from app.services.session_store import SessionStore
 
 router = APIRouter()
 
@@ -12,8 +14,8 @@ router = APIRouter()
 with open("app/templates/chat.html", "r") as f:
     chat_html = f.read()
 
-# Store GalleryChat instances for each session
-sessions = {}
+# Store GalleryChat instances for each session, bounded by idle TTL and session count
+sessions = SessionStore()
 
 @router.get("/chat", response_class=HTMLResponse)
 async def read_root():
@@ -34,22 +36,74 @@ async def start_session():
     """Initialize a new chat session and provide a unique session ID.
 
     This endpoint creates a new GalleryChat instance, associates it with a unique session ID,
-    and stores it in the sessions dictionary.
+    and stores it in the session store.
 
     Returns:
         dict: A JSON response containing the generated `session_id` (str).
 
     Notes:
         - Session IDs are generated using UUID4 for uniqueness.
-        - The session persists in memory until the server restarts or it is explicitly cleared.
+        - The session is dropped after config.SESSION_TTL_SECONDS without use, or earlier if
+          config.MAX_SESSIONS newer sessions are in use.
     """
-    session_id = str(uuid.uuid4())
-    gallery = GalleryChat()
-    sessions[session_id] = gallery
+    session_id = sessions.create(GalleryChat())
     return {"session_id": session_id}
 
+
+@router.get("/sessions/stats")
+async def session_stats(top: int = config.SESSION_STATS_TOP_N):
+    """Report session counts, eviction counters and estimated memory use, overall and for the `top` largest sessions."""
+    return sessions.stats(top=max(0, top))
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Report hit rates and memory use of the caches that let chat turns skip the LLM or the vector store."""
+    return {
+        "response_cache": model_registry.get_response_cache().stats(),
+        "query_result_cache": model_registry.get_gallery_database().result_cache.stats(),
+    }
+
+
+def get_session(session_id):
+    """Returns the live GalleryChat for `session_id`.
+
+    Raises:
+        HTTPException: 410 if the session expired or was evicted, 404 if it never existed.
+    """
+    gallery = sessions.get(session_id)
+    if gallery is not None:
+        return gallery
+    if sessions.was_removed(session_id):
+        raise HTTPException(status_code=410, detail="Session expired")
+    raise HTTPException(status_code=404, detail="Session not found")
+
+async def run_until_disconnected(request: Request, coro):
+    """Runs a chat coroutine, cancelling it if the client goes away before it finishes.
+
+    Args:
+        request (Request): The incoming request, polled for disconnection.
+        coro (Coroutine): The work to run.
+
+    Returns:
+        tuple: (finished, result) where finished is False if the client disconnected.
+    """
+    task = asyncio.create_task(coro)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=config.CLIENT_DISCONNECT_POLL_SECONDS)
+        if done:
+            return True, task.result()
+        if await request.is_disconnected():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            return False, None
+
+
 @router.post("/chat/{session_id}")
-async def chat(session_id: str, text: str = Form(None), image: UploadFile = None):
+async def chat(request: Request, session_id: str, text: str = Form(None), image: UploadFile = None):
     """Process user input (text and/or image) and return the chatbot's response.
 
     This endpoint handles multimodal chat input for a given session, passing text and/or an
@@ -65,36 +119,102 @@ async def chat(session_id: str, text: str = Form(None), image: UploadFile = None
         dict: A JSON response containing:
             - response (str): The chatbot's text response.
             - images (list[str]): URLs of relevant images, adjusted for frontend access.
+            - thumbnails (list[str]): Small derivative of each image in `images`, or the original if none exists.
             - combined_description (str): A combined description of the relevant images.
 
     Raises:
-        HTTPException: If the `session_id` is not found (404 status).
+        HTTPException: If the session expired or was evicted (410 status) or never existed (404 status).
+            Also 415 if the image is not a JPEG or PNG and 413 if it exceeds config.UPLOAD_MAX_FILE_BYTES.
 
     Notes:
-        - Temporary image files are created and deleted after processing.
+        - The turn runs without blocking the event loop and is cancelled, along with its Gemini
+          requests, if the client disconnects (a 499 response is returned in that case).
+        - The uploaded image is kept in memory and never written to disk.
         - Image paths in the response are rewritten to replace '../frontend/' with '../'.
         - Either `text`, `image`, or both must be provided for meaningful interaction.
     """
-    if session_id not in sessions:
-        raise HTTPException(status_code=404, detail="Session not found")
+    gallery = get_session(session_id)
+    # Read once and share the bytes between CLIP preprocessing and the Gemini payload
+    user_image = await read_limited_image(image) if image else None
+
+    finished, result = await run_until_disconnected(
+        request, gallery.chat(user_input=text, user_image=user_image)
+    )
+    if not finished:
+        return Response(status_code=499)  # Client closed request
+    response, image_data = result
+    relevant_paths = image_data["paths"]
+    combined_description = image_data["combined_description"]
 
-    gallery = sessions[session_id]
-    user_image_path = None
+    # urls = [path.replace("../frontend/", "../") for path in relevant_paths]
+    urls = relevant_paths
+    return {
+        "response": response,
+        "images": urls,
+        "thumbnails": chat_thumbnails(urls),
+        "combined_description": combined_description
+    }
 
-    if image:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
-            shutil.copyfileobj(image.file, temp_file)
-            user_image_path = temp_file.name
 
-    try:
-        response, image_data = gallery.chat(user_input=text, user_image=user_image_path)
-        relevant_paths = image_data["paths"]
-        combined_description = image_data["combined_description"]
-    finally:
-        if user_image_path:
-            os.remove(user_image_path)
+def format_sse(event, data):
+    """Encodes one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-    # urls = [path.replace("../frontend/", "../") for path in relevant_paths]
-    urls = relevant_paths
-    return {"response": response, "images": urls, "combined_description": combined_description}
+
+@router.post("/chat/{session_id}/stream")
+async def chat_stream(session_id: str, text: str = Form(None), image: UploadFile = None):
+    """Process user input like `/chat/{session_id}`, streaming the answer as server-sent events.
+
+    Args:
+        session_id (str): The unique identifier for the chat session.
+        text (str, optional): The user's text input. Defaults to None.
+        image (UploadFile, optional): An uploaded image file. Defaults to None.
+
+    Returns:
+        StreamingResponse: A `text/event-stream` with these events, in order:
+            - token: {"text"} pieces of the answer as they arrive from the model.
+            - images: {"response", "images", "thumbnails"} the cleaned answer and its relevant images.
+            - description: {"combined_description"} the summary of those images, when ready.
+            - done: {} once the turn is complete, or error: {"detail"} if it failed.
+
+    Raises:
+        HTTPException: If the session expired or was evicted (410 status) or never existed (404 status).
+            Also 415 if the image is not a JPEG or PNG and 413 if it exceeds config.UPLOAD_MAX_FILE_BYTES.
+
+    Notes:
+        - If the client disconnects the stream is closed, which cancels the in-flight Gemini request
+          and leaves the session history untouched.
+    """
+    gallery = get_session(session_id)
+    user_image = await read_limited_image(image) if image else None
+
+    async def events():
+        try:
+            async for event, data in gallery.stream_chat(user_input=text, user_image=user_image):
+                if event == "images":
+                    data = {
+                        "response": data["response"],
+                        "images": data["paths"],
+                        "thumbnails": chat_thumbnails(data["paths"])
+                    }
+                yield format_sse(event, data)
+        except Exception as e:
+            print(f"Error while streaming chat response: {e}")
+            yield format_sse("error", {"detail": "Failed to generate a response"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def chat_thumbnails(urls):
+    """Maps image URLs to their chat-sized thumbnails, falling back to the original image."""
+    gallery_index = model_registry.get_gallery_index()
+    thumbnails = []
+    for url in urls:
+        record = gallery_index.get_by_path(url)
+        thumbnails.append(record["thumbnails"].get(config.CHAT_THUMBNAIL_WIDTH, url) if record else url)
+    return thumbnails
 
@@ -1,66 +1,131 @@
-from fastapi import APIRouter, Request
+from typing import Optional
+from fastapi import APIRouter, Request, HTTPException, Query
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
-from app.vectrodb_models.data_loader import ChromaDBClient, ChromaDBDataRetriever
-from app.utils.utility import PathRetriever, MapThroughPath
 from app.config import config
+from app.services.model_registry import model_registry
+from app.utils.cache import LRUCache
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/templates")
 
+# Rendered gallery page fragments keyed by (collection version, cursor, limit)
+fragment_cache = LRUCache(maxsize=config.GALLERY_FRAGMENT_CACHE_SIZE)
+
+
+def _parse_cursor(cursor: Optional[str]):
+    """Converts the opaque cursor string from the client into a position in the gallery index."""
+    if cursor in (None, ""):
+        return None
+    try:
+        return int(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _render_page(cursor, limit):
+    """Renders one page of gallery items, reusing the cached fragment while the collection is unchanged.
+
+    Returns:
+        tuple: (html, next_cursor)
+    """
+    gallery_index = model_registry.get_gallery_index()
+    key = (gallery_index.version, cursor, limit)
+    cached = fragment_cache.get(key)
+    if cached is not None:
+        return cached
+    items, next_cursor = gallery_index.page(cursor=cursor, limit=limit)
+    html = templates.get_template("gallery_items.html").render(items=items)
+    fragment_cache.put(key, (html, next_cursor))
+    return html, next_cursor
+
+
 @router.get("/gallery", response_class=HTMLResponse)
 async def gallery(request: Request):
-    get_path = PathRetriever(db_path=config.DEFAULT_DB_PATH, collection_name=config.DEFAULT_COLLECTION_NAME)
-    image_paths = get_path.fetch_image_paths()
-    image_paths = list(reversed(image_paths))  # Reverse order
-    return templates.TemplateResponse("gallery.html", {"request": request, "image_paths": image_paths})
+    """Render the gallery page with the newest page of images.
+
+    Further pages are fetched by gallery.js from `/api/gallery/fragment` as the user scrolls.
+    """
+    items, next_cursor = model_registry.get_gallery_index().page(limit=config.GALLERY_PAGE_SIZE)
+    return templates.TemplateResponse(
+        "gallery.html", {"request": request, "items": items, "next_cursor": next_cursor}
+    )
+
+
+@router.get("/api/gallery")
+async def gallery_page(cursor: Optional[str] = None,
+                       limit: int = Query(config.GALLERY_PAGE_SIZE, ge=1, le=config.GALLERY_MAX_PAGE_SIZE)):
+    """Return one page of gallery images as JSON, newest first.
+
+    Args:
+        cursor (str, optional): `next_cursor` from the previous page. Omit for the first page.
+        limit (int, optional): Page size. Defaults to config.GALLERY_PAGE_SIZE.
+
+    Returns:
+        dict: A JSON response containing:
+            - items (list[dict]): `id` and `image_path` of each image.
+            - next_cursor (str | None): Cursor for the following page, or None on the last page.
+            - version (int): Collection version the page was read from.
+
+    Raises:
+        HTTPException: If the cursor is malformed (400 status).
+    """
+    gallery_index = model_registry.get_gallery_index()
+    items, next_cursor = gallery_index.page(cursor=_parse_cursor(cursor), limit=limit)
+    return {
+        "items": [{"id": item["id"], "image_path": item["image_path"]} for item in items],
+        "next_cursor": str(next_cursor) if next_cursor is not None else None,
+        "version": gallery_index.version,
+    }
+
+
+@router.get("/api/gallery/fragment", response_class=HTMLResponse)
+async def gallery_fragment(cursor: Optional[str] = None,
+                           limit: int = Query(config.GALLERY_PAGE_SIZE, ge=1, le=config.GALLERY_MAX_PAGE_SIZE)):
+    """Return one page of gallery items as a rendered HTML fragment for infinite scrolling.
+
+    The cursor of the following page is returned in the `X-Next-Cursor` header (empty on the last page).
+    """
+    html, next_cursor = _render_page(_parse_cursor(cursor), limit)
+    return HTMLResponse(html, headers={"X-Next-Cursor": str(next_cursor) if next_cursor is not None else ""})
+
 
 @router.get("/image-viewer", response_class=HTMLResponse)
 async def image_viewer(request: Request, image: str = None):
 
-    """Render the gallery page displaying a list of image paths.
+    """Render the image viewer page for a single image.
 
-        This endpoint retrieves image paths from a ChromaDB collection, reverses their order,
-        and renders them in an HTML template.
+        This endpoint looks the image up in the process-wide gallery read model and renders its
+        description and metadata in an HTML template.
 
         Args:
             request (Request): The incoming HTTP request object provided by FastAPI.
             image: Path to the image to be displayed.
 
         Returns:
-            TemplateResponse: A rendered HTML response using the 'gallery.html' template,
-                              containing the request object and a list of image paths.
+            TemplateResponse: A rendered HTML response using the 'image-viewer.html' template,
+                              containing the image path, description, tags, color palette and objects.
+
+        Raises:
+            HTTPException: If the image is not in the gallery (404 status).
 
         Notes:
-            - Image paths are fetched from the 'image_embeddings2' collection in the './db' directory.
-            - The paths are reversed to display the most recent images first.
-            - Templates are loaded from '../frontend/templates'.
+            - The lookup is a dictionary access; no embeddings are loaded.
+            - Templates are loaded from 'app/templates'.
         """
 
-    db_client = ChromaDBClient(persist_directory=config.DEFAULT_DB_PATH)
-    data_retriever = ChromaDBDataRetriever(
-        client=db_client,
-        collection_name=config.DEFAULT_COLLECTION_NAME,
-        include_embeddings=True,
-        include_metadatas=True,
-        include_documents=True
-    )
-    data = data_retriever.get_all_data()
-    map_through_path = MapThroughPath(data)
-    formatted_data = map_through_path.transform()
-    descriptions = formatted_data[image]["document"]
-    tags = formatted_data[image]["tags"]
-    color_palette = formatted_data[image]["color_palette"]
-    detected_objects = formatted_data[image]["detected_objects"]
+    record = model_registry.get_gallery_index().get_by_path(image)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Image not found")
     return templates.TemplateResponse(
         "image-viewer.html",
         {
             "request": request,
             "image_path": image,
-            "description": descriptions,
-            "tags": tags,
-            "color_palette": color_palette,
-            "detected_objects": detected_objects
+            "preview_path": record["preview"],
+            "description": record["document"],
+            "tags": record["tags"],
+            "color_palette": record["color_palette"],
+            "detected_objects": record["detected_objects"]
         }
     )
-
@@ -1,54 +1,174 @@
-from fastapi import APIRouter, Request, File, UploadFile, BackgroundTasks
+import hashlib
+import os
+from fastapi import APIRouter, Request, File, UploadFile, HTTPException
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 from typing import List
-from app.vectrodb_models.vectordb import ChromaDatabase
 from app.config import config
+from app.services.ingest_queue import PRIORITY_BACKFILL
+from app.services.model_registry import model_registry
+from app.utils.paths import list_image_files
+from app.utils.uploads import publish_upload, sniff_image_type, staged_upload_path, target_filename
 
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/templates")
 
+# Kept relative: the stored image_path must stay in the "app/static/..." form the frontend rewrites
+UPLOAD_DIR = "app/static/image_data"
 
-def process_images_background(directory: str):
-    """Process and store images in ChromaDB as a background task.
 
-    This function initializes a ChromaDatabase instance and stores images from the specified
-    directory into the 'image_embeddings2' collection. Errors are logged to the console.
+@router.get("/uploader", response_class=HTMLResponse)
+async def uploader(request: Request):
+    return templates.TemplateResponse("uploader.html", {"request": request})
+
+
+async def read_limited_image(file: UploadFile, max_bytes: int = config.UPLOAD_MAX_FILE_BYTES):
+    """Reads an uploaded image into memory in chunks, applying the same checks as `/upload`.
 
     Args:
-        directory (str): The path to the directory containing images to process.
+        file (UploadFile): The uploaded file.
+        max_bytes (int, optional): Size limit. Defaults to config.UPLOAD_MAX_FILE_BYTES.
+
+    Returns:
+        bytes: The file contents.
 
-    Notes:
-        - The ChromaDatabase persists data in './db'.
-        - Errors during processing are printed to the console but do not raise exceptions
-          to the caller, as this runs in the background.
+    Raises:
+        HTTPException: 415 for content that is not a JPEG or PNG, 413 when `max_bytes` is exceeded.
     """
-    try:
-        db = ChromaDatabase(collection_name=config.DEFAULT_COLLECTION_NAME, persist_directory=config.DEFAULT_DB_PATH)
-        db.store_images_in_chroma(directory)
-    except Exception as e:
-        print(f"Error processing images: {str(e)}")
+    chunks = []
+    size = 0
+    while chunk := await file.read(config.UPLOAD_CHUNK_SIZE):
+        if not chunks and sniff_image_type(chunk) is None:
+            raise HTTPException(status_code=415, detail=f"{file.filename} is not a JPEG or PNG image")
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"{file.filename} exceeds the upload file size limit")
+        chunks.append(chunk)
+    if not chunks:
+        raise HTTPException(status_code=415, detail=f"{file.filename} is empty")
+    return b"".join(chunks)
 
 
-@router.get("/uploader", response_class=HTMLResponse)
-async def uploader(request: Request):
-    return templates.TemplateResponse("uploader.html", {"request": request})
+async def stage_upload(file: UploadFile, directory: str, max_bytes: int, request_limited: bool):
+    """Streams one upload to a hidden temporary file in `directory`, hashing it on the way.
+
+    Only one chunk is held in memory at a time. The file is rejected as soon as its first chunk
+    is not a JPEG or PNG, or as soon as it grows past `max_bytes`.
+
+    Args:
+        file (UploadFile): The uploaded file.
+        directory (str): Directory the file will be stored in; staging there keeps the final rename atomic.
+        max_bytes (int): Bytes this file may still use.
+        request_limited (bool): Whether `max_bytes` comes from the per-request rather than the per-file limit.
+
+    Returns:
+        dict: tmp_path, filename, sha256 and size of the staged file.
+
+    Raises:
+        HTTPException: 415 for unsupported content, 413 when a size limit is exceeded.
+    """
+    tmp_path = staged_upload_path(directory)
+    digest = hashlib.sha256()
+    size = 0
+    extension = None
+    try:
+        with open(tmp_path, "wb") as buffer:
+            while chunk := await file.read(config.UPLOAD_CHUNK_SIZE):
+                if extension is None:
+                    extension = sniff_image_type(chunk)
+                    if extension is None:
+                        raise HTTPException(status_code=415, detail=f"{file.filename} is not a JPEG or PNG image")
+                size += len(chunk)
+                if size > max_bytes:
+                    limit = "request" if request_limited else "file"
+                    raise HTTPException(status_code=413, detail=f"{file.filename} exceeds the upload {limit} size limit")
+                digest.update(chunk)
+                await run_in_threadpool(buffer.write, chunk)
+        if extension is None:
+            raise HTTPException(status_code=415, detail=f"{file.filename} is empty")
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return {
+        "tmp_path": tmp_path,
+        "filename": target_filename(file.filename, extension),
+        "sha256": digest.hexdigest(),
+        "size": size,
+    }
 
 
 @router.post("/upload")
-async def upload_files(background_tasks: BackgroundTasks, files: List[UploadFile] = File(...)):
+async def upload_files(request: Request, files: List[UploadFile] = File(...)):
     """
     Handle multiple image uploads and save them to the static/images directory.
+
+    Each file is streamed to disk in chunks while its SHA-256 is computed, so memory use stays
+    constant regardless of file size. Files must be JPEG or PNG (checked from their content) and
+    stay within config.UPLOAD_MAX_FILE_BYTES each and config.UPLOAD_MAX_REQUEST_BYTES in total.
+    Nothing is published unless every file is accepted: files are staged under temporary names and
+    atomically linked into the image store at the end. A file whose name is taken by an image with
+    different content is stored under its name plus the start of its SHA-256, as reported in "files".
+
+    The stored files are queued for ingest as one job; poll `/jobs/{job_id}` for its progress.
     """
-    for file in files:
-        upload_path = f"app/static/image_data/{file.filename}"
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > config.UPLOAD_MAX_REQUEST_BYTES:
+        raise HTTPException(status_code=413, detail="Upload exceeds the request size limit")
+
+    upload_dir = UPLOAD_DIR
+    staged = []
+    try:
+        remaining = config.UPLOAD_MAX_REQUEST_BYTES
+        for file in files:
+            max_bytes = min(config.UPLOAD_MAX_FILE_BYTES, remaining)
+            staged_file = await stage_upload(file, upload_dir, max_bytes, max_bytes < config.UPLOAD_MAX_FILE_BYTES)
+            staged.append(staged_file)
+            remaining -= staged_file["size"]
+    except BaseException:
+        for staged_file in staged:
+            os.remove(staged_file["tmp_path"])
+        raise
+
+    try:
+        for staged_file in staged:
+            staged_file["filename"] = await run_in_threadpool(
+                publish_upload, staged_file["tmp_path"], upload_dir, staged_file["filename"], staged_file["sha256"]
+            )
+    finally:
+        for staged_file in staged:
+            if os.path.exists(staged_file["tmp_path"]):
+                os.remove(staged_file["tmp_path"])
+
+    image_paths = [os.path.join(upload_dir, staged_file["filename"]) for staged_file in staged]
+    job_id = await run_in_threadpool(model_registry.get_ingest_queue().enqueue, image_paths)
+    model_registry.get_ingest_worker().notify()
+    return {
+        "message": f"{len(files)} files successfully uploaded!",
+        "job_id": job_id,
+        "files": [
+            {"filename": staged_file["filename"], "sha256": staged_file["sha256"], "size": staged_file["size"]}
+            for staged_file in staged
+        ],
+    }
+
 
-        with open(upload_path, "wb") as buffer:
-            buffer.write(await file.read())
+@router.post("/jobs/backfill")
+async def backfill():
+    """Queue every image in the image store that is not in the collection yet, behind pending uploads."""
+    image_paths = list_image_files(UPLOAD_DIR)
+    job_id = await run_in_threadpool(
+        model_registry.get_ingest_queue().enqueue, image_paths, "backfill", PRIORITY_BACKFILL
+    )
+    model_registry.get_ingest_worker().notify()
+    return {"message": f"{len(image_paths)} images queued for ingest.", "job_id": job_id}
 
-    upload_dir = "app/static/image_data"
-    # upload_dir = "app/static/image_data"
-    background_tasks.add_task(process_images_background, upload_dir)
-    return {"message": f"{len(files)} files successfully uploaded!"}
 
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: int):
+    """Report the progress of an ingest job: item counts by state, overall status and per-image errors."""
+    job = await run_in_threadpool(model_registry.get_ingest_queue().job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -12,18 +12,101 @@ env_path = os.path.normpath(env_path)
 image_data_path = os.path.join(current_dir, "..", "static", "image_data")
 image_data_path = os.path.normpath(image_data_path)
 
+thumbnail_path = os.path.join(current_dir, "..", "static", "thumbnails")
+thumbnail_path = os.path.normpath(thumbnail_path)
+
+cache_path = os.path.join(current_dir, "..", "cache")
+cache_path = os.path.normpath(cache_path)
+
 
 DEFAULT_DB_PATH = database_path
 DEFAULT_COLLECTION_NAME = "image_embeddings2"
 ENV_FILE_PATH = env_path
 IMAGE_DATA_FILE_PATH = image_data_path
-
+CACHE_DIR_PATH = cache_path
+THUMBNAIL_DIR_PATH = thumbnail_path
+THUMBNAIL_URL_DIR = "thumbnails"  # Sub-directory of /static the derivatives are served from
+
+
+
+# CLIP embedding settings
+CLIP_MODEL_NAME = "openai/clip-vit-base-patch32"
+EMBEDDING_BATCH_SIZE = 32  # Images per CLIP forward pass during ingestion
+EMBEDDING_NUM_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # Decode/preprocess processes; 0 or 1 runs inline
+QUERY_BATCH_MAX_SIZE = 32  # Max concurrent query embeddings combined into one forward pass
+QUERY_BATCH_MAX_WAIT_MS = 5  # How long the first query waits for others before the batch runs
+TEXT_EMBEDDING_CACHE_SIZE = 10000  # Distinct normalized queries kept in the text embedding cache
+TEXT_EMBEDDING_CACHE_PATH = os.path.join(CACHE_DIR_PATH, "text_embeddings.npz")  # None keeps it in memory only
+# CLIP inference backend: "torch" (fp32), "torch-int8" (dynamic int8 quantization, CPU) or "onnx" (ONNX Runtime, CPU)
+CLIP_INFERENCE_BACKEND = "torch"
+CLIP_ONNX_DIR = os.path.join(CACHE_DIR_PATH, "clip_onnx")  # Exported graphs, created on first use
+CLIP_AGREEMENT_SAMPLE_SIZE = 32  # Gallery images compared against fp32 by the backend agreement check
+CLIP_AGREEMENT_SAMPLE_TEXTS = [
+    "a dog playing on the beach", "a city street at night", "a plate of food on a table",
+    "people hiking in the mountains", "a red car parked outside", "a cat sleeping on a sofa",
+    "a sunset over the ocean", "children playing in a park",
+]
+
+
+# Vector search backend: "chroma" queries the collection, "numpy" a memory-mapped matrix next to it
+VECTOR_BACKEND = "chroma"
+VECTOR_INDEX_DTYPE = "float16"  # Storage type of the memory-mapped embedding matrix
+VECTOR_INDEX_BLOCK_ROWS = 65536  # Rows scored at once; bounds the working memory of a query
+VECTOR_INDEX_MIN_CAPACITY = 1024  # Rows preallocated when the matrix file is created or grown
+VECTOR_EXCLUSION_OVERFETCH = 200  # Extra Chroma results first requested to make up for excluded images
+
+
+# Upload limits; files are streamed to disk in chunks so memory use does not depend on file size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_MAX_FILE_BYTES = 50 * 1024 * 1024
+UPLOAD_MAX_REQUEST_BYTES = 500 * 1024 * 1024
+UPLOAD_STALE_PART_SECONDS = 60 * 60  # Staged uploads older than this are removed at startup
+
+
+# Ingest job queue, drained by a single background worker
+INGEST_QUEUE_PATH = os.path.join(DEFAULT_DB_PATH, "ingest_queue.sqlite3")
+INGEST_BATCH_SIZE = EMBEDDING_BATCH_SIZE  # Items claimed and processed together
+INGEST_MAX_ATTEMPTS = 3  # Attempts before an image is reported as failed
+INGEST_POLL_SECONDS = 5  # Idle interval for picking up jobs enqueued by other processes
+CHROMA_WRITE_BATCH_SIZE = 256  # Finished records written to Chroma per bulk upsert
+CHROMA_WRITE_MAX_DELAY_SECONDS = 5  # Longest a finished record waits in the write buffer
+
+
+# Thumbnail / responsive derivative settings
+THUMBNAIL_WIDTHS = (320, 640, 1280)
+THUMBNAIL_FORMAT = "WEBP"  # "WEBP" or "JPEG"
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_NUM_WORKERS = 2
+GALLERY_THUMBNAIL_WIDTH = 640  # Grid tiles
+VIEWER_THUMBNAIL_WIDTH = 1280  # Image viewer page
+CHAT_THUMBNAIL_WIDTH = 320  # Chat result strip
+
+
+# Gallery pagination
+GALLERY_PAGE_SIZE = 30
+GALLERY_MAX_PAGE_SIZE = 100
+GALLERY_FRAGMENT_CACHE_SIZE = 256  # Rendered gallery page fragments kept in memory
 
 
 # API and model settings
 DEFAULT_MODEL_NAME = "gemini-2.0-flash"
 API_KEY_ENV_VAR = "GEMINI_API_KEY"
 
+# Gemini rate limiting (shared by ingest and chat)
+GEMINI_REQUESTS_PER_MINUTE = 15
+GEMINI_TOKENS_PER_MINUTE = 1_000_000
+GEMINI_MAX_CONCURRENCY = 8  # Requests in flight at once
+GEMINI_MAX_RETRIES = 5  # Retries on 429/5xx responses
+GEMINI_BACKOFF_BASE_SECONDS = 1.0
+GEMINI_BACKOFF_MAX_SECONDS = 30.0
+GEMINI_IMAGE_TOKEN_ESTIMATE = 258  # Prompt tokens Gemini charges per inline image
+
+# Images sent to Gemini are downscaled and re-encoded; payloads are cached by content hash
+GEMINI_IMAGE_MAX_DIMENSION = 1024  # Longest side in pixels
+GEMINI_IMAGE_FORMAT = "JPEG"  # Images with transparency are sent as PNG instead
+GEMINI_IMAGE_QUALITY = 85
+GEMINI_IMAGE_CACHE_SIZE = 128
+
 # System message for ChatSession
 SYSTEM_MESSAGE = """You are an AI assistant for an image gallery, designed to help users explore and understand images with precision and adaptability. Follow these guidelines to respond conversationally and accurately:
 
@@ -71,6 +154,9 @@ THIS_IMAGE_PHRASES = ["this image", "this"]
 # Keywords for detecting image-related queries
 IMAGE_RELATED_KEYWORDS = ["image", "picture", "photo", "gallery", "show me", "similar", "describe"]
 
+# Words introducing terms the user wants excluded, e.g. "dogs but not cats", "no people"
+NEGATION_KEYWORDS = ["but not", "not", "no", "without", "except", "excluding", "exclude"]
+
 # General query prompt
 GENERAL_QUERY_PROMPT = (
     "Provide a short, factual, and conversational response (1-2 sentences, 100-150 characters total) to the question: '{query}'. "
@@ -102,9 +188,42 @@ DATA_FORMAT_TEMPLATE = (
     "- Description: {doc}\n  Tags: {tags}\n  Color Palette: {palette}"
 )
 
+# Images retrieved per gallery query
+RETRIEVAL_TOP_K = 5
+
+# Retrieval results cached per quantized query embedding; invalidated by every ingest write
+QUERY_RESULT_CACHE_SIZE = 2048
+
+# Hybrid retrieval: BM25 over descriptions/tags/objects/colors fused with CLIP ranks
+HYBRID_RETRIEVAL = True
+HYBRID_CANDIDATES = 20  # Candidates taken from each ranking before fusion
+RRF_K = 60  # Reciprocal rank fusion constant; larger values flatten the rank weights
+BM25_K1 = 1.2
+BM25_B = 0.75
+
 # History settings
 MAX_HISTORY_SIZE = 6
-DEFAULT_DELAY = 2
+
+# Response cache shared by all sessions, keyed by the normalized question text
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_SIZE = 1000
+RESPONSE_CACHE_TTL_SECONDS = 60 * 60
+# Questions containing these words refer to the user or the conversation and are never cached
+PERSONALIZED_QUERY_MARKERS = ["my", "mine", "myself", "our", "ours", "previous", "earlier", "above", "again",
+                              "those", "them", "said"]
+
+# Chat session store settings
+SESSION_TTL_SECONDS = 60 * 60  # Sessions idle for longer than this are dropped
+MAX_SESSIONS = 1000  # Least recently used sessions are evicted beyond this count
+SESSION_TOMBSTONE_CACHE_SIZE = 10000  # Evicted session ids remembered so clients get 410 instead of 404
+SESSION_STATS_TOP_N = 20  # Largest sessions listed individually by GET /sessions/stats
+
+# Async chat settings
+CHAT_EXECUTOR_WORKERS = 8  # Threads for blocking work (Chroma queries, file reads) during chat turns
+CLIENT_DISCONNECT_POLL_SECONDS = 0.5  # How often a running chat turn checks whether the client left
+
+# Image descriptions reused by the chat summary stage, keyed by image id
+DESCRIPTION_CACHE_SIZE = 5000
 
 # Prompt for image description
 IMAGE_DESCRIPTION_PROMPT = """
@@ -138,6 +257,19 @@ Analyze the provided image and generate professional metadata in the following s
 
 IMAGE_ANALYSIS_HUMAN_TEXT = "Analyze this image:"
 
+# Prompt for the single-call ingest mode (description and metadata in one structured response)
+IMAGE_DESCRIPTION_AND_ANALYSIS_SYSTEM_PROMPT = (
+    "Analyze the provided image and return both a description and professional metadata in one response. "
+    "Provide everything in {language}.\n\n"
+    "For the description field, follow these instructions:\n"
+    + IMAGE_DESCRIPTION_PROMPT
+    + "\nFor the remaining fields, give the detected objects, color palette, potential use cases, and tags.\n"
+    "'{format_instructions}'\n"
+)
+
+# Ingest asks Gemini for description and metadata in a single call; falls back to two calls if parsing fails
+INGEST_SINGLE_CALL = True
+
 # Error messages (optional, added for consistency with previous examples)
 ERROR_ENCODING_IMAGE = "Error encoding image: {e}"
 
@@ -1,4 +1,5 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
@@ -8,17 +9,32 @@ import uvicorn
 # Import routers
 from app.api.home import router as home_router
 from app.api.gallery import router as gallery_router
-from app.api.uploader import router as uploader_router
+from app.api.uploader import UPLOAD_DIR, router as uploader_router
 from app.api.chat import router as chat_router
 
 from app.config import config
+from app.services.model_registry import model_registry
+from app.utils.uploads import sweep_staged_uploads
 
 # Ensure static/images directory exists
 if not os.path.exists(config.IMAGE_DATA_FILE_PATH):
     os.makedirs(config.IMAGE_DATA_FILE_PATH)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load the shared models once at startup so every chat session reuses them, and start the ingest worker."""
+    removed = sweep_staged_uploads(UPLOAD_DIR, config.UPLOAD_STALE_PART_SECONDS)
+    if removed:
+        print(f"Removed {removed} interrupted uploads.")
+    model_registry.warm_up()
+    model_registry.get_ingest_worker()
+    yield
+    model_registry.shutdown()
+
+
 # Create the FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Set up templates and static files
 templates = Jinja2Templates(directory="app/templates")
@@ -31,4 +47,5 @@ app.include_router(uploader_router)
 app.include_router(chat_router)
 
 if __name__ == "__main__":
+    # Prefer `python -m app`: image worker processes re-import the main module, and this one is heavy
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000)
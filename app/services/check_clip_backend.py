@@ -0,0 +1,9 @@
+import json
+from app.config import config
+from app.services.embeddings import CLIPEmbedding
+
+
+# Compare the configured CLIP inference backend with the fp32 model on a sample of the gallery
+print(f"Checking CLIP backend {config.CLIP_INFERENCE_BACKEND} against fp32...")
+clip = CLIPEmbedding()
+print(json.dumps(clip.check_backend_agreement(), indent=2))
@@ -0,0 +1,204 @@
+import copy
+import os
+import re
+import numpy as np
+import torch
+from app.config import config
+
+BACKENDS = ("torch", "torch-int8", "onnx")
+
+
+class TorchCLIPBackend:
+    """Runs the CLIP towers with the PyTorch model as loaded (fp32).
+
+    Attributes:
+        model (CLIPModel): The model used for the forward passes.
+        device (str): Device the model lives on.
+    """
+
+    name = "torch"
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
+
+    def image_features(self, pixel_values):
+        """Returns the unnormalized (N, D) image features of a (N, 3, H, W) float32 array."""
+        pixel_tensor = torch.from_numpy(np.ascontiguousarray(pixel_values)).to(self.device)
+        with torch.inference_mode():
+            return self.model.get_image_features(pixel_values=pixel_tensor).float().cpu().numpy()
+
+    def text_features(self, input_ids, attention_mask):
+        """Returns the unnormalized (N, D) text features of tokenized (N, L) int64 arrays."""
+        with torch.inference_mode():
+            features = self.model.get_text_features(
+                input_ids=torch.from_numpy(input_ids.astype(np.int64)).to(self.device),
+                attention_mask=torch.from_numpy(attention_mask.astype(np.int64)).to(self.device),
+            )
+        return features.float().cpu().numpy()
+
+
+class QuantizedTorchCLIPBackend(TorchCLIPBackend):
+    """Runs both towers on CPU with int8 dynamically quantized Linear layers.
+
+    Weights are quantized once at load time and activations per batch, so no calibration data is
+    needed. The attention and MLP projections dominate CLIP's CPU time and are all Linear layers.
+    """
+
+    name = "torch-int8"
+
+    def __init__(self, model, device):
+        if device != "cpu":
+            print(f"CLIP backend torch-int8 only runs on CPU; ignoring device {device}.")
+        quantized = torch.quantization.quantize_dynamic(
+            copy.deepcopy(model).cpu(), {torch.nn.Linear}, dtype=torch.qint8
+        )
+        super().__init__(quantized.eval(), "cpu")
+
+
+class _VisionTower(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        return self.model.get_image_features(pixel_values=pixel_values)
+
+
+class _TextTower(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+
+
+class OnnxCLIPBackend:
+    """Runs both towers as ONNX Runtime graphs on CPU.
+
+    The graphs are exported from the PyTorch model the first time they are needed and reused from
+    `directory` afterwards, with dynamic batch (and text length) axes so one graph serves every
+    batch size.
+
+    Attributes:
+        directory (str): Where the exported `vision.onnx` and `text.onnx` are kept.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model, device, directory=None, image_size=224):
+        """Exports the graphs if needed and opens one inference session per tower.
+
+        Args:
+            model (CLIPModel): The fp32 model to export.
+            device (str): Ignored; ONNX Runtime runs on CPU.
+            directory (str, optional): Export location. Defaults to a per-model folder under config.CLIP_ONNX_DIR.
+            image_size (int, optional): Side length of the vision input. Defaults to 224.
+        """
+        import onnxruntime
+
+        self.directory = directory or os.path.join(
+            config.CLIP_ONNX_DIR, re.sub(r"[^\w.-]", "_", config.CLIP_MODEL_NAME)
+        )
+        vision_path = os.path.join(self.directory, "vision.onnx")
+        text_path = os.path.join(self.directory, "text.onnx")
+        if not (os.path.exists(vision_path) and os.path.exists(text_path)):
+            self._export(model.cpu().eval(), vision_path, text_path, image_size)
+        providers = ["CPUExecutionProvider"]
+        self._vision = onnxruntime.InferenceSession(vision_path, providers=providers)
+        self._text = onnxruntime.InferenceSession(text_path, providers=providers)
+
+    @staticmethod
+    def _export(model, vision_path, text_path, image_size):
+        print("Exporting CLIP to ONNX...")
+        os.makedirs(os.path.dirname(vision_path), exist_ok=True)
+        pixel_values = torch.zeros(1, 3, image_size, image_size)
+        input_ids = torch.ones(1, 8, dtype=torch.long)
+        attention_mask = torch.ones(1, 8, dtype=torch.long)
+        exports = (
+            (_VisionTower(model), (pixel_values,), vision_path, ["pixel_values"],
+             {"pixel_values": {0: "batch"}, "features": {0: "batch"}}),
+            (_TextTower(model), (input_ids, attention_mask), text_path, ["input_ids", "attention_mask"],
+             {"input_ids": {0: "batch", 1: "length"}, "attention_mask": {0: "batch", 1: "length"},
+              "features": {0: "batch"}}),
+        )
+        # Each graph is written under a temporary name first so an interrupted export is never loaded
+        for tower, args, path, input_names, dynamic_axes in exports:
+            tmp_path = path + ".tmp"
+            with torch.no_grad():
+                torch.onnx.export(
+                    tower, args, tmp_path, input_names=input_names, output_names=["features"],
+                    dynamic_axes=dynamic_axes, opset_version=17
+                )
+            os.replace(tmp_path, path)
+
+    def image_features(self, pixel_values):
+        """Returns the unnormalized (N, D) image features of a (N, 3, H, W) float32 array."""
+        pixel_values = np.ascontiguousarray(pixel_values, dtype=np.float32)
+        return self._vision.run(None, {"pixel_values": pixel_values})[0]
+
+    def text_features(self, input_ids, attention_mask):
+        """Returns the unnormalized (N, D) text features of tokenized (N, L) int64 arrays."""
+        return self._text.run(None, {
+            "input_ids": input_ids.astype(np.int64), "attention_mask": attention_mask.astype(np.int64)
+        })[0]
+
+
+def create_clip_backend(name, model, device, image_size=224):
+    """Builds the inference backend selected by `name`.
+
+    Args:
+        name (str): One of BACKENDS.
+        model (CLIPModel): The loaded fp32 model.
+        device (str): Device the model lives on.
+        image_size (int, optional): Side length of the vision input. Defaults to 224.
+
+    Returns:
+        TorchCLIPBackend | QuantizedTorchCLIPBackend | OnnxCLIPBackend: The backend.
+    """
+    if name == "torch":
+        return TorchCLIPBackend(model, device)
+    if name == "torch-int8":
+        return QuantizedTorchCLIPBackend(model, device)
+    if name == "onnx":
+        return OnnxCLIPBackend(model, device, image_size=image_size)
+    raise ValueError(f"Unknown CLIP_INFERENCE_BACKEND: {name} (expected one of {', '.join(BACKENDS)})")
+
+
+def _row_cosines(reference, candidate):
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    return np.sum(reference * candidate, axis=1)
+
+
+def _summarize(cosines):
+    return {
+        "samples": int(len(cosines)),
+        "mean_cosine": float(np.mean(cosines)),
+        "min_cosine": float(np.min(cosines)),
+    }
+
+
+def agreement_report(reference, candidate, pixel_values=None, text_inputs=None):
+    """Compares the embeddings of two backends on the same inputs.
+
+    Args:
+        reference (TorchCLIPBackend): The fp32 backend taken as ground truth.
+        candidate: The backend under test.
+        pixel_values (numpy.ndarray, optional): Preprocessed images of shape (N, 3, H, W).
+        text_inputs (dict, optional): Tokenized texts with "input_ids" and "attention_mask" arrays.
+
+    Returns:
+        dict: Per modality, the number of samples and the mean and minimum cosine similarity
+        between the two backends' embeddings of the same input.
+    """
+    report = {"backend": candidate.name}
+    if pixel_values is not None and len(pixel_values):
+        report["image"] = _summarize(_row_cosines(
+            reference.image_features(pixel_values), candidate.image_features(pixel_values)
+        ))
+    if text_inputs is not None:
+        args = (text_inputs["input_ids"], text_inputs["attention_mask"])
+        report["text"] = _summarize(_row_cosines(reference.text_features(*args), candidate.text_features(*args)))
+    return report
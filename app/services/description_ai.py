@@ -1,12 +1,10 @@
-import time
-from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
 from langchain_core.messages import HumanMessage
-import base64
 
-from app.config.secrets import gemini_api_key
+from app.services.image_payload import image_data_url
+from app.services.model_registry import model_registry
 from app.config.config import (
     DEFAULT_MODEL_NAME,
-    DEFAULT_DELAY,
     IMAGE_DESCRIPTION_PROMPT,
     ERROR_LOADING_IMAGE,
     FAILED_IMAGE_LOAD,
@@ -14,46 +12,59 @@ from app.config.config import (
 
 
 class GeminiImageDescription:
-    def __init__(self, api_key: str, model_name=DEFAULT_MODEL_NAME, delay=DEFAULT_DELAY):
+    def __init__(self, api_key: str, model_name=DEFAULT_MODEL_NAME):
         self.api_key = api_key
         self.model_name = model_name
-        self.model = ChatGoogleGenerativeAI(model=self.model_name, api_key=gemini_api_key)
-        self.delay = delay
+        self.client = model_registry.get_gemini_client(self.model_name, api_key)
+        self.payload_cache = model_registry.get_image_payload_cache()
 
-    def load_image(self, image_path: str):
-        """Reads and encodes the image from the local path."""
+    def load_image(self, image_source):
+        """Returns a downscaled data URL for an image given as a local path, raw bytes or a binary file object."""
         try:
-            with open(image_path, "rb") as image_file:
-                image_data = base64.b64encode(image_file.read()).decode("utf-8")
-            return image_data
+            return image_data_url(image_source, cache=self.payload_cache)
         except Exception as e:
             print(ERROR_LOADING_IMAGE.format(e=e))
             return None
 
-    def create_message(self, image_data):
+    def create_message(self, image_url):
         """Creates a HumanMessage with the encoded image."""
         return HumanMessage(
             content=[
                 {"type": "text", "text": IMAGE_DESCRIPTION_PROMPT},
                 {
                     "type": "image_url",
-                    "image_url": {"url": f"data:image/jpeg;base64,{image_data}"},
+                    "image_url": {"url": image_url},
                 },
             ],
         )
 
     def invoke_model(self, message):
-        """Invoke the model with the message and return the response."""
-        time.sleep(self.delay)
-        return self.model.invoke([message])
-
-    def get_description(self, image_path: str):
-        """Invokes the model and retrieves the description of the image."""
-        image_data = self.load_image(image_path)
-        if image_data:
-            message = self.create_message(image_data)
+        """Invoke the model with the message and return the response.
+
+        Requests are paced by the shared client's rate limiter rather than a fixed sleep.
+        """
+        return self.client.invoke([message])
+
+    async def ainvoke_model(self, message):
+        """Async variant of `invoke_model` that does not block the caller's event loop."""
+        return await self.client.ainvoke([message])
+
+    def get_description(self, image_source):
+        """Invokes the model and retrieves the description of the image (path, bytes or file object)."""
+        image_url = self.load_image(image_source)
+        if image_url:
+            message = self.create_message(image_url)
             response = self.invoke_model(message)
             return response.content
         else:
             return FAILED_IMAGE_LOAD
 
+    async def aget_description(self, image_source):
+        """Async variant of `get_description`; the image is read and re-encoded on the shared chat executor."""
+        loop = asyncio.get_running_loop()
+        image_url = await loop.run_in_executor(model_registry.get_chat_executor(), self.load_image, image_source)
+        if image_url:
+            response = await self.ainvoke_model(self.create_message(image_url))
+            return response.content
+        else:
+            return FAILED_IMAGE_LOAD
@@ -0,0 +1,135 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from app.config import config
+from app.services.image_preprocessing import preprocess_image
+
+_TEXT = "text"
+_IMAGE = "image"
+_STOP = object()
+
+
+class EmbeddingBatcher:
+    """Dynamic micro-batching server for query embeddings.
+
+    Requests from concurrent chat turns are queued, and a dedicated worker thread collects them for
+    up to `max_wait_ms` (or until `max_batch_size` requests are waiting) before running one batched
+    CLIP forward pass per modality. Torch work therefore never runs on the event loop, and under load
+    many queries share a single pass instead of competing for the same cores.
+
+    Attributes:
+        clip (CLIPEmbedding): The shared CLIP model used for the forward passes.
+        max_batch_size (int): Maximum number of requests combined into one batch.
+        max_wait (float): Maximum time in seconds the first request of a batch waits for company.
+    """
+
+    def __init__(self, clip, max_batch_size=config.QUERY_BATCH_MAX_SIZE, max_wait_ms=config.QUERY_BATCH_MAX_WAIT_MS):
+        """Starts the worker thread.
+
+        Args:
+            clip (CLIPEmbedding): The CLIP model used for the forward passes.
+            max_batch_size (int, optional): Maximum requests per batch. Defaults to config.QUERY_BATCH_MAX_SIZE.
+            max_wait_ms (float, optional): Batching window in milliseconds. Defaults to config.QUERY_BATCH_MAX_WAIT_MS.
+        """
+        self.clip = clip
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="clip-embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit_text(self, text):
+        """Queues a text embedding request.
+
+        Args:
+            text (str): The text to embed.
+
+        Returns:
+            concurrent.futures.Future: Resolves to a 1D unit-length numpy.ndarray.
+        """
+        return self._submit(_TEXT, text)
+
+    def submit_image(self, image_source):
+        """Queues an image embedding request.
+
+        Args:
+            image_source (str | bytes | file-like): Path, encoded bytes or binary file object of the image.
+
+        Returns:
+            concurrent.futures.Future: Resolves to a 1D unit-length numpy.ndarray.
+        """
+        return self._submit(_IMAGE, image_source)
+
+    def _submit(self, kind, payload):
+        future = Future()
+        self._queue.put((kind, payload, future))
+        return future
+
+    def _collect_batch(self, first):
+        """Gathers further requests until the batch is full or the batching window closes."""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = self._collect_batch(item)
+            # Drop requests whose callers already gave up
+            batch = [(kind, payload, future) for kind, payload, future in batch if future.set_running_or_notify_cancel()]
+            self._embed_texts([(payload, future) for kind, payload, future in batch if kind == _TEXT])
+            self._embed_images([(payload, future) for kind, payload, future in batch if kind == _IMAGE])
+
+    def _embed_texts(self, requests):
+        if not requests:
+            return
+        try:
+            embeddings = self.clip.embed_texts([text for text, _ in requests])
+        except Exception as e:
+            for _, future in requests:
+                future.set_exception(e)
+            return
+        for (_, future), embedding in zip(requests, embeddings):
+            future.set_result(embedding)
+
+    def _embed_images(self, requests):
+        if not requests:
+            return
+        pixels, futures = [], []
+        for image_source, future in requests:
+            try:
+                pixels.append(preprocess_image(image_source, size=self.clip.image_size))
+                futures.append(future)
+            except Exception as e:
+                future.set_exception(e)
+        if not pixels:
+            return
+        try:
+            embeddings = self.clip.embed_pixel_values(np.stack(pixels))
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future, embedding in zip(futures, embeddings):
+            future.set_result(embedding)
+
+    def close(self, timeout=None):
+        """Stops the worker after it has drained the requests queued so far."""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
@@ -1,57 +1,309 @@
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+import numpy as np
 import torch
-from PIL import Image
 from transformers import CLIPProcessor, CLIPModel
 import warnings
 from app.config import config
+from app.services.clip_backends import TorchCLIPBackend, agreement_report, create_clip_backend
+from app.services.image_preprocessing import preprocess_image, safe_preprocess_image
+from app.utils.cache import LRUCache
+from app.utils.paths import list_image_files
+from app.utils.processes import worker_context
 
 warnings.filterwarnings("ignore")
 
 
+class TextEmbeddingCache(LRUCache):
+    """
+    LRU cache of CLIP text embeddings keyed by the normalized query text.
+
+    Queries are lower-cased and whitespace-collapsed before lookup, so "Show me  Dogs" and
+    "show me dogs" share an entry. The cache can be saved to and restored from an .npz file so a
+    restarted server starts warm.
+
+    Attributes:
+        path (str): Location of the on-disk snapshot, or None to keep the cache in memory only.
+        model_name (str): CLIP model the embeddings belong to; snapshots of other models are ignored.
+        backend (str): Inference backend that computed them; snapshots of other backends are ignored too,
+            since int8 and ONNX embeddings differ slightly from fp32 ones.
+    """
+
+    def __init__(self, maxsize=config.TEXT_EMBEDDING_CACHE_SIZE, path=config.TEXT_EMBEDDING_CACHE_PATH,
+                 model_name=config.CLIP_MODEL_NAME, backend=config.CLIP_INFERENCE_BACKEND):
+        """
+        Initializes the cache and loads the on-disk snapshot if there is one.
+
+        Args:
+            maxsize (int, optional): Maximum number of cached queries. Defaults to config.TEXT_EMBEDDING_CACHE_SIZE.
+            path (str, optional): Snapshot location. Defaults to config.TEXT_EMBEDDING_CACHE_PATH.
+            model_name (str, optional): CLIP model name. Defaults to config.CLIP_MODEL_NAME.
+            backend (str, optional): Inference backend name. Defaults to config.CLIP_INFERENCE_BACKEND.
+        """
+        super().__init__(maxsize=maxsize)
+        self.path = path
+        self.model_name = model_name
+        self.backend = backend
+        self.load()
+
+    @staticmethod
+    def normalize(text):
+        """Returns the cache key for `text`."""
+        return re.sub(r"\s+", " ", text).strip().lower()
+
+    def get_embedding(self, text):
+        """Returns the cached embedding for `text`, or None."""
+        return self.get(self.normalize(text))
+
+    def put_embedding(self, text, embedding):
+        """Caches `embedding` for `text`. Stored arrays are made read-only as they are shared."""
+        embedding = np.array(embedding, dtype=np.float32)
+        embedding.flags.writeable = False
+        self.put(self.normalize(text), embedding)
+
+    def load(self):
+        """Restores the snapshot at `self.path` if it exists and matches the current model and backend."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as snapshot:
+                if str(snapshot["model_name"]) != self.model_name:
+                    return
+                # Snapshots written before the backend was recorded came from the fp32 torch model
+                backend = str(snapshot["backend"]) if "backend" in snapshot.files else "torch"
+                if backend != self.backend:
+                    return
+                for key, embedding in zip(snapshot["keys"], snapshot["embeddings"]):
+                    self.put_embedding(str(key), embedding)
+        except Exception as e:
+            print(f"Could not load text embedding cache: {e}")
+
+    def save(self):
+        """Writes the current entries to `self.path` atomically."""
+        if not self.path:
+            return
+        entries = self.items()
+        if not entries:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            model_name=np.array(self.model_name),
+            backend=np.array(self.backend),
+            keys=np.array([key for key, _ in entries]),
+            embeddings=np.stack([embedding for _, embedding in entries]),
+        )
+        os.replace(tmp_path, self.path)
+
+
 class CLIPEmbedding:
     """
     A class for generating text and image embeddings using the CLIP model.
     This class provides methods for embedding images and text using CLIP's vision and text encoders,
     which project both into a shared feature space for cross-modal tasks.
 
+    The forward passes go through an inference backend selected by config.CLIP_INFERENCE_BACKEND:
+    the fp32 PyTorch model, an int8 dynamically quantized copy, or exported ONNX Runtime graphs.
+    `check_backend_agreement` reports how closely a faster backend reproduces the fp32 embeddings.
+
     Attributes:
         device (str): The device to run the model on (either "cuda" for GPU or "cpu").
-        clip_model (CLIPModel): The pre-trained CLIP model used for generating embeddings.
+        backend (TorchCLIPBackend | QuantizedTorchCLIPBackend | OnnxCLIPBackend): Runs the text and vision towers.
         clip_processor (CLIPProcessor): The processor for preparing inputs for the CLIP model.
+        image_size (int): Side length of the square pixel input expected by the vision tower.
+        text_cache (TextEmbeddingCache): Optional cache consulted by `embed_text`.
     """
 
-    def __init__(self, device="cuda" if torch.cuda.is_available() else "cpu"):
+    def __init__(self, device="cuda" if torch.cuda.is_available() else "cpu", text_cache=None,
+                 backend=config.CLIP_INFERENCE_BACKEND):
         """
                Initializes the CLIPEmbedding class and loads the CLIP model and processor.
 
                Args:
                    device (str, optional): The device to use for model inference. Defaults to "cuda" if available, otherwise "cpu".
+                   text_cache (TextEmbeddingCache, optional): Cache for text embeddings. Defaults to None.
+                   backend (str, optional): Inference backend name. Defaults to config.CLIP_INFERENCE_BACKEND.
                """
         self.device = device
-        self.clip_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-        self.clip_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+        self.text_cache = text_cache
+        clip_model = CLIPModel.from_pretrained(config.CLIP_MODEL_NAME).to(self.device).eval()
+        self.clip_processor = CLIPProcessor.from_pretrained(config.CLIP_MODEL_NAME)
+        self.image_size = clip_model.config.vision_config.image_size
+        # Other backends keep their own copy of the weights, so the fp32 model is not held on to
+        self.backend = create_clip_backend(backend, clip_model, self.device, self.image_size)
+        self._pool = None
+        self._pool_workers = 0
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self, num_workers):
+        """Returns a long-lived process pool for image decoding, created on first use.
+
+        Workers are never forked from this process, so they do not inherit torch's thread pools
+        (see `worker_context`).
+        """
+        with self._pool_lock:
+            if self._pool is None or self._pool_workers != num_workers:
+                if self._pool is not None:
+                    self._pool.shutdown(wait=False)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=num_workers, mp_context=worker_context()
+                )
+                self._pool_workers = num_workers
+            return self._pool
+
+    def embed_pixel_values(self, pixel_values):
+        """
+        Runs a batch of preprocessed images through the CLIP vision tower.
+
+        Args:
+            pixel_values (numpy.ndarray): Array of shape (N, 3, H, W) produced by `preprocess_image`.
+
+        Returns:
+            numpy.ndarray: A (N, D) array of embeddings, each normalized to unit length.
+        """
+        image_features = self.backend.image_features(pixel_values)
+        return image_features / np.linalg.norm(image_features, axis=-1, keepdims=True)
+
+    def iter_image_embeddings(self, image_paths, batch_size=config.EMBEDDING_BATCH_SIZE,
+                              num_workers=config.EMBEDDING_NUM_WORKERS):
+        """
+        Lazily embeds many images, yielding results in input order.
+
+        Decoding and preprocessing run in a process pool while the main process feeds fixed-size
+        batches to the vision tower, so throughput is bound by the model rather than by PIL. At most
+        `batch_size * num_workers * 2` images are submitted ahead of the model, so memory stays
+        bounded however many paths are passed.
+
+        Args:
+            image_paths (Iterable[str]): Paths of the images to embed.
+            batch_size (int, optional): Images per forward pass. Defaults to config.EMBEDDING_BATCH_SIZE.
+            num_workers (int, optional): Preprocessing processes; 0 or 1 preprocesses inline.
+                Defaults to config.EMBEDDING_NUM_WORKERS.
+
+        Yields:
+            tuple: (image_path, embedding) where embedding is a 1D numpy.ndarray, or None if the
+                image could not be decoded.
+        """
+        image_paths = list(image_paths)
+        preprocess = partial(safe_preprocess_image, size=self.image_size)
+        if num_workers and num_workers > 1 and len(image_paths) > batch_size:
+            pixel_iter = self._iter_pooled(preprocess, image_paths, num_workers, batch_size * num_workers * 2)
+        else:
+            pixel_iter = map(preprocess, image_paths)
+
+        batch_paths, batch_pixels = [], []
+        for image_path, pixels in zip(image_paths, pixel_iter):
+            if pixels is None:
+                yield image_path, None
+                continue
+            batch_paths.append(image_path)
+            batch_pixels.append(pixels)
+            if len(batch_pixels) == batch_size:
+                yield from zip(batch_paths, self.embed_pixel_values(np.stack(batch_pixels)))
+                batch_paths, batch_pixels = [], []
+        if batch_pixels:
+            yield from zip(batch_paths, self.embed_pixel_values(np.stack(batch_pixels)))
+
+    def _iter_pooled(self, preprocess, image_paths, num_workers, max_in_flight):
+        """Yields `preprocess(path)` for every path in order, keeping at most `max_in_flight` submitted."""
+        pool = self._get_pool(num_workers)
+        pending = deque()
+        try:
+            for image_path in image_paths:
+                pending.append(pool.submit(preprocess, image_path))
+                if len(pending) >= max_in_flight:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def close(self):
+        """Shuts down the preprocessing process pool."""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    def embed_images(self, image_paths, batch_size=config.EMBEDDING_BATCH_SIZE,
+                     num_workers=config.EMBEDDING_NUM_WORKERS):
+        """
+        Generates embeddings for many images using batched forward passes.
+
+        Args:
+            image_paths (Iterable[str]): Paths of the images to embed.
+            batch_size (int, optional): Images per forward pass. Defaults to config.EMBEDDING_BATCH_SIZE.
+            num_workers (int, optional): Preprocessing processes. Defaults to config.EMBEDDING_NUM_WORKERS.
+
+        Returns:
+            list: One 1D numpy.ndarray per input path, or None where the image could not be decoded.
+        """
+        return [embedding for _, embedding in self.iter_image_embeddings(image_paths, batch_size, num_workers)]
 
-    def embed_image(self, image_path):
+    def embed_image(self, image_source):
         """
         Generates an embedding for an image by passing it through the CLIP model.
 
         Args:
-            image_path (str): The path to the image file to be embedded.
+            image_source (str | bytes | file-like): Path, encoded bytes or binary file object of the image.
 
         Returns:
             numpy.ndarray: A 1D array representing the image's embedding, normalized to unit length.
         """
-        # Load image
-        image = Image.open(image_path).convert("RGB")
+        # Uses the same preprocessing as batch ingestion so query and stored embeddings match
+        pixels = preprocess_image(image_source, size=self.image_size)
+        return self.embed_pixel_values(pixels[np.newaxis])[0]
+
+    def embed_texts(self, texts):
+        """
+        Generates embeddings for several text queries in a single forward pass.
+
+        Args:
+            texts (list[str]): The text inputs to be embedded.
+
+        Returns:
+            numpy.ndarray: A (N, D) array of text embeddings, each normalized to unit length.
+        """
+        text_inputs = self._tokenize(texts)
+        text_features = self.backend.text_features(text_inputs["input_ids"], text_inputs["attention_mask"])
+        return text_features / np.linalg.norm(text_features, axis=-1, keepdims=True)
+
+    def _tokenize(self, texts):
+        return self.clip_processor(text=list(texts), return_tensors="np", padding=True, truncation=True)
+
+    def check_backend_agreement(self, image_paths=None, texts=None, sample_size=config.CLIP_AGREEMENT_SAMPLE_SIZE):
+        """
+        Reports how closely the current backend reproduces the fp32 PyTorch embeddings.
+
+        A fresh fp32 model is loaded as the reference, so this is meant for an offline check after
+        switching backends, not for the request path.
 
-        # Process the image for CLIP
-        inputs = self.clip_processor(images=image, return_tensors="pt", padding=True)
-        with torch.no_grad():
-            image_embedding = self.clip_model.get_image_features(**inputs)
+        Args:
+            image_paths (list[str], optional): Images to compare. Defaults to the first `sample_size`
+                images in config.IMAGE_DATA_FILE_PATH.
+            texts (list[str], optional): Texts to compare. Defaults to config.CLIP_AGREEMENT_SAMPLE_TEXTS.
+            sample_size (int, optional): Number of gallery images sampled by default. Defaults to config.CLIP_AGREEMENT_SAMPLE_SIZE.
 
-        # Normalize the image embedding to unit length
-        image_embedding = image_embedding / image_embedding.norm(p=2, dim=-1, keepdim=True)
+        Returns:
+            dict: Per modality, the number of samples and the mean and minimum cosine similarity
+            between the fp32 and current embeddings of each input.
+        """
+        if image_paths is None:
+            image_paths = list_image_files(config.IMAGE_DATA_FILE_PATH)[:sample_size]
+        pixels = [safe_preprocess_image(image_path, size=self.image_size) for image_path in image_paths]
+        pixels = [pixel_values for pixel_values in pixels if pixel_values is not None]
+        pixel_values = np.stack(pixels) if pixels else None
 
-        return image_embedding.cpu().numpy().flatten()  # Flatten the embedding to a 1D array
+        reference = TorchCLIPBackend(CLIPModel.from_pretrained(config.CLIP_MODEL_NAME).to(self.device).eval(),
+                                     self.device)
+        return agreement_report(reference, self.backend, pixel_values,
+                                self._tokenize(texts or config.CLIP_AGREEMENT_SAMPLE_TEXTS))
 
     def embed_text(self, query_text: str):
         """
@@ -63,40 +315,92 @@ class CLIPEmbedding:
         Returns:
             numpy.ndarray:: A 1D array representing the text's embedding, normalized to unit length.
         """
-        text_inputs = self.clip_processor(text=[query_text], return_tensors="pt", padding=True).to(self.device)
-        with torch.no_grad():
-            text_features = self.clip_model.get_text_features(**text_inputs)
-        text_features = text_features / text_features.norm(dim=-1, keepdim=True)
-        return text_features.cpu().numpy().flatten()
+        if self.text_cache is not None:
+            cached = self.text_cache.get_embedding(query_text)
+            if cached is not None:
+                return cached
+        text_embedding = self.embed_texts([query_text])[0]
+        if self.text_cache is not None:
+            self.text_cache.put_embedding(query_text, text_embedding)
+        return text_embedding
 
 
 class EmbeddingProcessor:
     """Generates embeddings for text and images using the CLIP model.
 
+    Query embeddings are computed through an EmbeddingBatcher, so concurrent chat turns share
+    batched forward passes instead of competing for the CPU one request at a time. Text embeddings
+    are looked up in the CLIP model's text cache first, including the text half of text+image queries.
+
     Attributes:
         clip (CLIPEmbedding): The CLIP embedding model instance.
+        batcher (EmbeddingBatcher): Micro-batching worker that runs the query forward passes.
     """
 
-    def __init__(self):
-        """Initializes the CLIP embedding model."""
-        self.clip = CLIPEmbedding()
+    def __init__(self, clip=None, batcher=None):
+        """Initializes the processor around a CLIP embedding model.
 
-    def generate_query_embedding(self, text=None, image_path=None):
-        """Generates a query embedding from text, image, or both.
+        Args:
+            clip (CLIPEmbedding, optional): Model to use. Defaults to the process-wide shared instance.
+            batcher (EmbeddingBatcher, optional): Batching worker. Defaults to the process-wide shared instance.
+        """
+        from app.services.model_registry import model_registry
+        self.clip = clip or model_registry.get_clip_embedding()
+        self.batcher = batcher or model_registry.get_embedding_batcher()
+
+    def submit_query_embedding(self, text=None, image=None):
+        """Schedules a query embedding and returns immediately.
 
         Args:
             text (str, optional): Text input for embedding. Defaults to None.
-            image_path (str, optional): Path to the image for embedding. Defaults to None.
+            image (str | bytes, optional): Path or encoded bytes of the image for embedding. Defaults to None.
 
         Returns:
-            numpy.ndarray: The resulting embedding vector.
+            list[concurrent.futures.Future]: One future per modality; average their results.
 
         Raises:
-            ValueError: If neither text nor image_path is provided.
+            ValueError: If neither text nor image is provided.
         """
-        if not text and not image_path:
+        if not text and not image:
             raise ValueError(config.NO_INPUT_ERROR)
-        if image_path and text:
-            return (self.clip.embed_image(image_path) + self.clip.embed_text(text)) / 2
-        return self.clip.embed_image(image_path) if image_path else self.clip.embed_text(text)
+        futures = []
+        if image:
+            futures.append(self.batcher.submit_image(image))
+        if text:
+            futures.append(self._submit_text(text))
+        return futures
+
+    def _submit_text(self, text):
+        """Returns a future for the text embedding, served from the text cache when possible."""
+        text_cache = self.clip.text_cache
+        if text_cache is None:
+            return self.batcher.submit_text(text)
+        cached = text_cache.get_embedding(text)
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            return future
+
+        def store(done):
+            if not done.cancelled() and done.exception() is None:
+                text_cache.put_embedding(text, done.result())
 
+        future = self.batcher.submit_text(text)
+        future.add_done_callback(store)
+        return future
+
+    def generate_query_embedding(self, text=None, image=None):
+        """Generates a query embedding from text, image, or both.
+
+        Args:
+            text (str, optional): Text input for embedding. Defaults to None.
+            image (str | bytes, optional): Path or encoded bytes of the image for embedding. Defaults to None.
+
+        Returns:
+            numpy.ndarray: The resulting embedding vector.
+
+        Raises:
+            ValueError: If neither text nor image is provided.
+        """
+        embeddings = [future.result() for future in self.submit_query_embedding(text, image)]
+        return sum(embeddings) / len(embeddings)
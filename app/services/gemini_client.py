@@ -0,0 +1,247 @@
+import asyncio
+import random
+import threading
+import time
+from app.config import config
+
+# HTTP statuses worth retrying: quota exhaustion and transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRYABLE_ERROR_MARKERS = ("429", "ResourceExhausted", "RESOURCE_EXHAUSTED", "ServiceUnavailable", "UNAVAILABLE",
+                           "InternalServerError", "DeadlineExceeded")
+# Sentinel put on a stream's queue once the underlying request has finished
+_STREAM_END = object()
+
+
+def is_retryable_error(error):
+    """Checks whether a Gemini error is a rate-limit or transient server error.
+
+    Args:
+        error (Exception): The exception raised by the model call.
+
+    Returns:
+        bool: True if the request should be retried after a backoff.
+    """
+    code = getattr(error, "code", None)  # google.api_core exceptions carry the HTTP status here
+    if isinstance(code, int) and code in RETRYABLE_STATUS_CODES:
+        return True
+    if error.__cause__ is not None and error.__cause__ is not error:
+        return is_retryable_error(error.__cause__)
+    message = str(error)
+    return any(marker in message for marker in RETRYABLE_ERROR_MARKERS)
+
+
+def estimate_tokens(messages):
+    """Roughly estimates the prompt tokens of a list of chat messages.
+
+    Text is counted at ~4 characters per token and every inline image at Gemini's fixed image cost.
+
+    Args:
+        messages (list[BaseMessage]): The messages that will be sent.
+
+    Returns:
+        int: Estimated number of prompt tokens.
+    """
+    tokens = 0
+    for message in messages:
+        content = message.content
+        parts = [content] if isinstance(content, str) else content
+        for part in parts:
+            if isinstance(part, str):
+                tokens += len(part) // 4
+            elif part.get("type") == "text":
+                tokens += len(part.get("text", "")) // 4
+            else:
+                tokens += config.GEMINI_IMAGE_TOKEN_ESTIMATE
+    return max(1, tokens)
+
+
+class TokenBucket:
+    """Asyncio token bucket refilled continuously at `capacity` tokens per `period` seconds.
+
+    Attributes:
+        capacity (float): Maximum number of tokens the bucket holds (the burst size).
+        rate (float): Tokens added per second.
+    """
+
+    def __init__(self, capacity, period=60.0):
+        """Initializes a full bucket.
+
+        Args:
+            capacity (float): Tokens available per period.
+            period (float, optional): Refill period in seconds. Defaults to 60.
+        """
+        self.capacity = capacity
+        self.rate = capacity / period
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount=1):
+        """Waits until `amount` tokens are available and takes them. Waiters are served in order.
+
+        Args:
+            amount (float, optional): Tokens to take; capped at the bucket capacity. Defaults to 1.
+        """
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self._tokens < amount:
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= amount
+
+
+class GeminiClient:
+    """Shared, rate-limited client for Gemini chat models.
+
+    All requests run on one private event loop thread, so the request-per-minute and token-per-minute
+    buckets and the concurrency limit are enforced for the whole process no matter which thread or
+    event loop the caller lives on. Requests go out as soon as quota allows instead of sleeping a fixed
+    delay, and 429/5xx responses are retried with exponential backoff and jitter.
+
+    Attributes:
+        model (ChatGoogleGenerativeAI): The underlying LangChain chat model.
+        max_retries (int): Retries after the first attempt for retryable errors.
+        backoff_base (float): Initial backoff in seconds, doubled on each retry.
+        backoff_max (float): Upper bound for a single backoff in seconds.
+    """
+
+    def __init__(
+            self,
+            model,
+            requests_per_minute=config.GEMINI_REQUESTS_PER_MINUTE,
+            tokens_per_minute=config.GEMINI_TOKENS_PER_MINUTE,
+            max_concurrency=config.GEMINI_MAX_CONCURRENCY,
+            max_retries=config.GEMINI_MAX_RETRIES,
+            backoff_base=config.GEMINI_BACKOFF_BASE_SECONDS,
+            backoff_max=config.GEMINI_BACKOFF_MAX_SECONDS
+    ):
+        """Starts the client's event loop thread.
+
+        Args:
+            model (ChatGoogleGenerativeAI): The chat model to call.
+            requests_per_minute (int, optional): Request quota. Defaults to config.GEMINI_REQUESTS_PER_MINUTE.
+            tokens_per_minute (int, optional): Token quota. Defaults to config.GEMINI_TOKENS_PER_MINUTE.
+            max_concurrency (int, optional): Requests in flight at once. Defaults to config.GEMINI_MAX_CONCURRENCY.
+            max_retries (int, optional): Retries for 429/5xx. Defaults to config.GEMINI_MAX_RETRIES.
+            backoff_base (float, optional): Initial backoff. Defaults to config.GEMINI_BACKOFF_BASE_SECONDS.
+            backoff_max (float, optional): Maximum backoff. Defaults to config.GEMINI_BACKOFF_MAX_SECONDS.
+        """
+        self.model = model
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._request_bucket = TokenBucket(requests_per_minute)
+        self._token_bucket = TokenBucket(tokens_per_minute)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="gemini-client", daemon=True)
+        self._thread.start()
+
+    async def _acquire_quota(self, messages):
+        await self._request_bucket.acquire(1)
+        await self._token_bucket.acquire(estimate_tokens(messages))
+
+    async def _backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        await asyncio.sleep(random.uniform(delay / 2, delay))
+
+    async def _invoke(self, messages):
+        for attempt in range(self.max_retries + 1):
+            await self._acquire_quota(messages)
+            async with self._semaphore:
+                try:
+                    return await self.model.ainvoke(messages)
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_retryable_error(e):
+                        raise
+                    print(f"Gemini request failed ({e}); retrying ({attempt + 1}/{self.max_retries})...")
+            await self._backoff(attempt)
+
+    async def _stream(self, messages, emit):
+        for attempt in range(self.max_retries + 1):
+            await self._acquire_quota(messages)
+            async with self._semaphore:
+                started = False
+                try:
+                    async for chunk in self.model.astream(messages):
+                        started = True
+                        emit(chunk)
+                    return
+                except Exception as e:
+                    # Once tokens have been handed out a retry would duplicate them
+                    if started or attempt >= self.max_retries or not is_retryable_error(e):
+                        raise
+                    print(f"Gemini stream failed ({e}); retrying ({attempt + 1}/{self.max_retries})...")
+            await self._backoff(attempt)
+
+    async def astream(self, messages):
+        """Streams the model response from any event loop, chunk by chunk.
+
+        The request runs on the client's loop under the same quota and concurrency limits as
+        `invoke`; chunks are forwarded to the caller's loop as they arrive. Closing the generator
+        (e.g. when the HTTP client disconnects) cancels the request.
+
+        Args:
+            messages (list[BaseMessage]): The messages to send.
+
+        Yields:
+            AIMessageChunk: Response chunks in order.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+
+        def emit(item):
+            loop.call_soon_threadsafe(chunks.put_nowait, item)
+
+        future = asyncio.run_coroutine_threadsafe(self._stream(list(messages), emit), self._loop)
+        future.add_done_callback(lambda _: emit(_STREAM_END))
+        try:
+            while (chunk := await chunks.get()) is not _STREAM_END:
+                yield chunk
+            future.result()
+        finally:
+            future.cancel()
+
+    def submit(self, messages):
+        """Schedules a model call and returns immediately.
+
+        Args:
+            messages (list[BaseMessage]): The messages to send.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the model's AIMessage.
+        """
+        return asyncio.run_coroutine_threadsafe(self._invoke(list(messages)), self._loop)
+
+    def invoke(self, messages):
+        """Calls the model and blocks until the response arrives. Not for use on an event loop.
+
+        Args:
+            messages (list[BaseMessage]): The messages to send.
+
+        Returns:
+            AIMessage: The model response.
+        """
+        return self.submit(messages).result()
+
+    async def ainvoke(self, messages):
+        """Calls the model from any event loop without blocking it.
+
+        Args:
+            messages (list[BaseMessage]): The messages to send.
+
+        Returns:
+            AIMessage: The model response.
+        """
+        return await asyncio.wrap_future(self.submit(messages))
+
+    def close(self):
+        """Stops the client's event loop thread."""
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
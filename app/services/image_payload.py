@@ -0,0 +1,82 @@
+import base64
+import hashlib
+import io
+from PIL import Image, ImageOps
+from app.config import config
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+
+def read_image_bytes(image_source):
+    """Returns the encoded bytes of an image given as a path, raw bytes or a binary file object."""
+    if isinstance(image_source, (bytes, bytearray, memoryview)):
+        return bytes(image_source)
+    if hasattr(image_source, "read"):
+        return image_source.read()
+    with open(image_source, "rb") as image_file:
+        return image_file.read()
+
+
+def _has_transparency(image):
+    return image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+
+
+def encode_image(raw, max_dimension=config.GEMINI_IMAGE_MAX_DIMENSION, image_format=config.GEMINI_IMAGE_FORMAT,
+                 quality=config.GEMINI_IMAGE_QUALITY):
+    """Downscales and re-encodes an image for an inline model request.
+
+    Originals that already fit within `max_dimension` in a format the model accepts are passed
+    through untouched, so re-encoding never makes a small image larger or blurrier.
+
+    Args:
+        raw (bytes): The encoded original image.
+        max_dimension (int, optional): Longest side in pixels. Defaults to config.GEMINI_IMAGE_MAX_DIMENSION.
+        image_format (str, optional): Output format. Defaults to config.GEMINI_IMAGE_FORMAT.
+        quality (int, optional): Encoder quality. Defaults to config.GEMINI_IMAGE_QUALITY.
+
+    Returns:
+        tuple: (encoded bytes, MIME type).
+    """
+    with Image.open(io.BytesIO(raw)) as image:
+        source_format = image.format
+        fits = max(image.size) <= max_dimension
+        if fits and source_format in _MIME_TYPES and image.getexif().get(0x0112, 1) == 1:
+            return raw, _MIME_TYPES[source_format]
+
+        image.draft("RGB", (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS, reducing_gap=3.0)
+
+    # JPEG has no alpha channel, so transparent images keep it as PNG
+    if _has_transparency(image):
+        image_format = "PNG"
+        image = image.convert("RGBA")
+    elif image_format == "JPEG":
+        image = image.convert("RGB")
+    output = io.BytesIO()
+    image.save(output, format=image_format, quality=quality, optimize=True)
+    return output.getvalue(), _MIME_TYPES[image_format]
+
+
+def image_data_url(image_source, cache=None):
+    """Returns a downscaled `data:<mime>;base64,...` URL for an image.
+
+    Args:
+        image_source (str | bytes | file-like): Path, encoded bytes or binary file object of the image.
+        cache (LRUCache, optional): Cache of encoded payloads keyed by the original's content hash.
+
+    Returns:
+        str: The data URL to put in an `image_url` message part.
+    """
+    raw = read_image_bytes(image_source)
+    key = hashlib.sha256(raw).hexdigest()
+    if cache is not None:
+        data_url = cache.get(key)
+        if data_url is not None:
+            return data_url
+
+    encoded, mime_type = encode_image(raw)
+    data_url = f"data:{mime_type};base64,{base64.b64encode(encoded).decode('utf-8')}"
+    if cache is not None:
+        cache.put(key, data_url)
+    return data_url
@@ -0,0 +1,63 @@
+import io
+import numpy as np
+from PIL import Image
+
+# CLIP's published normalisation constants (same values as CLIPImageProcessor)
+CLIP_IMAGE_MEAN = (0.48145466, 0.4578275, 0.40821073)
+CLIP_IMAGE_STD = (0.26862954, 0.26130258, 0.27577711)
+
+
+def open_image_source(image_source):
+    """Returns something `Image.open` accepts for a path, raw bytes or a binary file object.
+
+    Bytes get a fresh in-memory buffer on every call, so one upload can be decoded by several
+    consumers without any of them seeing an exhausted stream.
+    """
+    if isinstance(image_source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(image_source)
+    return image_source
+
+
+def preprocess_image(image_source, size=224, mean=CLIP_IMAGE_MEAN, std=CLIP_IMAGE_STD):
+    """Decodes an image and turns it into a normalised CLIP pixel array.
+
+    JPEGs are decoded in draft mode, which lets libjpeg scale the image down by a power of two
+    while decoding, so a 12MP photo is never fully decoded just to be shrunk to 224px. The
+    remaining resize uses PIL's reducing gap, then the image is center-cropped like CLIP expects.
+
+    This module deliberately imports only PIL and NumPy so it is cheap to load in worker processes.
+
+    Args:
+        image_source (str | bytes | file-like): Path, encoded bytes or binary file object of the image.
+        size (int, optional): Output height and width in pixels. Defaults to 224.
+        mean (tuple, optional): Per-channel mean used for normalisation.
+        std (tuple, optional): Per-channel standard deviation used for normalisation.
+
+    Returns:
+        numpy.ndarray: A float32 array of shape (3, size, size).
+    """
+    with Image.open(open_image_source(image_source)) as image:
+        image.draft("RGB", (size, size))
+        image = image.convert("RGB")
+
+    width, height = image.size
+    scale = size / min(width, height)
+    resized = (max(size, round(width * scale)), max(size, round(height * scale)))
+    image = image.resize(resized, Image.BICUBIC, reducing_gap=3.0)
+
+    left = (resized[0] - size) // 2
+    top = (resized[1] - size) // 2
+    image = image.crop((left, top, left + size, top + size))
+
+    pixels = np.asarray(image, dtype=np.float32) / 255.0
+    pixels = (pixels - np.asarray(mean, dtype=np.float32)) / np.asarray(std, dtype=np.float32)
+    return pixels.transpose(2, 0, 1)
+
+
+def safe_preprocess_image(image_source, size=224, mean=CLIP_IMAGE_MEAN, std=CLIP_IMAGE_STD):
+    """Like `preprocess_image`, but returns None instead of raising so one bad file cannot abort a batch."""
+    try:
+        return preprocess_image(image_source, size=size, mean=mean, std=std)
+    except Exception as e:
+        print(f"Error preprocessing image {image_source}: {e}")
+        return None
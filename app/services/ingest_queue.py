@@ -0,0 +1,376 @@
+import os
+import sqlite3
+import threading
+import time
+from app.config import config
+from app.utils.paths import image_id_for
+from app.utils.processes import try_lock_file
+
+# Lower values are served first
+PRIORITY_UPLOAD = 0
+PRIORITY_BACKFILL = 10
+
+# Item states; "duplicate" items follow the state of the item they were merged into
+PENDING, RUNNING, DONE, SKIPPED, FAILED, DUPLICATE = "pending", "running", "done", "skipped", "failed", "duplicate"
+ACTIVE_STATES = (PENDING, RUNNING)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL REFERENCES jobs(id),
+    image_path TEXT NOT NULL,
+    image_id TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    duplicate_of INTEGER REFERENCES items(id),
+    error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_by_job ON items(job_id);
+CREATE INDEX IF NOT EXISTS items_by_priority ON items(status, priority, id);
+CREATE UNIQUE INDEX IF NOT EXISTS active_items_by_image ON items(image_id) WHERE status IN ('pending', 'running');
+"""
+
+
+class IngestQueue:
+    """Durable, SQLite-backed queue of images waiting to be ingested.
+
+    A job groups the images of one upload or backfill; every image is an item processed on its own.
+    Items are served by priority (uploads before backfills) and then in arrival order. An image that
+    is already waiting or running is not queued twice: the new job's item is recorded as a duplicate
+    of the existing one (raising its priority if needed) and reports that item's progress.
+
+    Items claimed by a worker that died are put back by `recover`, and the worker skips images that
+    are already in the collection with the same content, so processing an item again is always safe.
+    `recover` must only be called by the worker holding `lock_path`, since any other worker's
+    running items may still be in progress.
+
+    Attributes:
+        path (str): Path of the SQLite database file.
+        lock_path (str): Lock file held by the one worker allowed to claim items.
+        max_attempts (int): Attempts after which a failing item is given up.
+    """
+
+    def __init__(self, path=config.INGEST_QUEUE_PATH, max_attempts=config.INGEST_MAX_ATTEMPTS):
+        """Opens (or creates) the queue database.
+
+        Args:
+            path (str, optional): Database file. Defaults to config.INGEST_QUEUE_PATH.
+            max_attempts (int, optional): Attempts per item. Defaults to config.INGEST_MAX_ATTEMPTS.
+        """
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(_SCHEMA)
+
+    def _transaction(self, work):
+        """Runs `work(connection)` in one write transaction, serialized with other processes."""
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self._connection)
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+            return result
+
+    def enqueue(self, image_paths, kind="upload", priority=PRIORITY_UPLOAD):
+        """Creates a job for `image_paths`.
+
+        Args:
+            image_paths (list[str]): Images to ingest.
+            kind (str, optional): Label reported by the status endpoint. Defaults to "upload".
+            priority (int, optional): PRIORITY_UPLOAD or PRIORITY_BACKFILL. Defaults to PRIORITY_UPLOAD.
+
+        Returns:
+            int: The job id.
+        """
+        def work(connection):
+            now = time.time()
+            job_id = connection.execute(
+                "INSERT INTO jobs (kind, priority, created_at) VALUES (?, ?, ?)", (kind, priority, now)
+            ).lastrowid
+            for image_path in dict.fromkeys(image_paths):
+                image_id = image_id_for(image_path)
+                active = connection.execute(
+                    "SELECT id FROM items WHERE image_id = ? AND status IN (?, ?)", (image_id, *ACTIVE_STATES)
+                ).fetchone()
+                if active is None:
+                    connection.execute(
+                        "INSERT INTO items (job_id, image_path, image_id, priority, status, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (job_id, image_path, image_id, priority, PENDING, now)
+                    )
+                    continue
+                connection.execute(
+                    "UPDATE items SET priority = MIN(priority, ?) WHERE id = ?", (priority, active["id"])
+                )
+                connection.execute(
+                    "INSERT INTO items (job_id, image_path, image_id, priority, status, duplicate_of, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, image_path, image_id, priority, DUPLICATE, active["id"], now)
+                )
+            return job_id
+
+        return self._transaction(work)
+
+    def claim(self, limit):
+        """Marks up to `limit` of the most urgent pending items as running and returns them.
+
+        Args:
+            limit (int): Maximum number of items.
+
+        Returns:
+            list[dict]: Items with "id", "image_path" and "attempts" (including this one).
+        """
+        def work(connection):
+            rows = connection.execute(
+                "SELECT id, image_path, attempts FROM items WHERE status = ? ORDER BY priority, id LIMIT ?",
+                (PENDING, limit)
+            ).fetchall()
+            now = time.time()
+            connection.executemany(
+                "UPDATE items SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                [(RUNNING, now, row["id"]) for row in rows]
+            )
+            return [{"id": row["id"], "image_path": row["image_path"], "attempts": row["attempts"] + 1}
+                    for row in rows]
+
+        return self._transaction(work)
+
+    def finish(self, item, status, error=None):
+        """Records the outcome of a claimed item.
+
+        A failed item goes back to the queue until it has used `max_attempts` attempts.
+
+        Args:
+            item (dict): The item as returned by `claim`.
+            status (str): DONE, SKIPPED or FAILED.
+            error (str, optional): Error message of a failed or skipped item.
+        """
+        if status == FAILED and item["attempts"] < self.max_attempts:
+            status = PENDING
+        self._transaction(lambda connection: connection.execute(
+            "UPDATE items SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+            (status, error, time.time(), item["id"])
+        ))
+
+    def recover(self):
+        """Puts items left running by a stopped worker back in the queue.
+
+        Returns:
+            int: Number of recovered items.
+        """
+        return self._transaction(lambda connection: connection.execute(
+            "UPDATE items SET status = ?, updated_at = ? WHERE status = ?", (PENDING, time.time(), RUNNING)
+        ).rowcount)
+
+    def job(self, job_id):
+        """Reports the progress of a job.
+
+        Returns:
+            dict | None: Job kind, item counts by state, overall status and per-image errors,
+            or None if the job does not exist.
+        """
+        with self._lock:
+            job = self._connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            items = self._connection.execute(
+                "SELECT i.image_path, COALESCE(o.status, i.status) AS status, COALESCE(o.error, i.error) AS error "
+                "FROM items i LEFT JOIN items o ON o.id = i.duplicate_of WHERE i.job_id = ? ORDER BY i.id",
+                (job_id,)
+            ).fetchall()
+
+        counts = {state: 0 for state in (PENDING, RUNNING, DONE, SKIPPED, FAILED)}
+        for item in items:
+            counts[item["status"]] += 1
+        finished = counts[DONE] + counts[SKIPPED] + counts[FAILED]
+        if finished == len(items):
+            status = "failed" if counts[FAILED] else "completed"
+        else:
+            status = "running" if counts[RUNNING] or finished else "queued"
+        return {
+            "id": job["id"],
+            "kind": job["kind"],
+            "created_at": job["created_at"],
+            "status": status,
+            "total": len(items),
+            "processed": finished,
+            "progress": finished / len(items) if items else 1.0,
+            "counts": counts,
+            "errors": {item["image_path"]: item["error"] for item in items if item["status"] == FAILED},
+        }
+
+    def close(self):
+        """Closes the database connection."""
+        with self._lock:
+            self._connection.close()
+
+
+class IngestWorker:
+    """The single long-lived consumer of the ingest queue.
+
+    One thread claims items in batches and stores them through a ChromaDatabase that is created once,
+    so CLIP, Chroma and the Gemini clients stay warm between uploads and ingest never runs twice
+    concurrently. Producers call `notify` after enqueueing; the worker also polls, which picks up jobs
+    enqueued by other processes such as a backfill script.
+
+    Every server process starts a worker, but only the one holding the queue's exclusive file lock
+    claims items; the others poll for the lock and take over when its holder exits. Items left
+    running are recovered only once the lock is taken, when their previous owner is known to be
+    gone, and only one process ever writes to the collection and vector index.
+
+    Finished records are not flushed per claim: they wait in the database's write buffer, which
+    fills across claims up to config.CHROMA_WRITE_BATCH_SIZE records or its time limit, and an item
+    is marked done only when the write callback reports its record stored.
+
+    Attributes:
+        queue (IngestQueue): The queue to drain.
+        batch_size (int): Items claimed at once, processed as one CLIP/Gemini batch.
+        poll_seconds (float): How long an idle worker waits before checking the queue again.
+    """
+
+    def __init__(self, queue, batch_size=config.INGEST_BATCH_SIZE, poll_seconds=config.INGEST_POLL_SECONDS):
+        """Starts the worker thread; it recovers interrupted items once it holds the queue lock.
+
+        Args:
+            queue (IngestQueue): The queue to drain.
+            batch_size (int, optional): Items per batch. Defaults to config.INGEST_BATCH_SIZE.
+            poll_seconds (float, optional): Idle poll interval. Defaults to config.INGEST_POLL_SECONDS.
+        """
+        self.queue = queue
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self._database = None
+        # Items whose records wait in the write buffer, by image path
+        self._buffered = {}
+        self._buffered_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock_file = None
+        self._thread = threading.Thread(target=self._run, name="ingest-worker", daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """Wakes the worker up after new items were enqueued."""
+        self._wakeup.set()
+
+    def _get_database(self):
+        if self._database is None:
+            from app.vectrodb_models.vectordb import ChromaDatabase
+            self._database = ChromaDatabase(
+                collection_name=config.DEFAULT_COLLECTION_NAME, persist_directory=config.DEFAULT_DB_PATH,
+                on_written=self._on_written
+            )
+        return self._database
+
+    def _acquire(self):
+        """Becomes the active worker if no other process is; returns whether this worker is active."""
+        if self._lock_file is not None:
+            return True
+        lock_file = try_lock_file(self.queue.lock_path)
+        if lock_file is None:
+            return False
+        try:
+            # The previous lock holder has exited, so nothing it left running is still in progress
+            recovered = self.queue.recover()
+        except BaseException:
+            lock_file.close()
+            raise
+        self._lock_file = lock_file
+        if recovered:
+            print(f"Re-queued {recovered} interrupted ingest items.")
+        try:
+            database = self._get_database()
+            # Only the lock holder writes to the vector index, so it also rebuilds it when out of date
+            database.vector_backend.sync(database.collection)
+            # Images stored before derivatives existed are caught up once per start
+            database.backfill_thumbnails()
+        except Exception as e:
+            print(f"Ingest startup maintenance failed: {e}")
+        return True
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                if not self._acquire():
+                    self._stopping.wait(self.poll_seconds)
+                    continue
+                items = self.queue.claim(self.batch_size)
+                if items:
+                    self._process(items)
+                    continue
+            except Exception as e:
+                print(f"Ingest worker error: {e}")
+            self._wakeup.wait(self.poll_seconds)
+            self._wakeup.clear()
+
+    def _take_buffered(self, image_paths):
+        with self._buffered_lock:
+            return [item for item in (self._buffered.pop(image_path, None) for image_path in image_paths)
+                    if item is not None]
+
+    def _on_written(self, records, error):
+        """Records the outcome of the items whose records the write buffer just wrote."""
+        for item in self._take_buffered(record["image_path"] for record in records):
+            self.queue.finish(item, DONE if error is None else FAILED, error)
+
+    def _process(self, items):
+        """Hands one batch of claimed items to the database; stored items are finished by `_on_written`."""
+        present = []
+        for item in items:
+            if os.path.exists(item["image_path"]):
+                present.append(item)
+            else:
+                self.queue.finish(item, FAILED, "File not found")
+        if not present:
+            return
+
+        new_paths = set()
+        try:
+            database = self._get_database()
+            image_paths = list(dict.fromkeys(item["image_path"] for item in present))
+            # Images stored under the same id with other content are ingested again, not skipped
+            new_paths = set(database.filter_changed_images(image_paths))
+            with self._buffered_lock:
+                self._buffered.update((item["image_path"], item) for item in present if item["image_path"] in new_paths)
+            failures = database.store_images(
+                [image_path for image_path in image_paths if image_path in new_paths], flush=False
+            )
+        except Exception as e:
+            # Items not reported yet are retried; images written meanwhile are skipped on retry
+            unreported = [item for item in present if item["image_path"] not in new_paths]
+            for item in unreported + self._take_buffered(new_paths):
+                self.queue.finish(item, FAILED, str(e))
+            raise
+
+        for item in self._take_buffered(failures):
+            self.queue.finish(item, FAILED, failures[item["image_path"]])
+        for item in present:
+            if item["image_path"] not in new_paths:
+                self.queue.finish(item, SKIPPED, "Already in the collection with the same content")
+
+    def close(self, timeout=10):
+        """Stops the worker after its current batch and flushes buffered writes, finishing their items; unfinished items are recovered on the next start."""
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        if self._database is not None:
+            self._database.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
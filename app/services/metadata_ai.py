@@ -1,16 +1,14 @@
-import time
-import base64
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
 from langchain.prompts import ChatPromptTemplate
-from app.config.secrets import gemini_api_key
+from app.services.image_payload import image_data_url
+from app.services.model_registry import model_registry
 from app.config.config import (
     DEFAULT_MODEL_NAME,
-    DEFAULT_DELAY,
     DEFAULT_LANGUAGE,
     IMAGE_ANALYSIS_SYSTEM_PROMPT,
     IMAGE_ANALYSIS_HUMAN_TEXT,
+    IMAGE_DESCRIPTION_AND_ANALYSIS_SYSTEM_PROMPT,
 )
 
 
@@ -21,56 +19,83 @@ class ImageMetadata(BaseModel):
     tags: list[str] = Field(description="Relevant tags for categorizing the image")
 
 
+class DescribedImageMetadata(ImageMetadata):
+    description: str = Field(description="A vivid one-paragraph description of the image")
+
+
 class ImageAnalyzer:
     """
         A class to analyze images using Google Generative AI.
 
         Attributes:
-            api_key (str): The API key for accessing Google Generative AI.
-            model (str): The name of the AI model to use.
-            delay (int): The delay between API calls in seconds.
-            model (ChatGoogleGenerativeAI): The AI model instance.
+            client (GeminiClient): The shared, rate-limited Gemini client.
             parser (PydanticOutputParser): The parser for the AI model's output.
             prompt (ChatPromptTemplate): The prompt template for the AI model.
+            described_parser (PydanticOutputParser): Parser for the combined description + metadata output.
+            described_prompt (ChatPromptTemplate): Prompt asking for description and metadata at once.
 
         Methods:
             analyze_image(image_path: str, language: str = DEFAULT_LANGUAGE) -> dict:
                 Analyzes an image and returns the metadata.
+            describe_and_analyze_image(image_path: str, language: str = DEFAULT_LANGUAGE) -> dict:
+                Returns the description and the metadata from a single model call.
         """
-    def __init__(self, api_key: str, model_name: str = DEFAULT_MODEL_NAME, delay: int = DEFAULT_DELAY):
-        self.delay = delay
-        self.model = ChatGoogleGenerativeAI(model=model_name, api_key=gemini_api_key)
+    def __init__(self, api_key: str, model_name: str = DEFAULT_MODEL_NAME):
+        self.client = model_registry.get_gemini_client(model_name, api_key)
+        self.payload_cache = model_registry.get_image_payload_cache()
         self.parser = PydanticOutputParser(pydantic_object=ImageMetadata)
         self.prompt = self._create_prompt_template()
+        self.described_parser = PydanticOutputParser(pydantic_object=DescribedImageMetadata)
+        self.described_prompt = self._create_prompt_template(IMAGE_DESCRIPTION_AND_ANALYSIS_SYSTEM_PROMPT)
 
-    def _create_prompt_template(self) -> ChatPromptTemplate:
+    def _create_prompt_template(self, system_prompt: str = IMAGE_ANALYSIS_SYSTEM_PROMPT) -> ChatPromptTemplate:
         return ChatPromptTemplate.from_messages([
-            ("system", IMAGE_ANALYSIS_SYSTEM_PROMPT),
+            ("system", system_prompt),
             ("human", [
                 {"type": "text", "text": IMAGE_ANALYSIS_HUMAN_TEXT},
                 {
                     "type": "image_url",
-                    "image_url": {"url": "data:image/jpeg;base64,{image_data}"},
+                    "image_url": {"url": "{image_url}"},
                 },
             ])
         ])
 
     def _encode_image(self, image_path: str) -> str:
-        with open(image_path, "rb") as image_file:
-            image_data = base64.b64encode(image_file.read()).decode("utf-8")
-        return image_data
+        """Returns the downscaled data URL of an image, shared with the description path via the payload cache."""
+        return image_data_url(image_path, cache=self.payload_cache)
 
     def analyze_image(self, image_path: str, language: str = DEFAULT_LANGUAGE):
-        image_data = self._encode_image(image_path)
+        image_url = self._encode_image(image_path)
+
+        messages = self.prompt.format_messages(
+            language=language,
+            format_instructions=self.parser.get_format_instructions(),
+            image_url=image_url
+        )
+        response = self.client.invoke(messages)
+
+        result = self.parser.parse(response.content)
+        return result.model_dump()
+
+    def describe_and_analyze_image(self, image_path: str, language: str = DEFAULT_LANGUAGE):
+        """Gets the description and the metadata of an image from one structured-output call.
 
-        chain = self.prompt | self.model | self.parser
+        The image is encoded and uploaded once instead of once per field group.
 
-        time.sleep(self.delay)
+        Returns:
+            dict: The ImageMetadata fields plus a 'description' entry.
+
+        Raises:
+            OutputParserException: If the response does not match the expected structure.
+        """
+        image_url = self._encode_image(image_path)
 
-        result = chain.invoke({
-            "language": language,
-            "format_instructions": self.parser.get_format_instructions(),
-            "image_data": image_data
-        })
+        messages = self.described_prompt.format_messages(
+            language=language,
+            format_instructions=self.described_parser.get_format_instructions(),
+            image_url=image_url
+        )
+        response = self.client.invoke(messages)
 
+        result = self.described_parser.parse(response.content)
         return result.model_dump()
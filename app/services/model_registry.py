@@ -0,0 +1,235 @@
+import threading
+from app.config import config
+
+
+class ModelRegistry:
+    """Process-wide registry of heavyweight resources shared by every chat session and the ingest path.
+
+    Loading the CLIP weights, opening a Chroma PersistentClient or building a Gemini client is
+    expensive, so each resource is created once on first use and then handed out to all callers.
+    Chat sessions only keep per-user state and borrow everything else from here.
+
+    Attributes:
+        _lock (threading.RLock): Guards lazy creation so concurrent first requests load a resource once.
+        _resources (dict): Created resources keyed by (kind, *parameters).
+    """
+
+    def __init__(self):
+        """Initializes an empty registry. Nothing is loaded until it is first requested."""
+        self._lock = threading.RLock()
+        self._resources = {}
+
+    def _get_or_create(self, key, factory):
+        """Returns the resource stored under `key`, creating it with `factory` on first access.
+
+        Args:
+            key (tuple): Cache key identifying the resource.
+            factory (callable): Zero-argument callable building the resource.
+
+        Returns:
+            object: The shared resource instance.
+        """
+        resource = self._resources.get(key)
+        if resource is not None:
+            return resource
+        with self._lock:
+            resource = self._resources.get(key)
+            if resource is None:
+                resource = factory()
+                self._resources[key] = resource
+            return resource
+
+    def get_clip_embedding(self):
+        """Returns the shared CLIPEmbedding instance (model weights are loaded once per process)."""
+        from app.services.embeddings import CLIPEmbedding
+        return self._get_or_create(
+            ("clip",),
+            lambda: CLIPEmbedding(text_cache=self.get_text_embedding_cache())
+        )
+
+    def get_text_embedding_cache(self):
+        """Returns the shared text embedding cache, restored from disk on first use."""
+        from app.services.embeddings import TextEmbeddingCache
+        return self._get_or_create(("text_embedding_cache",), TextEmbeddingCache)
+
+    def get_embedding_batcher(self):
+        """Returns the shared micro-batching worker that computes query embeddings."""
+        from app.services.embedding_batcher import EmbeddingBatcher
+        return self._get_or_create(
+            ("embedding_batcher",),
+            lambda: EmbeddingBatcher(self.get_clip_embedding())
+        )
+
+    def get_embedding_processor(self):
+        """Returns the shared EmbeddingProcessor built on top of the shared CLIP model."""
+        from app.services.embeddings import EmbeddingProcessor
+        return self._get_or_create(
+            ("embedding_processor",),
+            lambda: EmbeddingProcessor(clip=self.get_clip_embedding(), batcher=self.get_embedding_batcher())
+        )
+
+    def get_description_cache(self):
+        """Returns the shared cache of image descriptions keyed by image id."""
+        from app.utils.cache import LRUCache
+        return self._get_or_create(
+            ("description_cache",),
+            lambda: LRUCache(maxsize=config.DESCRIPTION_CACHE_SIZE)
+        )
+
+    def get_response_cache(self):
+        """Returns the shared cache of chat answers."""
+        from app.services.response_cache import ResponseCache
+        return self._get_or_create(("response_cache",), ResponseCache)
+
+    def get_image_payload_cache(self):
+        """Returns the shared cache of downscaled image payloads sent to Gemini, keyed by content hash."""
+        from app.utils.cache import LRUCache
+        return self._get_or_create(
+            ("image_payload_cache",),
+            lambda: LRUCache(maxsize=config.GEMINI_IMAGE_CACHE_SIZE)
+        )
+
+    def get_thumbnail_generator(self):
+        """Returns the shared worker pool that renders image thumbnails."""
+        from app.services.thumbnails import ThumbnailGenerator
+        return self._get_or_create(("thumbnail_generator",), ThumbnailGenerator)
+
+    def get_chat_executor(self):
+        """Returns the bounded thread pool used for blocking work inside async chat turns."""
+        from concurrent.futures import ThreadPoolExecutor
+        return self._get_or_create(
+            ("chat_executor",),
+            lambda: ThreadPoolExecutor(max_workers=config.CHAT_EXECUTOR_WORKERS, thread_name_prefix="chat")
+        )
+
+    def get_chroma_client(self, persist_directory=config.DEFAULT_DB_PATH):
+        """Returns the shared Chroma PersistentClient for `persist_directory`.
+
+        Args:
+            persist_directory (str, optional): Path to the database directory. Defaults to config.DEFAULT_DB_PATH.
+        """
+        import chromadb
+        return self._get_or_create(
+            ("chroma", persist_directory),
+            lambda: chromadb.PersistentClient(path=persist_directory)
+        )
+
+    def get_gallery_database(self, db_path=config.DEFAULT_DB_PATH, collection_name=config.DEFAULT_COLLECTION_NAME):
+        """Returns the shared GalleryDatabase used by the chat query path.
+
+        Args:
+            db_path (str, optional): Path to the database directory. Defaults to config.DEFAULT_DB_PATH.
+            collection_name (str, optional): Name of the collection. Defaults to config.DEFAULT_COLLECTION_NAME.
+        """
+        from app.vectrodb_models.retriever import GalleryDatabase
+        return self._get_or_create(
+            ("gallery_database", db_path, collection_name),
+            lambda: GalleryDatabase(db_path=db_path, collection_name=collection_name)
+        )
+
+    def get_gallery_index(self, db_path=config.DEFAULT_DB_PATH, collection_name=config.DEFAULT_COLLECTION_NAME):
+        """Returns the shared embedding-free read model used to render gallery pages.
+
+        Args:
+            db_path (str, optional): Path to the database directory. Defaults to config.DEFAULT_DB_PATH.
+            collection_name (str, optional): Name of the collection. Defaults to config.DEFAULT_COLLECTION_NAME.
+        """
+        from app.vectrodb_models.read_model import GalleryIndex
+        return self._get_or_create(
+            ("gallery_index", db_path, collection_name),
+            lambda: GalleryIndex(self.get_chroma_client(db_path).get_or_create_collection(collection_name))
+        )
+
+    def get_vector_backend(self, db_path=config.DEFAULT_DB_PATH, collection_name=config.DEFAULT_COLLECTION_NAME):
+        """Returns the nearest-neighbour search backend selected by config.VECTOR_BACKEND.
+
+        The "numpy" backend keeps a memory-mapped copy of the collection's embeddings under
+        `db_path`. Only the active ingest worker writes to it, so it is brought in line with the
+        collection (`sync`) by that worker and not here.
+
+        Args:
+            db_path (str, optional): Path to the database directory. Defaults to config.DEFAULT_DB_PATH.
+            collection_name (str, optional): Name of the collection. Defaults to config.DEFAULT_COLLECTION_NAME.
+        """
+        import os
+        from app.vectrodb_models.vector_index import ChromaVectorBackend, NumpyVectorIndex
+
+        def create():
+            collection = self.get_chroma_client(db_path).get_or_create_collection(collection_name)
+            if config.VECTOR_BACKEND == "chroma":
+                return ChromaVectorBackend(collection)
+            if config.VECTOR_BACKEND == "numpy":
+                return NumpyVectorIndex(os.path.join(db_path, "vector_index", collection_name))
+            raise ValueError(f"Unknown VECTOR_BACKEND: {config.VECTOR_BACKEND}")
+
+        return self._get_or_create(("vector_backend", db_path, collection_name), create)
+
+    def get_ingest_queue(self):
+        """Returns the shared durable queue of images waiting to be ingested."""
+        from app.services.ingest_queue import IngestQueue
+        return self._get_or_create(("ingest_queue",), IngestQueue)
+
+    def get_ingest_worker(self):
+        """Returns the single background worker draining the ingest queue, starting it on first use."""
+        from app.services.ingest_queue import IngestWorker
+        return self._get_or_create(("ingest_worker",), lambda: IngestWorker(self.get_ingest_queue()))
+
+    def get_chat_model(self, model_name=config.DEFAULT_MODEL_NAME, api_key=None):
+        """Returns the shared ChatGoogleGenerativeAI client for `model_name`.
+
+        Args:
+            model_name (str, optional): Name of the Gemini model. Defaults to config.DEFAULT_MODEL_NAME.
+            api_key (str, optional): API key. Defaults to the key loaded from the environment.
+        """
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        from app.config import secrets
+        api_key = api_key or secrets.gemini_api_key
+        # Retries are handled by GeminiClient, so the model itself makes a single attempt
+        return self._get_or_create(
+            ("chat_model", model_name, api_key),
+            lambda: ChatGoogleGenerativeAI(model=model_name, api_key=api_key, max_retries=1)
+        )
+
+    def get_gemini_client(self, model_name=config.DEFAULT_MODEL_NAME, api_key=None):
+        """Returns the shared rate-limited GeminiClient for `model_name`.
+
+        Args:
+            model_name (str, optional): Name of the Gemini model. Defaults to config.DEFAULT_MODEL_NAME.
+            api_key (str, optional): API key. Defaults to the key loaded from the environment.
+        """
+        from app.services.gemini_client import GeminiClient
+        from app.config import secrets
+        api_key = api_key or secrets.gemini_api_key
+        return self._get_or_create(
+            ("gemini_client", model_name, api_key),
+            lambda: GeminiClient(self.get_chat_model(model_name, api_key))
+        )
+
+    def warm_up(self):
+        """Eagerly loads the resources needed by the chat path so the first session starts instantly."""
+        self.get_embedding_processor()
+        self.get_gemini_client()
+        try:
+            self.get_gallery_database()
+        except Exception as e:
+            print(f"Gallery database not available yet: {e}")
+
+    def shutdown(self):
+        """Stops background workers owned by the registry and persists warm caches."""
+        ingest_worker = self._resources.get(("ingest_worker",))
+        if ingest_worker is not None:
+            ingest_worker.close()
+        for key, resource in list(self._resources.items()):
+            if key[0] in ("embedding_batcher", "gemini_client", "thumbnail_generator", "clip"):
+                resource.close()
+            elif key[0] == "chat_executor":
+                resource.shutdown(wait=False, cancel_futures=True)
+            elif key[0] == "ingest_queue":
+                resource.close()
+        text_cache = self._resources.get(("text_embedding_cache",))
+        if text_cache is not None:
+            text_cache.save()
+
+
+# Single registry shared by the whole process
+model_registry = ModelRegistry()
@@ -1,11 +1,15 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
 from langchain.schema import SystemMessage, AIMessage
 from langchain_core.messages import HumanMessage
-from app.services.embeddings import EmbeddingProcessor
 from app.services.description_ai import GeminiImageDescription
+from app.services.model_registry import model_registry
+from app.services.response_cache import is_personalized
 from app.config import config, secrets
-from app.utils.utility import ChatUtils
-from app.vectrodb_models.retriever import GalleryDatabase
+from app.utils.paths import image_id_for
+from app.utils.utility import ChatUtils, RelevantImagesStreamFilter
+
+# Response cache scope of general-knowledge answers, which do not depend on the gallery
+GENERAL_SCOPE = ("general",)
 
 
 
@@ -14,7 +18,7 @@ class ChatSession:
     """Manages conversation history and interactions with the AI model.
 
     Attributes:
-        model (ChatGoogleGenerativeAI): The generative AI model instance.
+        client (GeminiClient): The shared, rate-limited Gemini client.
         history (list): List of messages in the conversation history.
         max_history (int): Maximum number of messages to retain in history.
         system_message (SystemMessage): The initial system instruction message.
@@ -28,7 +32,7 @@ class ChatSession:
             model_name (str, optional): Name of the model. Defaults to config.DEFAULT_MODEL_NAME.
             max_history (int, optional): Max history size. Defaults to config.MAX_HISTORY_SIZE.
         """
-        self.model = ChatGoogleGenerativeAI(model=model_name, api_key=api_key)
+        self.client = model_registry.get_gemini_client(model_name, api_key)
         self.history = []
         self.max_history = max_history
         self.system_message = SystemMessage(content=config.SYSTEM_MESSAGE)
@@ -43,27 +47,51 @@ class ChatSession:
         if len(self.history) > self.max_history:
             self.history = self.history[-self.max_history:]
 
-    def generate_response(self, human_message):
+    async def generate_response(self, human_message):
         """Generates an AI response based on the current conversation history.
 
+        The exchange is only added to the history once the response has arrived, so a turn that
+        is cancelled (e.g. because the client disconnected) leaves the history untouched.
+
         Args:
             human_message (HumanMessage): The user's input message.
 
         Returns:
             str: The AI-generated response content.
         """
+        messages = [self.system_message] + self.history + [human_message]
+        response = await self.client.ainvoke(messages)
         self.add_message(human_message)
-        messages = [self.system_message] + self.history
-        response = self.model.invoke(messages)
         self.add_message(AIMessage(content=response.content))
         return response.content
 
+    async def stream_response(self, human_message):
+        """Streams an AI response based on the current conversation history.
+
+        As with `generate_response`, the exchange is only added to the history once the whole
+        response has been received.
+
+        Args:
+            human_message (HumanMessage): The user's input message.
+
+        Yields:
+            str: Pieces of the response text as they arrive.
+        """
+        messages = [self.system_message] + self.history + [human_message]
+        parts = []
+        async for chunk in self.client.astream(messages):
+            parts.append(chunk.content)
+            yield chunk.content
+        self.add_message(human_message)
+        self.add_message(AIMessage(content="".join(parts)))
+
 
 class ResponseFormatter:
     """Formats responses and summarizes image descriptions for the chat system.
 
     Attributes:
         gemini_desc (GeminiImageDescription): Instance for generating image descriptions.
+        description_cache (LRUCache): Shared cache of image descriptions keyed by image id.
     """
 
     def __init__(self, api_key, model_name=config.DEFAULT_MODEL_NAME):
@@ -73,24 +101,30 @@ class ResponseFormatter:
             api_key (str): API key for the Gemini model.
             model_name (str, optional): Name of the model. Defaults to config.DEFAULT_MODEL_NAME.
         """
-        self.gemini_desc = GeminiImageDescription(api_key=api_key, model_name=model_name, delay=0)
+        self.gemini_desc = GeminiImageDescription(api_key=api_key, model_name=model_name)
+        self.description_cache = model_registry.get_description_cache()
 
-    def describe_image(self, image_path):
+    async def describe_image(self, image_path):
         """Generates a description for a single image.
 
         Args:
-            image_path (str): Path to the image file.
+            image_path (str | bytes): Path to the image file, or the encoded image itself.
 
         Returns:
             str: The description of the image or an error message if failed.
         """
-        return self.gemini_desc.get_description(image_path)
+        return await self.gemini_desc.aget_description(image_path)
 
-    def summarize_images(self, image_paths):
+    async def summarize_images(self, image_paths, stored_descriptions=None):
         """Summarizes descriptions of multiple images into a single paragraph.
 
+        Descriptions come from the documents already stored for each image (or the description
+        cache); Gemini is only asked to describe images that have none, and those requests run
+        concurrently.
+
         Args:
             image_paths (list): List of image file paths to summarize.
+            stored_descriptions (dict, optional): Stored descriptions keyed by image id. Defaults to None.
 
         Returns:
             str: A summarized paragraph or a fallback message if no descriptions are available.
@@ -98,55 +132,107 @@ class ResponseFormatter:
         image_paths = [path.replace("../", "app/") for path in image_paths] ## added later
         ## Because in db path is saved as /app/static/image_data
         ## Not as /static/image_data
-        descriptions = [
-            desc for path in image_paths
-            if (desc := self.describe_image(path)) and desc != config.FAILED_IMAGE_LOAD
-        ]
+        stored_descriptions = stored_descriptions or {}
+        descriptions = {}
+        missing = []
+        for path in image_paths:
+            image_id = image_id_for(path)
+            desc = stored_descriptions.get(image_id) or self.description_cache.get(image_id)
+            if desc:
+                descriptions[path] = desc
+                self.description_cache.put(image_id, desc)
+            else:
+                missing.append(path)
+
+        results = await asyncio.gather(*(self.describe_image(path) for path in missing), return_exceptions=True)
+        for path, desc in zip(missing, results):
+            if isinstance(desc, Exception):
+                print(f"Error describing {path}: {desc}")
+            elif desc and desc != config.FAILED_IMAGE_LOAD:
+                descriptions[path] = desc
+                self.description_cache.put(image_id_for(path), desc)
+
+        descriptions = [descriptions[path] for path in image_paths if path in descriptions]
         if not descriptions:
             return config.NO_DESCRIPTION_AVAILABLE
         prompt = config.SUMMARY_PROMPT.format(descriptions="".join([f"- {desc}" for desc in descriptions]))
-        response = self.gemini_desc.invoke_model(HumanMessage(content=prompt))
+        response = await self.gemini_desc.ainvoke_model(HumanMessage(content=prompt))
         return response.content
 
 
 class GalleryChat:
     """Orchestrates the gallery chat system, integrating database, embeddings, and AI responses.
 
+    Only the conversation history is owned by the instance; the database, the CLIP model and the
+    Gemini clients are borrowed from the process-wide model registry, so creating a session is cheap.
+
+    All handlers are coroutines: Gemini calls are awaited, query embeddings come from the batching
+    worker, and blocking Chroma queries run on the shared chat executor, so the event loop stays free
+    and cancelling a turn also cancels its in-flight LLM requests.
+
     Attributes:
         api_key (str): API key for the generative AI model.
-        db (GalleryDatabase): Database instance for image retrieval.
-        embedding_processor (EmbeddingProcessor): Processor for generating embeddings.
-        session (ChatSession): Session manager for conversation history and AI responses.
+        db (GalleryDatabase): Shared database instance for image retrieval.
+        embedding_processor (EmbeddingProcessor): Shared processor for generating embeddings.
+        session (ChatSession): Per-user conversation history and AI responses.
         formatter (ResponseFormatter): Formatter for response generation and summarization.
         utils (ChatUtils): Utility instance for formatting and query analysis.
+        response_cache (ResponseCache): Shared cache of answers keyed by the question text.
     """
 
     def __init__(self):
         """Initializes the gallery chat system with all necessary components."""
         self.api_key = secrets.gemini_api_key
-        self.db = GalleryDatabase()
-        self.embedding_processor = EmbeddingProcessor()
+        self.db = model_registry.get_gallery_database()
+        self.embedding_processor = model_registry.get_embedding_processor()
         self.session = ChatSession(self.api_key)
         self.formatter = ResponseFormatter(self.api_key)
         self.utils = ChatUtils()
+        self.response_cache = model_registry.get_response_cache()
+
+    async def _run_blocking(self, func, *args):
+        """Runs a blocking call on the shared, bounded chat executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(model_registry.get_chat_executor(), func, *args)
+
+    async def _query_embedding(self, user_input, user_image):
+        """Awaits the query embedding computed by the shared batching worker."""
+        futures = self.embedding_processor.submit_query_embedding(user_input, user_image)
+        embeddings = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        return sum(embeddings) / len(embeddings)
 
-    def handle_description_request(self, user_image):
+    async def handle_description_request(self, user_image):
         """Handles requests to describe an uploaded image.
 
         Args:
-            user_image (str): Path to the user-uploaded image.
+            user_image (bytes | str): The user-uploaded image, as encoded bytes or a path.
 
         Returns:
             tuple: (response, data) where:
                 - response (str): Description of the image.
                 - data (dict): Metadata with empty paths and description.
         """
-        description = self.formatter.describe_image(user_image)
+        description = await self.formatter.describe_image(user_image)
         return description, {"paths": [], "combined_description": ""}
 
-    def handle_general_query(self, user_input):
+    def _is_cacheable(self, user_input, user_image=None, uses_history=False):
+        """Checks whether a turn's answer may be shared with other sessions through the response cache.
+
+        Turns with an uploaded image, turns that depend on this session's history and questions
+        that refer to the user or the earlier conversation are personalized and never cached.
+        """
+        if not config.RESPONSE_CACHE_ENABLED or not user_input or user_image:
+            return False
+        if uses_history and self.session.history:
+            return False
+        return not is_personalized(user_input)
+
+    async def handle_general_query(self, user_input):
         """Handles non-image-related general queries with a brief response.
 
+        Answers to the same question from any session are served from the response cache without
+        calling the model.
+
         Args:
             user_input (str): The user's general question.
 
@@ -155,24 +241,92 @@ class GalleryChat:
                 - response (str): Brief answer to the query.
                 - data (dict): Metadata with empty paths and description.
         """
+        cacheable = self._is_cacheable(user_input)
+        if cacheable:
+            cached = self.response_cache.get(GENERAL_SCOPE, user_input)
+            if cached is not None:
+                return cached, {"paths": [], "combined_description": ""}
+
         prompt = config.GENERAL_QUERY_PROMPT.format(query=user_input)
-        response = self.formatter.gemini_desc.invoke_model(HumanMessage(content=prompt))
-        return response.content.strip(), {"paths": [], "combined_description": ""}
+        response = await self.formatter.gemini_desc.ainvoke_model(HumanMessage(content=prompt))
+        answer = response.content.strip()
+        if cacheable:
+            self.response_cache.put(GENERAL_SCOPE, user_input, answer)
+        return answer, {"paths": [], "combined_description": ""}
 
-    def handle_gallery_query(self, user_input, user_image):
+    async def handle_gallery_query(self, user_input, user_image):
         """Handles image-related queries using the gallery database.
 
+        First turns without an uploaded image are served from the response cache when
+        another session asked the same thing against the same version of the gallery.
+
         Args:
             user_input (str, optional): The user's text input. Defaults to None.
-            user_image (str, optional): Path to the user's uploaded image. Defaults to None.
+            user_image (bytes | str, optional): The user's uploaded image, as encoded bytes or a path. Defaults to None.
 
         Returns:
             tuple: (response, data) where:
                 - response (str): Cleaned AI response text (without paths).
                 - data (dict): Metadata with relevant paths and combined description.
         """
-        query_embedding = self.embedding_processor.generate_query_embedding(user_input, user_image)
-        documents, metadatas, image_paths = self.db.retrieve_relevant_documents(query_embedding)
+        search_text, exclude_terms, query_embedding = await self._plan_gallery_query(user_input, user_image)
+        cache_scope = self._gallery_cache_scope(user_input, user_image, exclude_terms)
+        if cache_scope is not None:
+            cached = self.response_cache.get(cache_scope, user_input)
+            if cached is not None:
+                return self._replay_cached_answer(user_input, cached)
+
+        human_message, documents, image_paths = await self._build_gallery_message(
+            user_input, search_text, exclude_terms, query_embedding
+        )
+        response_content = await self.session.generate_response(human_message)
+        result = await self._finish_gallery_response(response_content, documents, image_paths)
+        if cache_scope is not None:
+            self.response_cache.put(cache_scope, user_input, (response_content, result))
+        return result
+
+    def _gallery_cache_scope(self, user_input, user_image, exclude_terms):
+        """Returns the response cache scope of a gallery turn, or None if it must not be cached."""
+        if not self._is_cacheable(user_input, user_image, uses_history=True):
+            return None
+        # Answers are only valid for the gallery contents they were generated from
+        return "gallery", self.db.gallery_index.version, tuple(sorted(exclude_terms))
+
+    def _replay_cached_answer(self, user_input, cached):
+        """Records a cached gallery answer in this session's history and returns a copy of it."""
+        response_content, (clean_response, data) = cached
+        self.session.add_message(HumanMessage(content=user_input))
+        self.session.add_message(AIMessage(content=response_content))
+        return clean_response, {"paths": list(data["paths"]), "combined_description": data["combined_description"]}
+
+    async def _plan_gallery_query(self, user_input, user_image):
+        """Works out what to search for.
+
+        Negated terms ("but not cats") become exclusion filters instead of part of the embedded text.
+
+        Returns:
+            tuple: (search_text, exclude_terms, query_embedding).
+        """
+        search_text, exclude_terms = user_input, []
+        if user_input:
+            positive_text, negated_terms = self.utils.extract_exclusions(user_input)
+            if negated_terms:
+                exclude_terms = await self._run_blocking(self.db.gallery_index.known_terms, negated_terms)
+            if exclude_terms and (positive_text or user_image):
+                search_text = positive_text or None
+
+        query_embedding = await self._query_embedding(search_text, user_image)
+        return search_text, exclude_terms, query_embedding
+
+    async def _build_gallery_message(self, user_input, search_text, exclude_terms, query_embedding):
+        """Retrieves the images closest to the query and builds the prompt for the chat model.
+
+        Returns:
+            tuple: (human_message, documents, image_paths) for the retrieved images.
+        """
+        documents, metadatas, image_paths = await self._run_blocking(
+            self.db.retrieve_relevant_documents, query_embedding, config.RETRIEVAL_TOP_K, None, exclude_terms, search_text
+        )
 
         formatted_data = self.utils.format_retrieved_data(documents, metadatas)
         human_content = config.HUMAN_MESSAGE_TEMPLATE.format(
@@ -180,25 +334,37 @@ class GalleryChat:
             data=formatted_data,
             paths=", ".join(image_paths) if image_paths else "None"
         )
-        human_message = HumanMessage(content=human_content)
+        return HumanMessage(content=human_content), documents, image_paths
 
-        response_content = self.session.generate_response(human_message)
+    def _parse_gallery_response(self, response_content, image_paths):
+        """Splits a gallery answer into the text shown to the user and the referenced image paths."""
         clean_response = self.utils.clean_response_text(response_content)
         relevant_paths = self.utils.extract_relevant_paths(response_content, image_paths)
 
         # Ensure clean_response doesn’t include "Relevant images:" by splitting if necessary
         if config.RELEVANT_IMAGES_PREFIX in clean_response:
             clean_response = clean_response.split(config.RELEVANT_IMAGES_PREFIX)[0].strip()
-
-        combined_description = self.formatter.summarize_images(relevant_paths) if relevant_paths else config.NO_IMAGES_FOUND
+        return clean_response, relevant_paths
+
+    async def _summarize_relevant(self, relevant_paths, documents, image_paths):
+        """Builds the combined description of the images an answer refers to."""
+        if not relevant_paths:
+            return config.NO_IMAGES_FOUND
+        stored_descriptions = {image_id_for(path): doc for path, doc in zip(image_paths, documents)}
+        return await self.formatter.summarize_images(relevant_paths, stored_descriptions)
+
+    async def _finish_gallery_response(self, response_content, documents, image_paths):
+        """Turns the raw model answer into the (response, data) pair returned by `chat`."""
+        clean_response, relevant_paths = self._parse_gallery_response(response_content, image_paths)
+        combined_description = await self._summarize_relevant(relevant_paths, documents, image_paths)
         return clean_response, {"paths": relevant_paths, "combined_description": combined_description}
 
-    def chat(self, user_input=None, user_image=None):
+    async def chat(self, user_input=None, user_image=None):
         """Processes a user query and returns a response with relevant image data.
 
         Args:
             user_input (str, optional): The user's text input. Defaults to None.
-            user_image (str, optional): Path to the user's uploaded image. Defaults to None.
+            user_image (bytes | str, optional): The user's uploaded image, as encoded bytes or a path. Defaults to None.
 
         Returns:
             tuple: (response, data) where:
@@ -206,8 +372,79 @@ class GalleryChat:
                 - data (dict): Dictionary with 'paths' (list) and 'combined_description' (str).
         """
         if user_image and user_input and self.utils.is_description_request(user_input):
-            return self.handle_description_request(user_image)
+            return await self.handle_description_request(user_image)
         if not user_image and user_input and not self.utils.is_image_related_query(user_input):
-            return self.handle_general_query(user_input)
-        return self.handle_gallery_query(user_input, user_image)
+            return await self.handle_general_query(user_input)
+        return await self.handle_gallery_query(user_input, user_image)
+
+
+    async def stream_chat(self, user_input=None, user_image=None):
+        """Processes a user query like `chat`, but yields the answer incrementally.
+
+        Events are (name, data) pairs:
+            - ("token", {"text": str}): a piece of the answer; the 'Relevant images:' list is held back.
+            - ("images", {"response": str, "paths": list}): the cleaned full answer and the images it refers to.
+            - ("description", {"combined_description": str}): the summary of those images, once ready.
+            - ("done", {}): the turn is complete.
 
+        Args:
+            user_input (str, optional): The user's text input. Defaults to None.
+            user_image (bytes | str, optional): The user's uploaded image, as encoded bytes or a path. Defaults to None.
+
+        Yields:
+            tuple: (event name, event data).
+        """
+        if user_image and user_input and self.utils.is_description_request(user_input):
+            description = await self.formatter.describe_image(user_image)
+            yield "token", {"text": description}
+            yield "images", {"response": description, "paths": []}
+        elif not user_image and user_input and not self.utils.is_image_related_query(user_input):
+            cacheable = self._is_cacheable(user_input)
+            answer = self.response_cache.get(GENERAL_SCOPE, user_input) if cacheable else None
+            if answer is not None:
+                yield "token", {"text": answer}
+            else:
+                prompt = config.GENERAL_QUERY_PROMPT.format(query=user_input)
+                parts = []
+                async for chunk in self.formatter.gemini_desc.client.astream([HumanMessage(content=prompt)]):
+                    parts.append(chunk.content)
+                    yield "token", {"text": chunk.content}
+                answer = "".join(parts).strip()
+                if cacheable:
+                    self.response_cache.put(GENERAL_SCOPE, user_input, answer)
+            yield "images", {"response": answer, "paths": []}
+        else:
+            search_text, exclude_terms, query_embedding = await self._plan_gallery_query(user_input, user_image)
+            cache_scope = self._gallery_cache_scope(user_input, user_image, exclude_terms)
+            cached = self.response_cache.get(cache_scope, user_input) if cache_scope is not None else None
+            if cached is not None:
+                clean_response, data = self._replay_cached_answer(user_input, cached)
+                yield "token", {"text": clean_response}
+                yield "images", {"response": clean_response, "paths": data["paths"]}
+                yield "description", {"combined_description": data["combined_description"]}
+                yield "done", {}
+                return
+
+            human_message, documents, image_paths = await self._build_gallery_message(
+                user_input, search_text, exclude_terms, query_embedding
+            )
+            stream_filter = RelevantImagesStreamFilter()
+            parts = []
+            async for text in self.session.stream_response(human_message):
+                parts.append(text)
+                visible = stream_filter.feed(text)
+                if visible:
+                    yield "token", {"text": visible}
+            visible = stream_filter.flush()
+            if visible:
+                yield "token", {"text": visible}
+
+            response_content = "".join(parts)
+            clean_response, relevant_paths = self._parse_gallery_response(response_content, image_paths)
+            yield "images", {"response": clean_response, "paths": relevant_paths}
+            combined_description = await self._summarize_relevant(relevant_paths, documents, image_paths)
+            yield "description", {"combined_description": combined_description}
+            if cache_scope is not None:
+                result = clean_response, {"paths": relevant_paths, "combined_description": combined_description}
+                self.response_cache.put(cache_scope, user_input, (response_content, result))
+        yield "done", {}
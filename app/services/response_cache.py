@@ -0,0 +1,125 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from app.config import config
+
+_QUESTION_TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[^\sa-z0-9]")
+
+
+def normalize_question(text):
+    """Returns the cache key form of a question.
+
+    Only case, spacing and trailing sentence punctuation are folded, so "Show me dogs" and
+    "show me  dogs?" share an entry while questions differing in a number, a negation or a name
+    never do.
+
+    Args:
+        text (str): The question as typed.
+
+    Returns:
+        str: The normalized question.
+    """
+    tokens = _QUESTION_TOKEN_PATTERN.findall(text.lower())
+    while tokens and tokens[-1] in ".?!":
+        tokens.pop()
+    return " ".join(tokens)
+
+
+def is_personalized(text, markers=config.PERSONALIZED_QUERY_MARKERS):
+    """Checks whether a question refers to the user or the earlier conversation.
+
+    Args:
+        text (str): The question as typed.
+        markers (Iterable[str], optional): Marker words. Defaults to config.PERSONALIZED_QUERY_MARKERS.
+
+    Returns:
+        bool: True if the answer must not be shared with other sessions.
+    """
+    return not set(re.findall(r"[a-z']+", text.lower())).isdisjoint(markers)
+
+
+class ResponseCache:
+    """Process-wide cache of chat answers keyed by the normalized question text.
+
+    Entries live in scopes: general-knowledge answers share one scope, while gallery answers are
+    scoped by the gallery version they were generated from, so new uploads never serve stale
+    answers. Entries expire after `ttl_seconds`, and the least recently used one is evicted once
+    `maxsize` is reached.
+
+    Questions are matched on their full normalized text rather than on embedding similarity: CLIP
+    embeddings of questions that differ in one number, a "not" or an entity name are nearly
+    identical, and its 77-token window makes long questions with a shared prefix collide.
+
+    Attributes:
+        maxsize (int): Maximum number of cached answers.
+        ttl_seconds (float): Lifetime of an entry.
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that were not.
+    """
+
+    def __init__(self, maxsize=config.RESPONSE_CACHE_SIZE, ttl_seconds=config.RESPONSE_CACHE_TTL_SECONDS):
+        """Initializes an empty cache.
+
+        Args:
+            maxsize (int, optional): Maximum entries. Defaults to config.RESPONSE_CACHE_SIZE.
+            ttl_seconds (float, optional): Entry lifetime. Defaults to config.RESPONSE_CACHE_TTL_SECONDS.
+        """
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (scope, question) -> (value, expires_at), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, scope, question):
+        """Returns the answer cached for `question` in `scope`, or None.
+
+        Args:
+            scope (tuple): Cache scope, e.g. ("general",) or ("gallery", version, filters).
+            question (str): The question as typed.
+        """
+        key = (scope, normalize_question(question))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, scope, question, value):
+        """Caches `value` as the answer to `question` in `scope`."""
+        key = (scope, normalize_question(question))
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drops every entry; counters are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Returns size and hit/miss counters for monitoring.
+
+        Returns:
+            dict: size, maxsize, hits, misses and hit_rate.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
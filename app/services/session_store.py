@@ -0,0 +1,155 @@
+import heapq
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from app.config import config
+from app.utils.cache import LRUCache
+
+# Rough fixed cost of a GalleryChat and its ChatSession, excluding the history contents
+SESSION_BASE_BYTES = 4096
+MESSAGE_OVERHEAD_BYTES = 512
+
+
+def estimate_history_bytes(history):
+    """Roughly estimates the memory held by a list of chat messages.
+
+    Args:
+        history (list[BaseMessage]): The messages of a conversation.
+
+    Returns:
+        int: Estimated size in bytes.
+    """
+    total = 0
+    for message in history:
+        content = message.content
+        parts = [content] if isinstance(content, str) else content
+        for part in parts:
+            total += sys.getsizeof(part if isinstance(part, str) else str(part))
+        total += MESSAGE_OVERHEAD_BYTES
+    return total
+
+
+class SessionStore:
+    """Bounded, thread-safe store of chat sessions.
+
+    Sessions expire after `ttl_seconds` without use and the least recently used session is evicted
+    once `max_sessions` is reached, so memory stays flat no matter how many sessions were ever
+    created. Ids of removed sessions are remembered in a bounded tombstone cache, letting callers
+    tell an evicted session (which the client should restart) from one that never existed.
+
+    Attributes:
+        ttl_seconds (float): Idle time after which a session expires.
+        max_sessions (int): Maximum number of live sessions.
+        evicted (int): Sessions removed because the store was full.
+        expired (int): Sessions removed because they were idle for too long.
+    """
+
+    def __init__(self, ttl_seconds=config.SESSION_TTL_SECONDS, max_sessions=config.MAX_SESSIONS,
+                 tombstone_size=config.SESSION_TOMBSTONE_CACHE_SIZE):
+        """Initializes an empty store.
+
+        Args:
+            ttl_seconds (float, optional): Idle timeout. Defaults to config.SESSION_TTL_SECONDS.
+            max_sessions (int, optional): Session limit. Defaults to config.MAX_SESSIONS.
+            tombstone_size (int, optional): Removed ids remembered. Defaults to config.SESSION_TOMBSTONE_CACHE_SIZE.
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.evicted = 0
+        self.expired = 0
+        self._sessions = OrderedDict()  # session_id -> (session, last_used), least recently used first
+        self._tombstones = LRUCache(maxsize=tombstone_size)
+        self._lock = threading.Lock()
+
+    def _remove(self, session_id):
+        self._sessions.pop(session_id)
+        self._tombstones.put(session_id, True)
+
+    def _expire_idle(self, now):
+        # Entries are kept in last-used order, so only the head can be stale
+        while self._sessions:
+            session_id, (_, last_used) = next(iter(self._sessions.items()))
+            if now - last_used <= self.ttl_seconds:
+                break
+            self._remove(session_id)
+            self.expired += 1
+
+    def create(self, session):
+        """Stores a new session under a fresh id, evicting the least recently used one if full.
+
+        Args:
+            session (GalleryChat): The session to store.
+
+        Returns:
+            str: The generated session id.
+        """
+        session_id = str(uuid.uuid4())
+        now = time.monotonic()
+        with self._lock:
+            self._expire_idle(now)
+            while len(self._sessions) >= self.max_sessions:
+                self._remove(next(iter(self._sessions)))
+                self.evicted += 1
+            self._sessions[session_id] = (session, now)
+        return session_id
+
+    def get(self, session_id):
+        """Returns the session for `session_id` and marks it as used, or None if it is not live.
+
+        Args:
+            session_id (str): The session id.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire_idle(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            self._sessions[session_id] = (entry[0], now)
+            self._sessions.move_to_end(session_id)
+            return entry[0]
+
+    def was_removed(self, session_id):
+        """Returns True if `session_id` belonged to a session that expired or was evicted."""
+        return session_id in self._tombstones
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self, top=config.SESSION_STATS_TOP_N):
+        """Returns counters and memory estimates for monitoring.
+
+        Args:
+            top (int, optional): Number of largest sessions listed individually. Defaults to config.SESSION_STATS_TOP_N.
+
+        Returns:
+            dict: live session count, limits, eviction counters, estimated memory use in bytes and
+            the `top` largest sessions with their estimated bytes, message count and idle time. Session
+            ids are left out: they are the only credential of a conversation.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire_idle(now)
+            entries = list(self._sessions.values())
+        per_session = [
+            {
+                "estimated_bytes": SESSION_BASE_BYTES + estimate_history_bytes(session.session.history),
+                "messages": len(session.session.history),
+                "idle_seconds": round(now - last_used, 1),
+            }
+            for session, last_used in entries
+        ]
+        session_bytes = [entry["estimated_bytes"] for entry in per_session]
+        return {
+            "sessions": len(per_session),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "tombstones": len(self._tombstones),
+            "estimated_bytes": sum(session_bytes),
+            "max_session_bytes": max(session_bytes, default=0),
+            "largest_sessions": heapq.nlargest(top, per_session, key=lambda entry: entry["estimated_bytes"]),
+        }
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+from app.config import config
+from app.utils.processes import worker_context
+
+_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+
+
+def file_content_hash(image_path, chunk_size=1024 * 1024):
+    """Returns the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(image_path, "rb") as image_file:
+        for chunk in iter(lambda: image_file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def thumbnail_filename(content_hash, width, image_format=config.THUMBNAIL_FORMAT):
+    """Returns the content-addressed file name of a derivative, e.g. '<sha256>_320.webp'."""
+    return f"{content_hash}_{width}.{_EXTENSIONS[image_format]}"
+
+
+def thumbnail_url(content_hash, width, image_format=config.THUMBNAIL_FORMAT):
+    """Returns the frontend path of a derivative, in the same '../static/...' form as original images."""
+    return f"../static/{config.THUMBNAIL_URL_DIR}/{thumbnail_filename(content_hash, width, image_format)}"
+
+
+def thumbnail_urls(content_hash, widths=config.THUMBNAIL_WIDTHS, image_format=config.THUMBNAIL_FORMAT):
+    """Returns {width: url} for every configured derivative of an image, or {} if it has none yet."""
+    if not content_hash:
+        return {}
+    return {width: thumbnail_url(content_hash, width, image_format) for width in widths}
+
+
+def generate_thumbnails(image_path, output_dir=config.THUMBNAIL_DIR_PATH, widths=config.THUMBNAIL_WIDTHS,
+                        image_format=config.THUMBNAIL_FORMAT, quality=config.THUMBNAIL_QUALITY):
+    """Writes fixed-width derivatives of an image under content-addressed names.
+
+    Derivatives that already exist are not rebuilt, so identical uploads share their files and
+    re-running ingest is cheap. Images narrower than a target width are stored at their own size.
+    Runs in worker processes, so it only depends on PIL and the config module.
+
+    Args:
+        image_path (str): Path to the original image.
+        output_dir (str, optional): Directory for derivatives. Defaults to config.THUMBNAIL_DIR_PATH.
+        widths (tuple[int], optional): Target widths. Defaults to config.THUMBNAIL_WIDTHS.
+        image_format (str, optional): "WEBP" or "JPEG". Defaults to config.THUMBNAIL_FORMAT.
+        quality (int, optional): Encoder quality. Defaults to config.THUMBNAIL_QUALITY.
+
+    Returns:
+        str: The content hash the derivative names are based on.
+    """
+    content_hash = file_content_hash(image_path)
+    targets = {
+        width: os.path.join(output_dir, thumbnail_filename(content_hash, width, image_format))
+        for width in widths
+    }
+    missing = {width: path for width, path in targets.items() if not os.path.exists(path)}
+    if not missing:
+        return content_hash
+
+    os.makedirs(output_dir, exist_ok=True)
+    with Image.open(image_path) as image:
+        largest = max(missing)
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+
+    # Largest first so each step downsizes the previous result instead of the original
+    for width in sorted(missing, reverse=True):
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))),
+                                 Image.LANCZOS, reducing_gap=3.0)
+        tmp_path = missing[width] + ".tmp"
+        image.save(tmp_path, format=image_format, quality=quality)
+        os.replace(tmp_path, missing[width])
+    return content_hash
+
+
+class ThumbnailGenerator:
+    """Generates responsive derivatives of gallery images in a worker process pool.
+
+    Attributes:
+        num_workers (int): Number of worker processes.
+    """
+
+    def __init__(self, num_workers=config.THUMBNAIL_NUM_WORKERS):
+        """Initializes the generator; worker processes start on first use.
+
+        Args:
+            num_workers (int, optional): Worker processes. Defaults to config.THUMBNAIL_NUM_WORKERS.
+        """
+        self.num_workers = num_workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def submit(self, image_path):
+        """Schedules derivative generation for an image.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the image's content hash.
+        """
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.num_workers, mp_context=worker_context()
+                )
+            return self._pool.submit(generate_thumbnails, image_path)
+
+    def close(self):
+        """Shuts the worker pool down."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
@@ -22,17 +22,18 @@ window.addEventListener('scroll', () => {
 const modal = document.getElementById('image-modal');
 const modalImage = document.getElementById('modal-image');
 const closeModal = document.getElementById('close-modal');
-const galleryItems = document.querySelectorAll('.gallery-item');
-
-galleryItems.forEach(item => {
-    item.addEventListener('click', () => {
-        const imgSrc = item.querySelector('img').src;
-        modalImage.src = imgSrc;
-        modal.classList.remove('hidden');
-        setTimeout(() => {
-            modal.classList.remove('opacity-0');
-        }, 10);
-    });
+const galleryGrid = document.getElementById('gallery-grid');
+
+// Delegated so items appended by infinite scroll behave the same
+galleryGrid.addEventListener('click', (e) => {
+    const item = e.target.closest('.gallery-item');
+    if (!item) return;
+    const img = item.querySelector('img');
+    modalImage.src = img.dataset.full || img.src;
+    modal.classList.remove('hidden');
+    setTimeout(() => {
+        modal.classList.remove('opacity-0');
+    }, 10);
 });
 
 closeModal.addEventListener('click', () => {
@@ -60,4 +61,43 @@ gsap.from('.gallery-item', {
     opacity: 0,
     duration: 1,
     stagger: 0.2
-});
\ No newline at end of file
+});
+
+// Infinite scroll: fetch the next rendered page when the sentinel becomes visible
+const sentinel = document.getElementById('gallery-sentinel');
+let nextCursor = sentinel.dataset.nextCursor;
+let loadingPage = false;
+
+async function loadNextPage() {
+    if (loadingPage || !nextCursor) return;
+    loadingPage = true;
+    try {
+        const response = await fetch(`/api/gallery/fragment?cursor=${encodeURIComponent(nextCursor)}`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! Status: ${response.status}`);
+        }
+        nextCursor = response.headers.get('X-Next-Cursor');
+        const template = document.createElement('template');
+        template.innerHTML = await response.text();
+        const newItems = [...template.content.querySelectorAll('.gallery-item')];
+        galleryGrid.appendChild(template.content);
+        gsap.from(newItems, {y: 60, opacity: 0, duration: 0.6, stagger: 0.05});
+    } catch (error) {
+        console.error('Error loading gallery page:', error);
+    } finally {
+        loadingPage = false;
+    }
+    if (!nextCursor) {
+        observer.disconnect();
+    }
+}
+
+const observer = new IntersectionObserver((entries) => {
+    if (entries.some(entry => entry.isIntersecting)) {
+        loadNextPage();
+    }
+}, {rootMargin: '600px'});
+
+if (nextCursor) {
+    observer.observe(sentinel);
+}
\ No newline at end of file
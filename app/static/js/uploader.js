@@ -138,18 +138,37 @@ async function uploadFiles(files) {
             successMessage.textContent = result.message;
             successMessage.classList.remove('hidden');
 
-            // Optionally, hide success message after 5 seconds
+            // Follow the ingest job, then hide the message 5 seconds after it finishes
+            await trackJob(result.job_id, successMessage);
             setTimeout(() => {
                 successMessage.classList.add('hidden');
             }, 5000);
         } else {
-            alert('Upload failed: ' + result.message);
+            alert('Upload failed: ' + (result.message || result.detail));
         }
     } catch (error) {
         alert('Error uploading files: ' + error.message);
     }
 }
 
+async function trackJob(jobId, messageElement) {
+    // Poll the ingest job until every uploaded image is processed
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 2000));
+        const response = await fetch(`/jobs/${jobId}`);
+        if (!response.ok) return;
+        const job = await response.json();
+        if (job.status === 'completed' || job.status === 'failed') {
+            const failed = job.counts.failed;
+            messageElement.textContent = failed
+                ? `Processed ${job.total - failed} of ${job.total} images; ${failed} could not be added.`
+                : `All ${job.total} images have been added to the gallery!`;
+            return;
+        }
+        messageElement.textContent = `Processing images: ${job.processed} of ${job.total} done...`;
+    }
+}
+
 // Cancel upload
 cancelUpload.addEventListener('click', () => {
     gsap.to(uploadProgress, {
@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe, size-bounded least-recently-used cache with hit/miss accounting.
+
+    Attributes:
+        maxsize (int): Maximum number of entries kept before the least recently used one is evicted.
+        hits (int): Number of lookups that found an entry.
+        misses (int): Number of lookups that did not.
+        nbytes (int): Estimated memory held by the entries, when a `sizeof` function was given.
+    """
+
+    def __init__(self, maxsize=1024, sizeof=None):
+        """Initializes an empty cache.
+
+        Args:
+            maxsize (int, optional): Maximum number of entries. Defaults to 1024.
+            sizeof (callable, optional): Estimates the bytes of a (key, value) pair for memory accounting.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._sizeof = sizeof
+        self._sizes = {}
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _forget(self, key):
+        if self._sizeof is not None:
+            self.nbytes -= self._sizes.pop(key, 0)
+
+    def get(self, key, default=None):
+        """Returns the value for `key` and marks it as recently used, or `default` if absent."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """Stores `value` under `key`, evicting the least recently used entry when full."""
+        with self._lock:
+            self._forget(key)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if self._sizeof is not None:
+                self._sizes[key] = self._sizeof(key, value)
+                self.nbytes += self._sizes[key]
+            while len(self._data) > self.maxsize:
+                evicted, _ = self._data.popitem(last=False)
+                self._forget(evicted)
+
+    def pop(self, key, default=None):
+        """Removes `key` and returns its value, or `default` if absent."""
+        with self._lock:
+            self._forget(key)
+            return self._data.pop(key, default)
+
+    def clear(self):
+        """Drops every entry; counters are kept."""
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.nbytes = 0
+
+    def items(self):
+        """Returns a snapshot list of (key, value) pairs, least recently used first."""
+        with self._lock:
+            return list(self._data.items())
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Returns size and hit/miss counters for monitoring.
+
+        Returns:
+            dict: size, maxsize, hits, misses and hit_rate, plus estimated bytes when tracked.
+        """
+        lookups = self.hits + self.misses
+        stats = {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+        if self._sizeof is not None:
+            stats["bytes"] = self.nbytes
+        return stats
@@ -0,0 +1,23 @@
+import os
+
+# Extensions of the image files ingest picks up, compared case-insensitively
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def image_id_for(image_path):
+    """Returns the collection id of an image: its file name without extension."""
+    return os.path.splitext(os.path.basename(image_path))[0]
+
+
+def is_image_file(filename):
+    """Checks whether `filename` is a visible file with an image extension, in any case."""
+    return not filename.startswith(".") and os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+
+
+def list_image_files(image_directory):
+    """Returns the paths of the image files directly in `image_directory`, sorted by file name."""
+    return [
+        os.path.join(image_directory, image_filename)
+        for image_filename in sorted(os.listdir(image_directory))
+        if is_image_file(image_filename)
+    ]
@@ -0,0 +1,54 @@
+import multiprocessing
+import os
+
+# Modules worker processes import up front; both only depend on PIL, NumPy and the config module
+WORKER_PRELOAD = ["app.services.image_preprocessing", "app.services.thumbnails"]
+
+
+def worker_context():
+    """Returns the multiprocessing context used for image worker pools.
+
+    Workers must not inherit torch's thread pools, so they are never forked from the server
+    process. Where available they are forked from a fork server that preloaded WORKER_PRELOAD, so
+    the modules they need are imported once rather than per worker; platforms without fork servers
+    (Windows) fall back to spawn.
+
+    With either start method every worker still re-imports the parent's main module (as
+    `__mp_main__`), except a package's `__main__`. The server is therefore started with
+    `python -m app`, whose main module is never re-imported, or `uvicorn app.main:app`, whose main
+    module is uvicorn's. `python -m app.main` would make each worker import FastAPI, every router
+    and the model clients.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(WORKER_PRELOAD)
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def try_lock_file(path):
+    """Takes an exclusive lock on `path` without waiting.
+
+    The lock belongs to the returned open file and is released when it is closed or the process
+    exits, however it exits, so a crashed holder never leaves a stale lock behind.
+
+    Args:
+        path (str): Lock file, created if missing.
+
+    Returns:
+        file | None: The open lock file, or None if another process (or file object) holds the lock.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    lock_file = open(path, "a+b")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
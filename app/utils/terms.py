@@ -0,0 +1,60 @@
+import re
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def normalize_term(term):
+    """Normalizes a tag, object or color name for exact matching.
+
+    Lowercases, keeps only letters and digits, and strips simple English plurals so that
+    'Cats', 'cat' and 'puppies'/'puppy' map to the same key.
+
+    Args:
+        term (str): The raw term.
+
+    Returns:
+        str: The normalized term, or '' if nothing is left.
+    """
+    words = []
+    for word in _WORD_PATTERN.findall(term.lower()):
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 4 and word.endswith(("ches", "shes", "sses", "xes", "zes")):
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return " ".join(words)
+
+
+def index_terms(term):
+    """Returns the keys a term is indexed under: the whole phrase and each of its words."""
+    phrase = normalize_term(term)
+    if not phrase:
+        return set()
+    return {phrase, *phrase.split(" ")}
+
+
+# Words too common in descriptions and chat queries to help lexical ranking
+STOPWORDS = frozenset("""
+a an and are as at be but by can do for from have has i image images in is it its me of on or
+photo photos picture pictures show that the their there these this to with you your find gallery
+any some all please want looking look like similar
+""".split())
+
+
+def tokenize(text):
+    """Splits text into normalized, stopword-free tokens for lexical indexing and search.
+
+    Args:
+        text (str): Description, tag list or query text.
+
+    Returns:
+        list[str]: Normalized tokens in order, with repeats.
+    """
+    tokens = []
+    for word in _WORD_PATTERN.findall(text.lower()):
+        token = normalize_term(word)
+        if token and token not in STOPWORDS and word not in STOPWORDS:
+            tokens.append(token)
+    return tokens
@@ -0,0 +1,123 @@
+import os
+import re
+import threading
+import time
+import uuid
+
+# Leading bytes of the formats ingest accepts, and the extensions each may keep
+_IMAGE_SIGNATURES = ((b"\xff\xd8\xff", "jpg"), (b"\x89PNG\r\n\x1a\n", "png"))
+_EXTENSION_ALIASES = {"jpg": ("jpg", "jpeg"), "png": ("png",)}
+# Extensions a stored image may have, including the upper-case ones of files stored before names were normalized
+_STORED_EXTENSIONS = tuple(f".{alias}" for aliases in _EXTENSION_ALIASES.values() for alias in aliases)
+_STORED_EXTENSIONS += tuple(extension.upper() for extension in _STORED_EXTENSIONS)
+
+# Suffix of uploads still being streamed to disk
+STAGED_SUFFIX = ".part"
+
+# Serializes the stem checks of concurrent uploads in this process
+_publish_lock = threading.Lock()
+
+
+def sniff_image_type(header: bytes):
+    """Identifies the image format from its leading bytes.
+
+    Args:
+        header (bytes): The first bytes of the file.
+
+    Returns:
+        str | None: The file extension for the format ("jpg" or "png"), or None if unsupported.
+    """
+    for signature, extension in _IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    return None
+
+
+def target_filename(filename: str, extension: str):
+    """Returns a safe file name for the image store, with a lower-case extension matching the sniffed content."""
+    stem, current_extension = os.path.splitext(os.path.basename(filename or ""))
+    stem = re.sub(r"[^\w.-]", "_", stem).lstrip(".") or uuid.uuid4().hex
+    current_extension = current_extension.lower().lstrip(".")
+    if current_extension in _EXTENSION_ALIASES[extension]:
+        return f"{stem}.{current_extension}"
+    return f"{stem}.{extension}"
+
+
+def _stored_with_stem(directory, stem):
+    """Returns the path of a stored image named `stem` with any image extension, or None."""
+    return next((os.path.join(directory, stem + alias) for alias in _STORED_EXTENSIONS
+                 if os.path.exists(os.path.join(directory, stem + alias))), None)
+
+
+def publish_upload(tmp_path: str, directory: str, filename: str, sha256: str):
+    """Moves a staged upload into the image store without clobbering a different image.
+
+    Images are identified by their file stem, so an upload whose stem is taken by a stored file with
+    other content is stored under its stem plus the start of its SHA-256 instead. The final name is
+    claimed with a hard link, which fails rather than overwrites if another request (in this or
+    another process) claimed the same name first; the stem check is serialized within the process.
+    Re-uploading identical content keeps the stored file and its name.
+
+    Args:
+        tmp_path (str): The staged upload, in `directory`; removed once published.
+        directory (str): The image store.
+        filename (str): The name from `target_filename`.
+        sha256 (str): Hex digest of the upload.
+
+    Returns:
+        str: The file name the image is stored under.
+
+    Raises:
+        FileExistsError: If no free name was found, which needs a SHA-256 prefix collision.
+    """
+    from app.services.thumbnails import file_content_hash
+
+    stem, extension = os.path.splitext(filename)
+    with _publish_lock:
+        for candidate_stem in (stem, f"{stem}-{sha256[:12]}"):
+            existing = _stored_with_stem(directory, candidate_stem)
+            if existing is None:
+                try:
+                    os.link(tmp_path, os.path.join(directory, candidate_stem + extension))
+                except FileExistsError:
+                    existing = os.path.join(directory, candidate_stem + extension)
+                else:
+                    os.remove(tmp_path)
+                    return candidate_stem + extension
+            if file_content_hash(existing) == sha256:
+                os.remove(tmp_path)
+                return os.path.basename(existing)
+    raise FileExistsError(f"No free name for {filename} in {directory}")
+
+
+def staged_upload_path(directory: str):
+    """Returns a fresh hidden path in `directory` to stream an upload to."""
+    return os.path.join(directory, f".{uuid.uuid4().hex}{STAGED_SUFFIX}")
+
+
+def sweep_staged_uploads(directory: str, max_age_seconds: float):
+    """Removes staged uploads left behind by a crash.
+
+    Only files older than `max_age_seconds` are removed, so uploads another server process is
+    still streaming are left alone.
+
+    Args:
+        directory (str): The image store.
+        max_age_seconds (float): Minimum age of a removed file.
+
+    Returns:
+        int: Number of files removed.
+    """
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for filename in os.listdir(directory):
+        path = os.path.join(directory, filename)
+        if not (filename.startswith(".") and filename.endswith(STAGED_SUFFIX)):
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
@@ -1,7 +1,7 @@
 import re
 from app.config import config
+from app.utils.terms import normalize_term
 from app.vectrodb_models.data_loader import ChromaDBClient, ChromaDBDataRetriever
-from app.vectrodb_models.vectordb import ChromaDatabase
 
 
 class PathRetriever:
@@ -11,7 +11,7 @@ class PathRetriever:
         self.data_retriever = ChromaDBDataRetriever(
             client=self.db_client,
             collection_name=collection_name,
-            include_embeddings=True,
+            include_embeddings=False,
             include_metadatas=True,
             include_documents=True
         )
@@ -161,6 +161,33 @@ class ChatUtils:
         return any(keyword in lower_input for keyword in config.DESCRIBE_KEYWORDS) and \
                any(phrase in lower_input for phrase in config.THIS_IMAGE_PHRASES)
 
+    def extract_exclusions(self, user_input):
+        """Splits negated terms out of a query, e.g. 'dogs but not cats' -> ('dogs', ['cat']).
+
+        Args:
+            user_input (str): The user's input text.
+
+        Returns:
+            tuple: (positive_text, exclude_terms) where positive_text is the query without the
+                negated phrases and exclude_terms are normalized terms to filter out.
+        """
+        keywords = "|".join(re.escape(keyword) for keyword in config.NEGATION_KEYWORDS)
+        pattern = re.compile(
+            rf"(?:\bwith\s+)?\b(?:{keywords})\s+(?:containing\s+|including\s+|showing\s+|having\s+)?"
+            r"(?:any\s+|a\s+|an\s+|the\s+)?"
+            r"([a-z][a-z0-9\s,-]*?)(?=$|[.;:!?]|\s+(?:and|but|with|in|on|at|that|which|please)\b)",
+            re.IGNORECASE
+        )
+        exclude_terms = []
+        for match in pattern.finditer(user_input):
+            for term in re.split(r",|\bor\b|\bnor\b", match.group(1)):
+                term = normalize_term(term)
+                if term and term not in exclude_terms:
+                    exclude_terms.append(term)
+        positive_text = re.sub(r"\s+([.,;:!?])", r"\1", re.sub(r"\s{2,}", " ", pattern.sub("", user_input)))
+        positive_text = positive_text.strip(" ,")
+        return positive_text, exclude_terms
+
     def is_image_related_query(self, user_input):
         """Checks if the user input is related to images or gallery content.
 
@@ -173,10 +200,37 @@ class ChatUtils:
         return any(keyword in user_input.lower() for keyword in config.IMAGE_RELATED_KEYWORDS)
 
 
-def process_images_background(directory: str):
-    try:
-        db = ChromaDatabase(collection_name=config.DEFAULT_COLLECTION_NAME, persist_directory=config.DEFAULT_DB_PATH)
-        db.store_images_in_chroma(directory)
+class RelevantImagesStreamFilter:
+    """Filters streamed response text so the trailing 'Relevant images: ...' list is never shown.
+
+    Text that could be the start of the prefix is held back until it is clear whether it is.
+
+    Attributes:
+        prefix (str): The marker after which the model lists image paths.
+    """
 
-    except Exception as e:
-        print(f"Error processing images: {str(e)}")
+    def __init__(self, prefix=config.RELEVANT_IMAGES_PREFIX):
+        self.prefix = prefix
+        self._buffer = ""
+        self._done = False
+
+    def feed(self, text):
+        """Adds a chunk of streamed text and returns the part that is safe to show."""
+        if self._done:
+            return ""
+        self._buffer += text
+        if self.prefix in self._buffer:
+            self._done = True
+            return self._buffer.split(self.prefix)[0]
+        safe_length = len(self._buffer) - (len(self.prefix) - 1)
+        if safe_length <= 0:
+            return ""
+        visible, self._buffer = self._buffer[:safe_length], self._buffer[safe_length:]
+        return visible
+
+    def flush(self):
+        """Returns any held-back text once the stream has ended."""
+        if self._done:
+            return ""
+        visible, self._buffer = self._buffer, ""
+        return visible
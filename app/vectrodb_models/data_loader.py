@@ -1,5 +1,6 @@
 import chromadb
 from typing import Dict, List, Optional
+from app.services.model_registry import model_registry
 
 
 class ChromaDBClient:
@@ -11,7 +12,7 @@ class ChromaDBClient:
             persist_directory (Optional[str]): Path to the persistent database directory. If None, uses in-memory.
         """
         if persist_directory:
-            self.client = chromadb.PersistentClient(path=persist_directory)
+            self.client = model_registry.get_chroma_client(persist_directory)
         else:
             self.client = chromadb.Client()
 
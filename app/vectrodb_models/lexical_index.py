@@ -0,0 +1,100 @@
+import heapq
+import math
+from collections import Counter
+from operator import itemgetter
+from app.config import config
+
+
+class BM25Index:
+    """Incremental Okapi BM25 index over short documents.
+
+    Documents can be added, replaced and removed one at a time, so ingest keeps the index
+    current without rebuilds. Not thread-safe; the owner serializes access.
+
+    Attributes:
+        k1 (float): Term frequency saturation.
+        b (float): Document length normalization.
+    """
+
+    def __init__(self, k1=config.BM25_K1, b=config.BM25_B):
+        """Initializes an empty index.
+
+        Args:
+            k1 (float, optional): Term frequency saturation. Defaults to config.BM25_K1.
+            b (float, optional): Length normalization. Defaults to config.BM25_B.
+        """
+        self.k1 = k1
+        self.b = b
+        self._postings = {}  # term -> {doc_id: term frequency}
+        self._doc_terms = {}  # doc_id -> terms, so a replaced document can be unindexed
+        self._lengths = {}
+        self._total_length = 0
+
+    def add(self, doc_id, tokens):
+        """Indexes a document, replacing any previous version with the same id.
+
+        Args:
+            doc_id (str): The document id.
+            tokens (list[str]): The document's tokens, with repeats.
+        """
+        self.remove(doc_id)
+        counts = Counter(tokens)
+        for term, frequency in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = frequency
+        self._doc_terms[doc_id] = list(counts)
+        self._lengths[doc_id] = len(tokens)
+        self._total_length += len(tokens)
+
+    def remove(self, doc_id):
+        """Removes a document from the index if present."""
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(doc_id)
+
+    def clear(self):
+        """Removes every document."""
+        self._postings, self._doc_terms, self._lengths = {}, {}, {}
+        self._total_length = 0
+
+    def search(self, tokens, top_k=10, allowed_ids=None, excluded_ids=None):
+        """Scores the documents containing any query token.
+
+        Args:
+            tokens (list[str]): Query tokens.
+            top_k (int, optional): Number of results. Defaults to 10.
+            allowed_ids (Collection[str], optional): Only these ids may be returned.
+            excluded_ids (Collection[str], optional): These ids are never returned.
+
+        Returns:
+            list[tuple]: (doc_id, score) pairs, best first.
+        """
+        count = len(self._lengths)
+        if not count:
+            return []
+        average_length = self._total_length / count or 1.0
+        scores = {}
+        for term in set(tokens):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                length_norm = 1 - self.b + self.b * self._lengths[doc_id] / average_length
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (
+                    frequency + self.k1 * length_norm)
+        if allowed_ids is not None:
+            allowed = set(allowed_ids)
+            scores = {doc_id: score for doc_id, score in scores.items() if doc_id in allowed}
+        elif excluded_ids:
+            excluded = set(excluded_ids)
+            scores = {doc_id: score for doc_id, score in scores.items() if doc_id not in excluded}
+        return heapq.nlargest(top_k, scores.items(), key=itemgetter(1))
+
+    def __len__(self):
+        return len(self._lengths)
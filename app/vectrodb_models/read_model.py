@@ -0,0 +1,291 @@
+import threading
+import numpy as np
+from app.config import config
+from app.services.thumbnails import thumbnail_urls
+from app.utils.terms import index_terms, normalize_term, tokenize
+from app.vectrodb_models.lexical_index import BM25Index
+
+# Record fields whose values are indexed for include/exclude filters
+TERM_FIELDS = ('tags', 'detected_objects', 'color_palette')
+
+
+def _split_metadata_field(metadata_field):
+    """Splits a comma-joined metadata string into a list."""
+    return metadata_field.split(', ') if metadata_field else []
+
+
+def to_display_path(image_path):
+    """Converts a stored 'app/static/...' path into the '../static/...' form used by the frontend."""
+    return image_path.replace("app/", "../")
+
+
+class GalleryIndex:
+    """Process-wide read model of the gallery collection for page rendering.
+
+    The collection's metadata and documents (never the embeddings) are loaded once into an id index,
+    a display-path index and an insertion-ordered id list. Ingest pushes new records in with `add`,
+    so gallery and image-viewer requests become dictionary lookups instead of full collection scans.
+
+    Tags, detected objects and colors are also kept in an inverted index: one set of positions (in
+    insertion order) per normalized term, so a filter only touches the images that have its terms,
+    and turning positions back into ids is a single NumPy fancy-indexing step. The same fields plus
+    the description feed a BM25 index for lexical search.
+
+    Attributes:
+        collection (chromadb.Collection): The collection the index mirrors.
+        version (int): Incremented on every change; usable as a cache key for derived data.
+    """
+
+    def __init__(self, collection):
+        """Initializes an empty index; the collection is read on first access.
+
+        Args:
+            collection (chromadb.Collection): The collection to mirror.
+        """
+        self.collection = collection
+        self.version = 0
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._records_by_id = {}
+        self._ids_by_path = {}
+        self._order = []
+        self._positions = {}
+        self._term_positions = {}
+        self._order_array = np.empty(0, dtype=object)
+        self._lexical = BM25Index()
+
+    @staticmethod
+    def _record_tokens(record):
+        text = " ".join([record['document'] or ""] + [" ".join(record[field]) for field in TERM_FIELDS])
+        return tokenize(text)
+
+    @staticmethod
+    def _record_terms(record):
+        terms = set()
+        for field in TERM_FIELDS:
+            for value in record[field]:
+                terms |= index_terms(value)
+        return terms
+
+    def _build_record(self, image_id, metadata, document):
+        image_path = to_display_path(metadata.get('image_path', ''))
+        thumbnails = thumbnail_urls(metadata.get('content_hash'))
+        return {
+            'id': image_id,
+            'image_path': image_path,
+            'thumbnails': thumbnails,
+            'thumbnail': thumbnails.get(config.GALLERY_THUMBNAIL_WIDTH, image_path),
+            'preview': thumbnails.get(config.VIEWER_THUMBNAIL_WIDTH, image_path),
+            'srcset': ", ".join(f"{url} {width}w" for width, url in thumbnails.items()),
+            'document': document,
+            'metadata': metadata,
+            'tags': _split_metadata_field(metadata.get('tags', '')),
+            'color_palette': _split_metadata_field(metadata.get('color_palette', '')),
+            'detected_objects': _split_metadata_field(metadata.get('detected_objects', '')),
+        }
+
+    def _insert(self, image_id, metadata, document):
+        record = self._build_record(image_id, metadata or {}, document)
+        previous = self._records_by_id.get(image_id)
+        if previous is None:
+            self._positions[image_id] = len(self._order)
+            self._order.append(image_id)
+        else:
+            self._ids_by_path.pop(previous['image_path'], None)
+        self._records_by_id[image_id] = record
+        self._ids_by_path[record['image_path']] = image_id
+
+        position = self._positions[image_id]
+        if previous is not None:
+            for term in self._record_terms(previous):
+                self._term_positions[term].discard(position)
+        for term in self._record_terms(record):
+            self._term_positions.setdefault(term, set()).add(position)
+        self._lexical.add(image_id, self._record_tokens(record))
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            data = self.collection.get(include=["metadatas", "documents"])
+            self._records_by_id, self._ids_by_path, self._order = {}, {}, []
+            self._positions, self._term_positions = {}, {}
+            self._order_array = np.empty(0, dtype=object)
+            self._lexical.clear()
+            for image_id, metadata, document in zip(data["ids"], data["metadatas"], data["documents"]):
+                self._insert(image_id, metadata, document)
+            self._loaded = True
+            self.version += 1
+
+    def add(self, ids, metadatas, documents):
+        """Adds or updates records written by ingest.
+
+        Args:
+            ids (list[str]): Image ids.
+            metadatas (list[dict]): Chroma metadata of each image.
+            documents (list[str]): Stored description of each image.
+        """
+        with self._lock:
+            if not self._loaded:
+                # Nothing cached yet; the first reader will load the new records with everything else
+                self.version += 1
+                return
+            for image_id, metadata, document in zip(ids, metadatas, documents):
+                self._insert(image_id, metadata, document)
+            self.version += 1
+
+    def load_ids(self, ids):
+        """Loads records of `ids` that are in the collection but not in this index yet.
+
+        Another process (such as a separate ingest worker) may have written images that the shared
+        vector backend already returns; this pulls just those records in.
+
+        Args:
+            ids (Iterable[str]): Image ids returned by a search.
+
+        Returns:
+            int: Number of records loaded.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            missing = [image_id for image_id in dict.fromkeys(ids) if image_id not in self._records_by_id]
+        if not missing:
+            return 0
+        data = self.collection.get(ids=missing, include=["metadatas", "documents"])
+        if data["ids"]:
+            self.add(data["ids"], data["metadatas"], data["documents"])
+        return len(data["ids"])
+
+    def invalidate(self, collection=None):
+        """Drops the cached records so they are reloaded on next access.
+
+        Args:
+            collection (chromadb.Collection, optional): Replacement collection, e.g. after a reset.
+        """
+        with self._lock:
+            if collection is not None:
+                self.collection = collection
+            self._loaded = False
+            self.version += 1
+
+    def known_terms(self, terms):
+        """Returns the normalized forms of `terms` that at least one image has."""
+        self._ensure_loaded()
+        normalized = (normalize_term(term) for term in terms)
+        return [term for term in normalized if self._term_positions.get(term)]
+
+    def _ids_at(self, positions):
+        """Returns the ids at `positions` (an int array) in insertion order."""
+        if len(self._order_array) != len(self._order):
+            self._order_array = np.array(self._order, dtype=object)
+        return self._order_array[np.sort(positions)].tolist()
+
+    def _positions_of(self, terms):
+        return [self._term_positions.get(normalize_term(term), set()) for term in terms]
+
+    def filter_ids(self, include_terms=(), exclude_terms=()):
+        """Applies term filters over tags, detected objects and colors.
+
+        Without include terms every image not excluded is allowed, so only the (usually short)
+        excluded list is built and `allowed_ids` is None. With include terms both sides are returned
+        so the search backend can work from whichever is smaller.
+
+        Args:
+            include_terms (Iterable[str], optional): Terms every result must have.
+            exclude_terms (Iterable[str], optional): Terms no result may have.
+
+        Returns:
+            tuple: (allowed_ids, excluded_ids), or (None, None) when the filters remove nothing.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            excluded = set().union(*self._positions_of(exclude_terms))
+            include_sets = self._positions_of(include_terms)
+            if not include_sets:
+                if not excluded:
+                    return None, None
+                return None, self._ids_at(np.fromiter(excluded, dtype=np.int64, count=len(excluded)))
+
+            # Intersect starting from the rarest term, so the work is bounded by its posting set
+            include_sets.sort(key=len)
+            allowed = include_sets[0].intersection(*include_sets[1:]) - excluded
+            if len(allowed) == len(self._order):
+                return None, None
+            mask = np.ones(len(self._order), dtype=bool)
+            allowed_positions = np.fromiter(allowed, dtype=np.int64, count=len(allowed))
+            mask[allowed_positions] = False
+            return self._ids_at(allowed_positions), self._ids_at(np.flatnonzero(mask))
+
+    def lexical_search(self, query_text, top_k=10, allowed_ids=None, excluded_ids=None):
+        """Ranks images by BM25 over their description, tags, detected objects and colors.
+
+        Args:
+            query_text (str): The query.
+            top_k (int, optional): Number of results. Defaults to 10.
+            allowed_ids (list[str], optional): Only these ids may be returned.
+            excluded_ids (list[str], optional): These ids are never returned.
+
+        Returns:
+            list[tuple]: (image_id, score) pairs, best first.
+        """
+        tokens = tokenize(query_text)
+        if not tokens:
+            return []
+        self._ensure_loaded()
+        with self._lock:
+            return self._lexical.search(tokens, top_k, allowed_ids, excluded_ids)
+
+    def missing_thumbnails(self):
+        """Returns the records of images that have no derivatives yet and have not failed to get them."""
+        self._ensure_loaded()
+        with self._lock:
+            return [record for record in self._records_by_id.values()
+                    if not record['thumbnails'] and not record['metadata'].get('thumbnail_error')]
+
+    def get_by_id(self, image_id):
+        """Returns the record for `image_id`, or None."""
+        self._ensure_loaded()
+        return self._records_by_id.get(image_id)
+
+    def get_by_path(self, image_path):
+        """Returns the record for a display path such as '../static/image_data/x.jpg', or None."""
+        self._ensure_loaded()
+        image_id = self._ids_by_path.get(image_path)
+        return self._records_by_id.get(image_id) if image_id is not None else None
+
+    def image_paths(self, newest_first=True):
+        """Returns the display paths of all images.
+
+        Args:
+            newest_first (bool, optional): Reverse insertion order. Defaults to True.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            order = reversed(self._order) if newest_first else self._order
+            return [self._records_by_id[image_id]['image_path'] for image_id in order]
+
+    def page(self, cursor=None, limit=30):
+        """Returns one page of records, newest first, in O(limit).
+
+        Cursors are positions in the insertion order, so pages stay stable while new images are
+        appended: a cursor handed out earlier still continues exactly where its page ended.
+
+        Args:
+            cursor (int, optional): Position to continue from, as returned by a previous page. Defaults to the newest image.
+            limit (int, optional): Maximum number of records. Defaults to 30.
+
+        Returns:
+            tuple: (records, next_cursor) where next_cursor is None on the last page.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            end = len(self._order) if cursor is None else max(0, min(cursor, len(self._order)))
+            start = max(0, end - limit)
+            records = [self._records_by_id[image_id] for image_id in reversed(self._order[start:end])]
+        return records, (start if start > 0 else None)
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._order)
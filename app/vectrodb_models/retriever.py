@@ -1,13 +1,37 @@
-import chromadb
+import sys
+import numpy as np
 from app.config import config
+from app.services.model_registry import model_registry
+from app.utils.cache import LRUCache
+
+
+def _result_nbytes(key, result):
+    """Roughly estimates the memory of a cached (documents, metadatas) search result."""
+    documents, metadatas = result
+    size = sys.getsizeof(key[1]) + sum(sys.getsizeof(document) for document in documents)
+    for metadata in metadatas:
+        size += sum(sys.getsizeof(name) + sys.getsizeof(value) for name, value in metadata.items())
+    return size
 
 
 class GalleryDatabase:
     """Manages interactions with the ChromaDB database for storing and retrieving image embeddings.
 
+    Nearest-neighbour search goes through the configured vector backend (Chroma itself or the
+    memory-mapped NumPy index); documents and metadata of the hits come from the gallery read model.
+    When query text is available, the CLIP ranking is fused with a BM25 ranking over the stored
+    descriptions, tags, objects and colors using reciprocal rank fusion.
+
+    Results are cached per query, keyed by the int8-quantized query embedding, top_k, filters and
+    text together with the gallery version, which ingest bumps on every write; repeated retrievals
+    (the same text, the same uploaded image) are answered from memory.
+
     Attributes:
-        client (chromadb.PersistentClient): The persistent ChromaDB client instance.
+        client (chromadb.PersistentClient): The shared persistent ChromaDB client instance.
         collection (chromadb.Collection): The specific collection for image embeddings.
+        vector_backend (ChromaVectorBackend | NumpyVectorIndex): Shared nearest-neighbour search backend.
+        gallery_index (GalleryIndex): Shared read model holding every image's document and metadata.
+        result_cache (LRUCache): Cached search results with hit rate and memory accounting.
     """
 
     def __init__(self, db_path=config.DEFAULT_DB_PATH, collection_name=config.DEFAULT_COLLECTION_NAME):
@@ -17,15 +41,96 @@ class GalleryDatabase:
             db_path (str, optional): Path to the database directory. Defaults to config.DEFAULT_DB_PATH.
             collection_name (str, optional): Name of the collection. Defaults to config.DEFAULT_COLLECTION_NAME.
         """
-        self.client = chromadb.PersistentClient(path=db_path)
+        self.client = model_registry.get_chroma_client(db_path)
         self.collection = self.client.get_collection(collection_name) ## use get_or_create_collection
+        self.vector_backend = model_registry.get_vector_backend(db_path, collection_name)
+        self.gallery_index = model_registry.get_gallery_index(db_path, collection_name)
+        self.result_cache = LRUCache(maxsize=config.QUERY_RESULT_CACHE_SIZE, sizeof=_result_nbytes)
+
+    @staticmethod
+    def _cache_key(generation, query_embedding, top_k, include_terms, exclude_terms, query_text):
+        # Quantizing absorbs float noise, so the same text or image always maps to the same key
+        norm = max(float(np.linalg.norm(query_embedding)), 1e-12)
+        quantized = np.round(query_embedding / norm * 127).astype(np.int8).tobytes()
+        return (generation, quantized, top_k, tuple(sorted(include_terms or ())),
+                tuple(sorted(exclude_terms or ())), query_text)
+
+    def _fuse(self, vector_ids, query_text, top_k, allowed_ids, excluded_ids):
+        """Combines a vector ranking with the lexical ranking for `query_text` by reciprocal rank fusion."""
+        lexical = self.gallery_index.lexical_search(query_text, len(vector_ids) or top_k, allowed_ids, excluded_ids)
+        scores = {}
+        for ranking in (vector_ids, [image_id for image_id, _ in lexical]):
+            for rank, image_id in enumerate(ranking, start=1):
+                scores[image_id] = scores.get(image_id, 0.0) + 1.0 / (config.RRF_K + rank)
+        fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [image_id for image_id, _ in fused], [score for _, score in fused]
+
+    def search(self, query_embeddings, top_k=5, include_terms=None, exclude_terms=None, query_texts=None):
+        """Retrieves the top-k documents and metadata for one or more query embeddings.
+
+        Term filters are resolved against the inverted tag/object/color index and pushed down
+        into candidate selection, so filtered queries still return `top_k` results when they exist.
+
+        Args:
+            query_embeddings (numpy.ndarray): Array of shape (D,) or (Q, D).
+            top_k (int, optional): Number of results per query. Defaults to 5.
+            include_terms (list[str], optional): Terms every result must have. Defaults to None.
+            exclude_terms (list[str], optional): Terms no result may have. Defaults to None.
+            query_texts (list[str], optional): Text of each query, enabling hybrid ranking. Defaults to None.
+
+        Returns:
+            tuple: (documents, metadatas), each a list with one list of results per query.
+        """
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        texts = list(query_texts) if query_texts is not None else [None] * len(queries)
+        generation = self.gallery_index.version
+        keys = [
+            self._cache_key(generation, query, top_k, include_terms, exclude_terms, text)
+            for query, text in zip(queries, texts)
+        ]
+        results = [self.result_cache.get(key) for key in keys]
+        missing = [position for position, result in enumerate(results) if result is None]
+        if missing:
+            fresh = self._search_uncached(
+                queries[missing], top_k, include_terms, exclude_terms,
+                [texts[position] for position in missing] if query_texts is not None else None
+            )
+            for position, result in zip(missing, fresh):
+                self.result_cache.put(keys[position], result)
+                results[position] = result
+        return [documents for documents, _ in results], [metadatas for _, metadatas in results]
+
+    def _search_uncached(self, queries, top_k, include_terms, exclude_terms, query_texts):
+        """Runs the filtered, optionally hybrid search and returns one (documents, metadatas) pair per query."""
+        allowed_ids, excluded_ids = None, None
+        if include_terms or exclude_terms:
+            allowed_ids, excluded_ids = self.gallery_index.filter_ids(include_terms or (), exclude_terms or ())
+        hybrid = config.HYBRID_RETRIEVAL and query_texts is not None
+        depth = max(top_k, config.HYBRID_CANDIDATES) if hybrid else top_k
+        hits = self.vector_backend.query(queries, depth, allowed_ids=allowed_ids, excluded_ids=excluded_ids)
+        if hybrid:
+            hits = [
+                self._fuse(ids, text, top_k, allowed_ids, excluded_ids) if text else (ids[:top_k], scores[:top_k])
+                for (ids, scores), text in zip(hits, query_texts)
+            ]
+        # Hits written by another process are not in the read model yet; fetch them instead of dropping them
+        self.gallery_index.load_ids(image_id for ids, _ in hits for image_id in ids)
+        results = []
+        for ids, _ in hits:
+            records = [record for record in map(self.gallery_index.get_by_id, ids) if record is not None]
+            results.append(([record["document"] for record in records], [record["metadata"] for record in records]))
+        return results
 
-    def retrieve_relevant_documents(self, query_embedding, top_k=5):
+    def retrieve_relevant_documents(self, query_embedding, top_k=5, include_terms=None, exclude_terms=None,
+                                    query_text=None):
         """Retrieves top-k relevant documents and metadata based on a query embedding.
 
         Args:
             query_embedding (numpy.ndarray): The embedding vector for the query.
             top_k (int, optional): Number of top results to retrieve. Defaults to 5.
+            include_terms (list[str], optional): Tags, objects or colors every result must have. Defaults to None.
+            exclude_terms (list[str], optional): Tags, objects or colors no result may have. Defaults to None.
+            query_text (str, optional): The query text, fused in lexically when given. Defaults to None.
 
         Returns:
             tuple: (documents, metadatas, image_paths) where:
@@ -33,10 +138,7 @@ class GalleryDatabase:
                 - metadatas (list): List of metadata dictionaries.
                 - image_paths (list): List of image file paths.
         """
-        results = self.collection.query(
-            query_embeddings=[query_embedding.tolist()],
-            n_results=top_k,
-            include=["documents", "metadatas"]
-        )
-        return results["documents"][0], results["metadatas"][0], [m["image_path"] for m in results["metadatas"][0]]
+        query_texts = [query_text] if query_text else None
+        documents, metadatas = self.search(query_embedding, top_k, include_terms, exclude_terms, query_texts)
+        return documents[0], metadatas[0], [m["image_path"] for m in metadatas[0]]
 
@@ -0,0 +1,345 @@
+import json
+import os
+import threading
+import uuid
+import numpy as np
+from app.config import config
+
+_EMBEDDINGS_FILE = "embeddings.npy"
+_IDS_FILE = "ids.txt"
+_HEADER_FILE = "header.json"
+
+
+def _normalize_rows(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores, top_k):
+    """Returns the indices of the `top_k` highest scores, best first, using argpartition."""
+    if len(scores) > top_k:
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class ChromaVectorBackend:
+    """Vector search backed by the Chroma collection itself.
+
+    Attributes:
+        collection (chromadb.Collection): The collection queried for nearest neighbours.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def query(self, query_embeddings, top_k=5, allowed_ids=None, excluded_ids=None):
+        """Finds the nearest images for one or more query embeddings.
+
+        With filters, the smaller side decides the strategy: a few allowed ids are fetched and
+        ranked exactly. Otherwise the query over-fetches by the number of excluded ids, capped at
+        config.VECTOR_EXCLUSION_OVERFETCH, and doubles the request size only while some query is
+        still short of `top_k` allowed results, so a broad exclusion does not turn every search into
+        a full-collection query.
+
+        Args:
+            query_embeddings (numpy.ndarray): Array of shape (D,) or (Q, D).
+            top_k (int, optional): Results per query. Defaults to 5.
+            allowed_ids (list[str], optional): Only these ids may be returned. Requires `excluded_ids`.
+            excluded_ids (list[str], optional): These ids are never returned.
+
+        Returns:
+            list[tuple]: One (ids, scores) pair per query, best first. Scores are cosine similarities.
+        """
+        queries = np.atleast_2d(query_embeddings)
+        if allowed_ids is not None and len(allowed_ids) <= len(excluded_ids or ()):
+            return self._rank_ids(queries, top_k, allowed_ids)
+
+        excluded = set(excluded_ids or ())
+        if not excluded:
+            return self._query(queries, top_k, excluded, top_k)
+        total = self.collection.count()
+        n_results = min(total, top_k + min(len(excluded), config.VECTOR_EXCLUSION_OVERFETCH))
+        while True:
+            hits = self._query(queries, n_results, excluded, top_k)
+            if n_results >= total or all(len(ids) >= top_k for ids, _ in hits):
+                return hits
+            n_results = min(total, n_results * 2)
+
+    def _query(self, queries, n_results, excluded, top_k):
+        results = self.collection.query(
+            query_embeddings=queries.tolist(),
+            n_results=n_results,
+            include=["distances"]
+        )
+        # Chroma's default space is squared L2, which for unit vectors is 2 - 2 * cosine
+        hits = []
+        for ids, distances in zip(results["ids"], results["distances"]):
+            kept = [(image_id, 1.0 - distance / 2) for image_id, distance in zip(ids, distances)
+                    if image_id not in excluded][:top_k]
+            hits.append(([image_id for image_id, _ in kept], [score for _, score in kept]))
+        return hits
+
+    def _rank_ids(self, queries, top_k, ids):
+        """Ranks a small candidate set exactly against the stored embeddings."""
+        if not ids:
+            return [([], []) for _ in queries]
+        records = self.collection.get(ids=list(ids), include=["embeddings"])
+        scores = _normalize_rows(records["embeddings"]) @ _normalize_rows(queries).T
+        hits = []
+        for column in range(scores.shape[1]):
+            order = _top_k(scores[:, column], top_k)
+            hits.append(([records["ids"][row] for row in order], scores[order, column].tolist()))
+        return hits
+
+    def add(self, ids, embeddings):
+        """Nothing to do: the collection is the index, and ingest already wrote to it."""
+
+    def reset(self, collection):
+        """Points the backend at a recreated collection."""
+        self.collection = collection
+
+    def sync(self, collection):
+        """Nothing to do: the collection is the index."""
+
+    def __len__(self):
+        return self.collection.count()
+
+
+class NumpyVectorIndex:
+    """In-process exact vector index over a memory-mapped embedding matrix.
+
+    Unit-length embeddings are stored row by row in a preallocated `.npy` file. The ids live in an
+    append-only text file (one per line, in row order) and a small JSON header records how many
+    rows, and how many bytes of the id file, are committed. The matrix is opened read-only with
+    `mmap_mode`, so every worker process serving queries shares the same pages through the OS page
+    cache. Queries are block-wise matrix products followed by `argpartition`, and any number of
+    queries can be answered in one pass over the matrix.
+
+    Appends write the new rows and ids first and then atomically replace the header, so readers in
+    other processes only see rows once they are complete; they pick up changes by stat-ing the
+    header before each query and read only the ids appended since. An append costs O(new rows), not
+    O(index size). There must be a single writer at a time.
+
+    On Windows a file that is memory-mapped cannot be replaced or deleted. This index closes its own
+    maps before growing or resetting the matrix, but other processes' maps would still block it, so
+    on Windows the numpy backend is limited to a single process.
+
+    Attributes:
+        directory (str): Directory holding the matrix, id file and header.
+        dtype (numpy.dtype): Storage type of the matrix, float16 halves memory with no ranking impact.
+        block_rows (int): Rows scored per block, bounding the float32 working memory of a query.
+    """
+
+    def __init__(self, directory, dtype=config.VECTOR_INDEX_DTYPE, block_rows=config.VECTOR_INDEX_BLOCK_ROWS):
+        """Opens the index in `directory`, or starts an empty one.
+
+        Args:
+            directory (str): Directory holding the matrix, id file and header.
+            dtype (str, optional): Storage type. Defaults to config.VECTOR_INDEX_DTYPE.
+            block_rows (int, optional): Rows scored per block. Defaults to config.VECTOR_INDEX_BLOCK_ROWS.
+        """
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.block_rows = block_rows
+        self._matrix_path = os.path.join(directory, _EMBEDDINGS_FILE)
+        self._ids_path = os.path.join(directory, _IDS_FILE)
+        self._header_path = os.path.join(directory, _HEADER_FILE)
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._matrix = None
+        self._ids = []
+        self._ids_bytes = 0
+        self._positions = {}
+        self._generation = None  # Changes whenever the index is recreated, telling readers to start over
+        self._refresh()
+
+    def _header_stamp(self):
+        # The header is always replaced by a new file, so its inode changes even within one mtime tick
+        try:
+            stat = os.stat(self._header_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self):
+        """Reopens the matrix and reads newly appended ids if another process (or this one) changed the index."""
+        stamp = self._header_stamp()
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp is None:
+                self._matrix, self._ids, self._ids_bytes, self._positions = None, [], 0, {}
+                self._generation = None
+            else:
+                with open(self._header_path, "r") as header_file:
+                    header = json.load(header_file)
+                if header["generation"] != self._generation:
+                    # New or rebuilt index; read the ids from the beginning
+                    self._ids, self._ids_bytes, self._positions = [], 0, {}
+                    self._generation = header["generation"]
+                with open(self._ids_path, "rb") as ids_file:
+                    ids_file.seek(self._ids_bytes)
+                    appended = ids_file.read(header["ids_bytes"] - self._ids_bytes).decode("utf-8").splitlines()
+                for image_id in appended:
+                    self._positions[image_id] = len(self._ids)
+                    self._ids.append(image_id)
+                self._ids_bytes = header["ids_bytes"]
+                self._matrix = np.load(self._matrix_path, mmap_mode="r")
+            self._stamp = stamp
+
+    def _append_ids(self, new_ids):
+        """Writes ids after the committed end of the id file, dropping anything an interrupted append left there."""
+        data = "".join(f"{image_id}\n" for image_id in new_ids).encode("utf-8")
+        with open(self._ids_path, "r+b" if os.path.exists(self._ids_path) else "wb") as ids_file:
+            ids_file.seek(self._ids_bytes)
+            ids_file.write(data)
+            ids_file.truncate()
+        return self._ids_bytes + len(data)
+
+    def _write_header(self, count, dim, ids_bytes):
+        tmp_path = self._header_path + ".tmp"
+        with open(tmp_path, "w") as header_file:
+            json.dump({"generation": self._generation or uuid.uuid4().hex, "count": count, "dim": dim,
+                       "dtype": self.dtype.name, "ids_bytes": ids_bytes}, header_file)
+        os.replace(tmp_path, self._header_path)
+
+    def _grow(self, capacity, dim):
+        """Copies the used rows into a larger preallocated file and swaps it in."""
+        tmp_path = self._matrix_path + ".tmp.npy"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=self.dtype, shape=(capacity, dim))
+        if self._matrix is not None and self._ids:
+            grown[:len(self._ids)] = self._matrix[:len(self._ids)]
+        grown.flush()
+        del grown
+        # Release our read-only map first; Windows refuses to replace a mapped file
+        self._matrix = None
+        os.replace(tmp_path, self._matrix_path)
+
+    def add(self, ids, embeddings):
+        """Appends embeddings, or overwrites the rows of ids that are already indexed.
+
+        Args:
+            ids (list[str]): Image ids.
+            embeddings (numpy.ndarray): Array of shape (N, D).
+        """
+        if not ids:
+            return
+        vectors = _normalize_rows(embeddings).astype(self.dtype)
+        with self._lock:
+            self._refresh()
+            dim = vectors.shape[1]
+            new_ids = {}
+            rows = []
+            for image_id in ids:
+                row = self._positions.get(image_id)
+                if row is None:
+                    row = new_ids.setdefault(image_id, len(self._ids) + len(new_ids))
+                rows.append(row)
+            count = len(self._ids) + len(new_ids)
+
+            capacity = 0 if self._matrix is None else self._matrix.shape[0]
+            if self._matrix is not None and self._matrix.shape[1] != dim:
+                raise ValueError(f"Embedding size {dim} does not match the index ({self._matrix.shape[1]}).")
+            if count > capacity:
+                self._grow(max(count, capacity * 2, config.VECTOR_INDEX_MIN_CAPACITY), dim)
+
+            matrix = np.load(self._matrix_path, mmap_mode="r+")
+            matrix[rows] = vectors
+            matrix.flush()
+            del matrix
+            self._write_header(count, dim, self._append_ids(new_ids))
+            self._refresh()
+
+    def sync(self, collection, page_size=5000):
+        """Rebuilds the index from a Chroma collection when their sizes differ.
+
+        Args:
+            collection (chromadb.Collection): The collection holding the authoritative embeddings.
+            page_size (int, optional): Records fetched per request. Defaults to 5000.
+        """
+        total = collection.count()
+        if total == len(self):
+            return
+        print(f"Rebuilding vector index from the collection ({len(self)} -> {total} embeddings)...")
+        with self._lock:
+            self.reset()
+            for offset in range(0, total, page_size):
+                page = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+                self.add(page["ids"], np.asarray(page["embeddings"]))
+
+    def reset(self, collection=None):
+        """Deletes the index files."""
+        with self._lock:
+            self._matrix = None  # Windows refuses to delete a mapped file
+            for path in (self._header_path, self._ids_path, self._matrix_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            os.makedirs(self.directory, exist_ok=True)
+            self._refresh()
+
+    def _row_mask(self, count, allowed_ids, excluded_ids):
+        """Builds a boolean mask of the rows a filtered query may return, or None without filters."""
+        if allowed_ids is not None and len(allowed_ids) <= len(excluded_ids or ()):
+            mask = np.zeros(count, dtype=bool)
+            mask[[self._positions[i] for i in allowed_ids if self._positions.get(i, count) < count]] = True
+        elif excluded_ids:
+            mask = np.ones(count, dtype=bool)
+            mask[[self._positions[i] for i in excluded_ids if self._positions.get(i, count) < count]] = False
+        else:
+            return None
+        return mask
+
+    def query(self, query_embeddings, top_k=5, allowed_ids=None, excluded_ids=None):
+        """Finds the nearest images for one or more query embeddings.
+
+        Filtered-out rows are scored as -inf inside the same pass, so a filtered query still
+        returns a full page of allowed results whenever enough exist.
+
+        Args:
+            query_embeddings (numpy.ndarray): Array of shape (D,) or (Q, D).
+            top_k (int, optional): Results per query. Defaults to 5.
+            allowed_ids (list[str], optional): Only these ids may be returned. Requires `excluded_ids`.
+            excluded_ids (list[str], optional): These ids are never returned.
+
+        Returns:
+            list[tuple]: One (ids, scores) pair per query, best first. Scores are cosine similarities.
+        """
+        queries = _normalize_rows(query_embeddings)
+        self._refresh()
+        with self._lock:
+            matrix, ids = self._matrix, self._ids
+            count = len(ids)
+            row_mask = self._row_mask(count, allowed_ids, excluded_ids)
+        if count == 0:
+            return [([], []) for _ in queries]
+
+        # Keep the best top_k of every block, then pick the overall best among those candidates
+        candidate_rows, candidate_scores = [], []
+        for start in range(0, count, self.block_rows):
+            block = np.asarray(matrix[start:min(count, start + self.block_rows)], dtype=np.float32)
+            scores = block @ queries.T
+            if row_mask is not None:
+                scores[~row_mask[start:start + len(block)]] = -np.inf
+            if len(block) > top_k:
+                best = np.argpartition(-scores, top_k - 1, axis=0)[:top_k]
+            else:
+                best = np.broadcast_to(np.arange(len(block))[:, None], scores.shape)
+            candidate_rows.append(best + start)
+            candidate_scores.append(np.take_along_axis(scores, best, axis=0))
+        candidate_rows = np.concatenate(candidate_rows)
+        candidate_scores = np.concatenate(candidate_scores)
+
+        results = []
+        for column in range(len(queries)):
+            order = _top_k(candidate_scores[:, column], top_k)
+            order = order[np.isfinite(candidate_scores[order, column])]
+            rows = candidate_rows[order, column]
+            results.append(([ids[row] for row in rows], candidate_scores[order, column].tolist()))
+        return results
+
+    def __len__(self):
+        self._refresh()
+        return len(self._ids)
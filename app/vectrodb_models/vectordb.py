@@ -1,33 +1,48 @@
 import chromadb
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from app.services.embeddings import CLIPEmbedding
 from chromadb import errors
+from langchain_core.exceptions import OutputParserException
+from app.config import config
 from app.services.description_ai import GeminiImageDescription
 from app.services.metadata_ai import ImageAnalyzer
+from app.services.model_registry import model_registry
+from app.services.thumbnails import file_content_hash
+from app.utils.paths import image_id_for, list_image_files
+from app.vectrodb_models.write_buffer import WriteBuffer
 from app.config.secrets import gemini_api_key
 from pathlib import Path
 
 
 
 class ChromaDatabase:
-    def __init__(self, collection_name="image_embeddings", persist_directory="app/storage"):
+    def __init__(self, collection_name="image_embeddings", persist_directory="app/storage", on_written=None):
         """
         Initializes the ChromaImageDatabase object with a Chroma client and
         attempts to get or create the specified collection.
+
+        `on_written(records, error)` is called after every bulk write of buffered records, whose
+        "image_path" identifies the image; error is None on success.
         """
-        self.client = chromadb.PersistentClient(path=persist_directory)
+        self.client = model_registry.get_chroma_client(persist_directory)
         self.collection_name = collection_name
         self.collection = self.client.get_or_create_collection(self.collection_name)
+        self.gallery_index = model_registry.get_gallery_index(persist_directory, self.collection_name)
+        self.vector_backend = model_registry.get_vector_backend(persist_directory, self.collection_name)
+        self.persist_directory = persist_directory
+        self.thumbnails = model_registry.get_thumbnail_generator()
+        self.writes = WriteBuffer(self._write_records, on_written=on_written)
 
         # Initialize AI components with API key from environment
         api_key = gemini_api_key
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables.")
 
-        self.clip_embedding = CLIPEmbedding()
-        self.description = GeminiImageDescription(api_key, delay=5)
-        self.meta_data = ImageAnalyzer(api_key, delay=5)
+        self.clip_embedding = model_registry.get_clip_embedding()
+        self.description = GeminiImageDescription(api_key)
+        self.meta_data = ImageAnalyzer(api_key)
 
 
     def _get_or_create_collection(self):
@@ -42,28 +57,126 @@ class ChromaDatabase:
             collection = self.client.create_collection(self.collection_name)
         return collection
 
-    def store_image_in_db(self, image_path: str):
+    def find_new_images(self, image_directory: str):
+        """
+    Lists the images in a directory that are not in the collection yet.
+
+    All existing ids are fetched in one bulk call (ids only, no embeddings or documents), so
+    the cost of an upload no longer grows with the size of the gallery.
+
+    Args:
+    - image_directory (str): Directory containing the image files.
+
+    Returns:
+    - list[str]: Paths of the images whose ids are not stored in the collection.
+    """
+        return self.filter_new_images(list_image_files(image_directory))
+
+    def filter_new_images(self, image_paths):
+        """
+    Returns the paths from `image_paths` whose ids are not in the collection yet, in order.
+
+    Only the given ids are looked up, so the cost depends on the batch and not on the gallery size.
+    """
+        if not image_paths:
+            return []
+        ids = list({image_id_for(image_path) for image_path in image_paths})
+        existing_ids = set(self.collection.get(ids=ids, include=[])["ids"])
+        return [image_path for image_path in image_paths if image_id_for(image_path) not in existing_ids]
+
+    def filter_changed_images(self, image_paths):
+        """
+    Returns the paths from `image_paths` that are not in the collection or whose file content changed, in order.
+
+    A stored image is compared through the `content_hash` recorded with it, so a file replaced under
+    the same name is ingested again (records are upserted) instead of keeping the old description
+    and embedding. Images stored without a hash are treated as unchanged.
+    """
+        if not image_paths:
+            return []
+        ids = list({image_id_for(image_path) for image_path in image_paths})
+        stored = self.collection.get(ids=ids, include=["metadatas"])
+        stored_hashes = {image_id: (metadata or {}).get("content_hash")
+                         for image_id, metadata in zip(stored["ids"], stored["metadatas"])}
+        changed = []
+        for image_path in image_paths:
+            image_id = image_id_for(image_path)
+            if image_id not in stored_hashes:
+                changed.append(image_path)
+            elif stored_hashes[image_id] and stored_hashes[image_id] != file_content_hash(image_path):
+                print(f"{os.path.basename(image_path)} changed since it was stored. Ingesting it again...")
+                changed.append(image_path)
+        return changed
+
+    def store_image_in_db(self, image_path: str, image_embedding=None, check_existing=True):
         """
     Stores an image embedding in the Chroma vector database only if it doesn't already exist.
 
+    The record goes through the write buffer, so it is written within
+    config.CHROMA_WRITE_MAX_DELAY_SECONDS, or immediately by `flush`.
+
     Args:
     - image_path (str): Path to the image file.
-    - collection (chromadb.Collection): The Chroma collection to store the image in.
+    - image_embedding (numpy.ndarray, optional): Precomputed CLIP embedding. Computed here if omitted.
+    - check_existing (bool): Look the id up first. Callers that already filtered with
+      `find_new_images` pass False to save the round trip.
     """
-        image_embedding = self.clip_embedding.embed_image(image_path)
         image_name = os.path.basename(image_path)
-        image_id = os.path.splitext(image_name)[0]
+        image_id = image_id_for(image_path)
 
         # Check if the image ID already exists in the collection
-        existing_docs = self.collection.get(ids=[image_id])
-
-        if existing_docs['ids']:
+        if check_existing and self.collection.get(ids=[image_id], include=[])['ids']:
             # If a matching document exists, do not add it again
             print(f"Image {image_name} already exists in the collection. Skipping...")
             return
 
-        image_description = self.description.get_description(image_path)
-        image_metadata = self.meta_data.analyze_image(image_path=image_path, language="English")
+        thumbnails = self.thumbnails.submit(image_path)
+        if image_embedding is None:
+            image_embedding = self.clip_embedding.embed_image(image_path)
+
+        image_description, chroma_compatible_metadata = self.describe_image(image_path)
+        self._attach_content_hash(image_path, chroma_compatible_metadata, thumbnails)
+        self._add_image(image_path, image_embedding, image_description, chroma_compatible_metadata)
+
+    def _attach_content_hash(self, image_path, metadata, thumbnails):
+        """
+    Waits for an image's thumbnails and records the content hash their names are derived from.
+
+    If they cannot be generated the error is recorded as `thumbnail_error` instead, so the
+    backfill does not retry the image on every run.
+    """
+        try:
+            metadata["content_hash"] = thumbnails.result()
+            metadata.pop("thumbnail_error", None)
+        except Exception as e:
+            print(f"Error generating thumbnails for {os.path.basename(image_path)}: {e}")
+            metadata["thumbnail_error"] = str(e) or type(e).__name__
+
+    def describe_image(self, image_path: str):
+        """
+    Asks Gemini for the description and metadata of an image.
+
+    With config.INGEST_SINGLE_CALL both come from one structured-output request; if that
+    response cannot be parsed, the separate description and metadata requests are used instead.
+
+    Args:
+    - image_path (str): Path to the image file.
+
+    Returns:
+    - tuple: (description, metadata) with list fields joined into Chroma-compatible strings.
+    """
+        image_metadata = None
+        if config.INGEST_SINGLE_CALL:
+            try:
+                image_metadata = self.meta_data.describe_and_analyze_image(image_path=image_path, language="English")
+                image_description = image_metadata.pop("description")
+            except OutputParserException as e:
+                print(f"Could not parse combined analysis of {os.path.basename(image_path)} ({e}). Using two calls...")
+                image_metadata = None
+
+        if image_metadata is None:
+            image_description = self.description.get_description(image_path)
+            image_metadata = self.meta_data.analyze_image(image_path=image_path, language="English")
 
         # Convert list fields to comma-separated strings
         chroma_compatible_metadata = {
@@ -73,28 +186,136 @@ class ChromaDatabase:
             "potential_use_cases": ", ".join(image_metadata["potential_use_cases"]),
             "tags": ", ".join(image_metadata["tags"])
         }
+        return image_description, chroma_compatible_metadata
+
+    def _add_image(self, image_path, image_embedding, image_description, metadata):
+        """Queues one finished image record for the next bulk write."""
+        self.writes.add({
+            "image_path": image_path,
+            "id": image_id_for(image_path),
+            "embedding": image_embedding,
+            "document": image_description,
+            "metadata": metadata,
+        })
+
+    def _write_records(self, records):
+        """
+    Writes a batch of finished records with one upsert, then updates the vector backend and gallery index.
 
-        # Store the image embedding in Chroma DB
-        self.collection.add(
-            documents=[image_description],  # You can store any metadata, here we use the image name
-            metadatas=[chroma_compatible_metadata],
-            embeddings=[image_embedding],
-            ids=[image_id]  # Use the unique ID here
-        )
+    Upsert keeps a retried batch idempotent if an earlier attempt was partly written.
+    """
+        ids = [record["id"] for record in records]
+        embeddings = np.asarray([record["embedding"] for record in records])
+        metadatas = [record["metadata"] for record in records]
+        documents = [record["document"] for record in records]
+        self.collection.upsert(ids=ids, embeddings=embeddings.tolist(), metadatas=metadatas, documents=documents)
+        self.vector_backend.add(ids, embeddings)
+        self.gallery_index.add(ids, metadatas, documents)
+        # A re-ingested image must not be summarized from the description of its old content
+        description_cache = model_registry.get_description_cache()
+        for image_id in ids:
+            description_cache.pop(image_id)
+
+    def flush(self):
+        """Writes every buffered record to the collection now."""
+        self.writes.flush()
+
+    def close(self):
+        """Writes the remaining buffered records and stops the write buffer's timer."""
+        self.writes.close()
 
     def store_images_in_chroma(self, image_directory: str):
         """
-    This method iterates through all the images in the specified directory,
-    generates embeddings for each image using CLIP, and stores them in a Chroma vector database.
+    This method finds the images in the specified directory that are not stored yet,
+    generates embeddings for them in batches using CLIP, and stores them in a Chroma vector database.
+    Images already in the collection are never decoded, embedded or sent to Gemini.
     """
-        for image_filename in os.listdir(image_directory):
-            image_path = os.path.join(image_directory, image_filename)
+        image_paths = self.find_new_images(image_directory)
+        print(f"Found {len(image_paths)} new images in {image_directory}.")
+        self.store_images(image_paths)
+        self.backfill_thumbnails()
+        print("All images have been processed and stored in Chroma. Collection Name: ", self.collection_name)
 
-            if image_filename.endswith(('jpg', 'png', 'jpeg')):  # Check for valid image formats
+    def store_images(self, image_paths, flush=True):
+        """
+    Embeds, describes and stores the given images; images already in the collection are overwritten.
+
+    CLIP embeddings are computed in batches while the Gemini calls for several images run in parallel.
+
+    Args:
+    - image_paths (list[str]): Paths of the images to store.
+    - flush (bool): Write the buffered records before returning. Callers that pass False learn
+      the outcome of the buffered images from the `on_written` callback instead, which lets the
+      buffer fill up across calls.
+
+    Returns:
+    - dict: Error message by image path for every image that could not be stored, or, with
+      flush=False, that failed before reaching the write buffer.
+    """
+        failures = {}
+        # Gemini calls for several images run in parallel; the shared client keeps them within quota
+        max_in_flight = config.GEMINI_MAX_CONCURRENCY * 2
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=config.GEMINI_MAX_CONCURRENCY) as executor:
+            for image_path, image_embedding in self.clip_embedding.iter_image_embeddings(image_paths):
+                image_filename = os.path.basename(image_path)
+                if image_embedding is None:
+                    print(f"Could not decode {image_filename}. Skipping...")
+                    failures[image_path] = "Could not decode image"
+                    continue
                 print(f"Processing {image_filename}...")
-                self.store_image_in_db(image_path)
+                pending.append((
+                    image_path,
+                    image_embedding,
+                    executor.submit(self.describe_image, image_path),
+                    self.thumbnails.submit(image_path)
+                ))
+                if len(pending) >= max_in_flight:
+                    self._store_described_image(*pending.popleft(), failures=failures)
+            while pending:
+                self._store_described_image(*pending.popleft(), failures=failures)
+
+        if not flush:
+            return failures
+        # Callers treat the returned images as stored, so nothing may be left in the buffer
+        self.writes.flush()
+        for record, error in self.writes.take_failures():
+            failures[record["image_path"]] = error
+        return failures
+
+    def _store_described_image(self, image_path, image_embedding, described, thumbnails, failures):
+        """Waits for the Gemini results and thumbnails of one image and writes it to the collection."""
+        try:
+            image_description, metadata = described.result()
+            self._attach_content_hash(image_path, metadata, thumbnails)
+            self._add_image(image_path, image_embedding, image_description, metadata)
+        except Exception as e:
+            print(f"Error storing {os.path.basename(image_path)}: {e}")
+            failures[image_path] = str(e)
+
+    def backfill_thumbnails(self):
+        """
+    Generates thumbnails for images stored before derivatives existed and records their content hash.
 
-        print("All images have been processed and stored in Chroma. Collection Name: ", self.collection_name)
+    Images whose thumbnails failed before (`thumbnail_error`) are left alone. This scans the whole
+    gallery, so it runs once when the ingest worker starts and on demand, not after every batch.
+    """
+        records = [record for record in self.gallery_index.missing_thumbnails()
+                   if os.path.exists(record["metadata"].get("image_path", ""))]
+        if not records:
+            return
+        print(f"Generating thumbnails for {len(records)} existing images...")
+        futures = [(record, self.thumbnails.submit(record["metadata"]["image_path"])) for record in records]
+        ids, metadatas, documents = [], [], []
+        for record, thumbnails in futures:
+            metadata = dict(record["metadata"])
+            self._attach_content_hash(metadata["image_path"], metadata, thumbnails)
+            ids.append(record["id"])
+            metadatas.append(metadata)
+            documents.append(record["document"])
+        if ids:
+            self.collection.update(ids=ids, metadatas=metadatas)
+            self.gallery_index.add(ids, metadatas, documents)
 
     def reset_collection(self):
         """
@@ -106,10 +327,17 @@ class ChromaDatabase:
             print(f"Collection {self.collection_name} has been reset.")
             # Recreate the collection after deletion
             self.collection = self.client.get_or_create_collection(self.collection_name)
+            self.gallery_index.invalidate(self.collection)
+            self.vector_backend.reset(self.collection)
         else:
             print(f"Collection {self.collection_name} does not exist.")
 
 
+    def _query(self, query_embedding, top_k, query_text=None):
+        """Runs a query through the shared gallery database, fusing in lexical matches for `query_text`."""
+        gallery_db = model_registry.get_gallery_database(self.persist_directory, self.collection_name)
+        return gallery_db.search(query_embedding, top_k, query_texts=[query_text] if query_text else None)
+
     def query_with_text(self, query_text=None, top_k=5):
         """
             Queries a database using a text input by generating an embedding for the text
@@ -126,8 +354,7 @@ class ChromaDatabase:
         text_embedding = self.clip_embedding.embed_text(query_text)
 
         # Query the database based on text embedding
-        results = self.collection.query(query_embeddings=text_embedding, n_results=top_k)
-        return results['documents'], results['metadatas']
+        return self._query(text_embedding, top_k, query_text)
 
     def query_with_image(self, query_image=None, top_k=5):
         """
@@ -146,8 +373,7 @@ class ChromaDatabase:
         image_embedding = self.clip_embedding.embed_image(query_image)
 
         # Query the database based on image embedding
-        results = self.collection.query(query_embeddings=image_embedding, n_results=top_k)
-        return results['documents'], results['metadatas']
+        return self._query(image_embedding, top_k)
 
     def query_with_text_and_image(self, query_text=None, query_image=None, top_k=5):
 
@@ -169,6 +395,5 @@ class ChromaDatabase:
 
         combined_embeddings_mean = np.mean(combined_embeddings, axis=0)
 
-        results = self.collection.query(query_embeddings=combined_embeddings_mean , n_results=top_k)
-        return results['documents'], results['metadatas']
+        return self._query(combined_embeddings_mean, top_k, query_text)
 
@@ -0,0 +1,102 @@
+import threading
+import time
+from app.config import config
+
+
+class WriteBuffer:
+    """Thread-safe buffer that hands records to a bulk writer in batches.
+
+    Records are flushed when `batch_size` of them are waiting, when the oldest has waited
+    `max_delay` seconds (checked by a background thread), and on `flush`/`close`. A failed write is
+    not retried here, since only the caller knows how to report or requeue its records. With an
+    `on_written` callback every write is reported through it as it happens; otherwise failed records
+    and their error are kept for the caller to collect with `take_failures`.
+
+    Attributes:
+        writer (callable): Called with a list of records; must write all of them or raise.
+        batch_size (int): Records per write.
+        max_delay (float): Longest time in seconds a record may wait before it is written.
+        on_written (callable | None): Called with (records, error) after every write; error is None on success.
+    """
+
+    def __init__(self, writer, batch_size=config.CHROMA_WRITE_BATCH_SIZE,
+                 max_delay=config.CHROMA_WRITE_MAX_DELAY_SECONDS, on_written=None):
+        """Starts the time-limit thread.
+
+        Args:
+            writer (callable): Bulk writer taking a list of records.
+            batch_size (int, optional): Records per write. Defaults to config.CHROMA_WRITE_BATCH_SIZE.
+            max_delay (float, optional): Maximum wait in seconds. Defaults to config.CHROMA_WRITE_MAX_DELAY_SECONDS.
+            on_written (callable, optional): Outcome callback taking (records, error). Defaults to None.
+        """
+        self.writer = writer
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.on_written = on_written
+        self._records = []
+        self._oldest = None
+        self._failures = []
+        self._lock = threading.Lock()
+        # Held while a batch is written so flushes stay ordered and `flush` returns only once data is stored
+        self._write_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="chroma-write-buffer", daemon=True)
+        self._thread.start()
+
+    def add(self, record):
+        """Buffers one record, writing the batch if it is full."""
+        with self._lock:
+            if not self._records:
+                self._oldest = time.monotonic()
+            self._records.append(record)
+            full = len(self._records) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Writes every buffered record now, in batches of at most `batch_size`."""
+        with self._write_lock:
+            with self._lock:
+                records, self._records, self._oldest = self._records, [], None
+            for start in range(0, len(records), self.batch_size):
+                batch = records[start:start + self.batch_size]
+                error = None
+                try:
+                    self.writer(batch)
+                except Exception as e:
+                    print(f"Error writing {len(batch)} records: {e}")
+                    error = str(e)
+                if self.on_written is not None:
+                    self._report(batch, error)
+                elif error is not None:
+                    with self._lock:
+                        self._failures.extend((record, error) for record in batch)
+
+    def _report(self, batch, error):
+        try:
+            self.on_written(batch, error)
+        except Exception as e:
+            print(f"Error reporting {len(batch)} written records: {e}")
+
+    def take_failures(self):
+        """Returns and forgets the (record, error) pairs of failed writes."""
+        with self._lock:
+            failures, self._failures = self._failures, []
+        return failures
+
+    def _run(self):
+        while not self._closed.wait(min(1.0, self.max_delay)):
+            with self._lock:
+                due = self._oldest is not None and time.monotonic() - self._oldest >= self.max_delay
+            if due:
+                self.flush()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._records)
+
+    def close(self):
+        """Stops the time-limit thread and writes what is left."""
+        self._closed.set()
+        self._thread.join()
+        self.flush()
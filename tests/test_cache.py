@@ -0,0 +1,48 @@
+from app.utils.cache import LRUCache
+
+
+def sizeof(key, value):
+    return len(key) + len(value)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert "b" not in cache
+    assert [key for key, _ in cache.items()] == ["a", "c"]
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_sizeof_accounting_follows_puts_replacements_and_evictions():
+    cache = LRUCache(maxsize=2, sizeof=sizeof)
+    cache.put("a", "xxxx")
+    cache.put("bb", "yy")
+    assert cache.nbytes == 5 + 4
+
+    cache.put("a", "x")
+    assert cache.nbytes == 2 + 4
+
+    cache.put("ccc", "zzz")
+    assert "bb" not in cache
+    assert cache.nbytes == 2 + 6
+
+    cache.pop("a")
+    cache.pop("missing")
+    assert cache.nbytes == 6
+    assert cache.stats()["bytes"] == 6
+
+    cache.clear()
+    assert cache.nbytes == 0 and len(cache) == 0
+
+
+def test_stats_without_sizeof_have_no_bytes():
+    cache = LRUCache(maxsize=4)
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("b")
+
+    assert cache.stats() == {"size": 1, "maxsize": 4, "hits": 1, "misses": 1, "hit_rate": 0.5}
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import pytest
+
+pytest.importorskip("chromadb")
+
+from app.utils.utility import RelevantImagesStreamFilter  # noqa: E402
+
+
+def run_filter(chunks, prefix="Relevant images:"):
+    stream_filter = RelevantImagesStreamFilter(prefix)
+    shown = [stream_filter.feed(chunk) for chunk in chunks]
+    return shown, stream_filter.flush()
+
+
+def test_text_before_the_prefix_is_shown_and_the_list_is_hidden():
+    shown, rest = run_filter(["Two dogs.\n", "Relevant images: a.jpg, ", "b.jpg"])
+
+    assert "".join(shown) == "Two dogs.\n"
+    assert shown[2] == ""
+    assert rest == ""
+
+
+def test_prefix_split_across_chunks_is_never_shown():
+    shown, rest = run_filter(["Two dogs. Rele", "vant ima", "ges: a.jpg"])
+
+    assert "".join(shown) + rest == "Two dogs. "
+    assert not any("Rele" in part for part in shown)
+
+
+def test_text_that_only_looks_like_the_prefix_is_released():
+    shown, rest = run_filter(["Relevant", " facts follow."])
+
+    assert shown[0] == ""
+    assert "".join(shown) + rest == "Relevant facts follow."
+
+
+def test_flush_returns_held_back_text_when_the_prefix_never_arrives():
+    shown, rest = run_filter(["A short answer. Rel"])
+
+    # Everything that could still start the prefix (its length minus one) is held back
+    assert shown == ["A sh"]
+    assert rest == "ort answer. Rel"
+
+
+def test_format_sse():
+    pytest.importorskip("fastapi")
+    from app.api.chat import format_sse
+
+    assert format_sse("token", {"text": "hi\n"}) == 'event: token\ndata: {"text": "hi\\n"}\n\n'
+    assert json.loads(format_sse("done", {}).split("data: ")[1]) == {}
+
+
+class FakeSession:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def stream_response(self, human_message):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def make_gallery_chat(chunks):
+    pytest.importorskip("langchain")
+    from app.services.multimodal_chat import GalleryChat
+    from app.services.response_cache import ResponseCache
+    from app.utils.utility import ChatUtils
+
+    chat = object.__new__(GalleryChat)
+    chat.utils = ChatUtils()
+    chat.session = FakeSession(chunks)
+    chat.response_cache = ResponseCache()
+
+    async def plan(user_input, user_image):
+        return user_input, [], None
+
+    async def build(user_input, search_text, exclude_terms, query_embedding):
+        return "message", ["a dog on a beach"], ["app/static/image_data/a.jpg"]
+
+    async def summarize(relevant_paths, documents, image_paths):
+        return f"summary of {len(relevant_paths)}"
+
+    chat._plan_gallery_query = plan
+    chat._gallery_cache_scope = lambda user_input, user_image, exclude_terms: None
+    chat._build_gallery_message = build
+    chat._summarize_relevant = summarize
+    return chat
+
+
+def test_stream_chat_emits_tokens_then_images_description_and_done():
+    chat = make_gallery_chat(["Here is a ", "dog.\nRelevant im", "ages: app/static/image_data/a.jpg"])
+
+    async def collect():
+        return [event async for event in chat.stream_chat("show me dogs")]
+
+    events = asyncio.run(collect())
+    names = [name for name, _ in events]
+
+    assert names[-3:] == ["images", "description", "done"]
+    assert set(names[:-3]) == {"token"}
+    assert "".join(data["text"] for name, data in events if name == "token") == "Here is a dog.\n"
+    assert events[-3][1] == {"response": "Here is a dog.", "paths": ["../static/image_data/a.jpg"]}
+    assert events[-2][1] == {"combined_description": "summary of 1"}
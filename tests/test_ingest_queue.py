@@ -0,0 +1,115 @@
+import time
+from types import SimpleNamespace
+import pytest
+from app.services.ingest_queue import (
+    DONE, FAILED, PRIORITY_BACKFILL, SKIPPED, IngestQueue, IngestWorker
+)
+from app.utils.processes import try_lock_file
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = IngestQueue(path=str(tmp_path / "queue.sqlite3"), max_attempts=2)
+    yield queue
+    queue.close()
+
+
+def test_uploads_are_claimed_before_backfills(queue):
+    queue.enqueue(["app/static/image_data/old.jpg"], "backfill", PRIORITY_BACKFILL)
+    queue.enqueue(["app/static/image_data/new.jpg"])
+
+    assert [item["image_path"] for item in queue.claim(10)] == [
+        "app/static/image_data/new.jpg", "app/static/image_data/old.jpg"
+    ]
+    assert queue.claim(10) == []
+
+
+def test_active_image_is_queued_once_and_duplicates_follow_it(queue):
+    backfill = queue.enqueue(["app/static/image_data/cat.jpg"], "backfill", PRIORITY_BACKFILL)
+    upload = queue.enqueue(["app/static/image_data/cat.png", "app/static/image_data/dog.jpg"])
+
+    items = queue.claim(10)
+    assert [item["image_path"] for item in items] == ["app/static/image_data/cat.jpg", "app/static/image_data/dog.jpg"]
+    assert queue.job(upload)["status"] == "running"
+
+    for item in items:
+        queue.finish(item, DONE)
+    assert queue.job(backfill)["status"] == "completed"
+    assert queue.job(upload)["counts"][DONE] == 2
+
+
+def test_failed_items_are_retried_up_to_max_attempts(queue):
+    job_id = queue.enqueue(["app/static/image_data/bad.jpg"])
+
+    queue.finish(queue.claim(1)[0], FAILED, "boom")
+    assert queue.job(job_id)["status"] == "queued"
+
+    item = queue.claim(1)[0]
+    assert item["attempts"] == 2
+    queue.finish(item, FAILED, "boom again")
+    job = queue.job(job_id)
+    assert job["status"] == "failed"
+    assert job["errors"] == {"app/static/image_data/bad.jpg": "boom again"}
+    assert queue.claim(1) == []
+
+
+def test_recover_requeues_running_items(queue):
+    job_id = queue.enqueue(["app/static/image_data/a.jpg", "app/static/image_data/b.jpg"])
+    first, second = queue.claim(2)
+    queue.finish(first, SKIPPED, "Already in the collection with the same content")
+
+    assert queue.recover() == 1
+    assert [item["id"] for item in queue.claim(10)] == [second["id"]]
+    assert queue.job(job_id)["processed"] == 1
+
+
+def test_unknown_job_is_none(queue):
+    assert queue.job(12345) is None
+
+
+class OfflineWorker(IngestWorker):
+    """Worker whose database is a stub, so no models or collections are loaded."""
+
+    def _get_database(self):
+        return SimpleNamespace(
+            collection=None, vector_backend=SimpleNamespace(sync=lambda collection: None),
+            backfill_thumbnails=lambda: None, close=lambda: None
+        )
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_lock_file_is_exclusive(tmp_path):
+    path = str(tmp_path / "queue.lock")
+    held = try_lock_file(path)
+
+    assert held is not None
+    assert try_lock_file(path) is None
+    held.close()
+    reacquired = try_lock_file(path)
+    assert reacquired is not None
+    reacquired.close()
+
+
+def test_only_the_lock_holder_recovers_and_claims(queue):
+    job_id = queue.enqueue(["missing/in-progress.jpg"])
+    queue.claim(1)
+    live_owner = try_lock_file(queue.lock_path)
+
+    worker = OfflineWorker(queue, poll_seconds=0.02)
+    try:
+        time.sleep(0.2)
+        assert queue.job(job_id)["status"] == "running"
+
+        live_owner.close()
+        assert wait_for(lambda: queue.job(job_id)["status"] == "failed")
+        assert queue.job(job_id)["errors"] == {"missing/in-progress.jpg": "File not found"}
+    finally:
+        worker.close()
@@ -0,0 +1,43 @@
+from app.vectrodb_models.lexical_index import BM25Index
+
+
+def make_index():
+    index = BM25Index()
+    index.add("dog-beach", ["dog", "beach", "sand"])
+    index.add("dog-sofa", ["dog", "sofa"])
+    index.add("cat-sofa", ["cat", "sofa", "sofa"])
+    return index
+
+
+def test_rarer_and_more_frequent_terms_rank_higher():
+    results = make_index().search(["cat", "sofa"])
+
+    assert [doc_id for doc_id, _ in results] == ["cat-sofa", "dog-sofa"]
+    assert results[0][1] > results[1][1] > 0
+
+
+def test_unknown_tokens_and_empty_index_return_nothing():
+    assert make_index().search(["giraffe"]) == []
+    assert BM25Index().search(["dog"]) == []
+
+
+def test_allowed_and_excluded_ids_filter_results():
+    index = make_index()
+
+    assert [doc_id for doc_id, _ in index.search(["dog"], allowed_ids=["dog-sofa"])] == ["dog-sofa"]
+    assert [doc_id for doc_id, _ in index.search(["dog"], excluded_ids=["dog-beach"])] == ["dog-sofa"]
+    assert len(index.search(["dog", "sofa"], top_k=1)) == 1
+
+
+def test_add_replaces_and_remove_forgets_documents():
+    index = make_index()
+    index.add("dog-beach", ["cat"])
+    index.remove("dog-sofa")
+    index.remove("missing")
+
+    assert len(index) == 2
+    assert index.search(["dog"]) == []
+    assert {doc_id for doc_id, _ in index.search(["cat"])} == {"dog-beach", "cat-sofa"}
+
+    index.clear()
+    assert len(index) == 0
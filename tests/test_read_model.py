@@ -0,0 +1,71 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+
+from app.vectrodb_models.read_model import GalleryIndex  # noqa: E402
+
+
+class FakeCollection:
+    def __init__(self, records):
+        self.records = dict(records)
+        self.get_calls = []
+
+    def get(self, ids=None, include=None):
+        self.get_calls.append(ids)
+        ids = list(self.records) if ids is None else [image_id for image_id in ids if image_id in self.records]
+        return {
+            "ids": ids,
+            "metadatas": [self.records[image_id][0] for image_id in ids],
+            "documents": [self.records[image_id][1] for image_id in ids],
+        }
+
+
+def metadata(tags="", objects="", colors=""):
+    return {"image_path": "app/static/image_data/x.jpg", "tags": tags,
+            "detected_objects": objects, "color_palette": colors}
+
+
+@pytest.fixture
+def index():
+    return GalleryIndex(FakeCollection({
+        "a": (metadata(tags="dog, beach", colors="blue"), "a dog on a beach"),
+        "b": (metadata(tags="cat", objects="sofa"), "a cat on a sofa"),
+        "c": (metadata(tags="dog", objects="sofa"), "a dog on a sofa"),
+        "d": (metadata(tags="mountain", colors="blue"), "snowy mountains"),
+    }))
+
+
+def test_exclusion_only_filter_returns_no_allowed_list(index):
+    assert index.filter_ids(exclude_terms=["cats"]) == (None, ["b"])
+
+
+def test_filter_without_matches_removes_nothing(index):
+    assert index.filter_ids() == (None, None)
+    assert index.filter_ids(exclude_terms=["giraffe"]) == (None, None)
+
+
+def test_include_terms_intersect_and_subtract_exclusions(index):
+    assert index.filter_ids(include_terms=["dogs"]) == (["a", "c"], ["b", "d"])
+    assert index.filter_ids(include_terms=["dog", "sofa"]) == (["c"], ["a", "b", "d"])
+    assert index.filter_ids(include_terms=["blue"], exclude_terms=["beach"]) == (["d"], ["a", "b", "c"])
+    assert index.filter_ids(include_terms=["giraffe"]) == ([], ["a", "b", "c", "d"])
+
+
+def test_updates_move_term_postings(index):
+    index.filter_ids()
+    index.add(["b"], [metadata(tags="dog")], ["a dog"])
+    index.add(["e"], [metadata(tags="cat")], ["a cat"])
+
+    assert index.filter_ids(include_terms=["dog"])[0] == ["a", "b", "c"]
+    assert index.filter_ids(exclude_terms=["cat"]) == (None, ["e"])
+    assert index.known_terms(["Dogs", "sofas", "giraffe"]) == ["dog", "sofa"]
+
+
+def test_load_ids_fetches_only_missing_records(index):
+    index.filter_ids()
+    index.collection.records["e"] = (metadata(tags="bird"), "a bird")
+
+    assert index.load_ids(["a", "e", "zz"]) == 1
+    assert index.collection.get_calls[-1] == ["e", "zz"]
+    assert index.get_by_id("e")["tags"] == ["bird"]
@@ -0,0 +1,74 @@
+import time
+import pytest
+from app.services.response_cache import ResponseCache, is_personalized, normalize_question
+
+GENERAL = ("general",)
+
+
+def test_normalize_question_folds_only_case_spacing_and_end_punctuation():
+    assert normalize_question("Show me  Dogs?!") == "show me dogs"
+    assert normalize_question("what is 2+2") != normalize_question("what is 2*2")
+    assert normalize_question("dogs") != normalize_question("not dogs")
+
+
+def test_hit_requires_same_question_in_same_scope():
+    cache = ResponseCache(maxsize=10, ttl_seconds=60)
+    cache.put(GENERAL, "Who painted the Mona Lisa?", "Leonardo")
+
+    assert cache.get(GENERAL, "who painted the mona lisa") == "Leonardo"
+    assert cache.get(GENERAL, "Who painted the Last Supper?") is None
+    assert cache.get(("gallery", 1, ()), "Who painted the Mona Lisa?") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_long_questions_sharing_a_prefix_do_not_collide():
+    cache = ResponseCache(maxsize=10, ttl_seconds=60)
+    prefix = "tell me about " + "the very old and famous " * 20
+    cache.put(GENERAL, prefix + "castle", "castle answer")
+
+    assert cache.get(GENERAL, prefix + "bridge") is None
+
+
+def test_gallery_answers_are_scoped_by_version_and_filters():
+    cache = ResponseCache(maxsize=10, ttl_seconds=60)
+    cache.put(("gallery", 3, ()), "show me dogs", "v3")
+
+    assert cache.get(("gallery", 3, ()), "show me dogs") == "v3"
+    assert cache.get(("gallery", 4, ()), "show me dogs") is None
+    assert cache.get(("gallery", 3, ("cat",)), "show me dogs") is None
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = ResponseCache(maxsize=10, ttl_seconds=5)
+    cache.put(GENERAL, "question", "answer")
+
+    now[0] += 4
+    assert cache.get(GENERAL, "question") == "answer"
+    now[0] += 2
+    assert cache.get(GENERAL, "question") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(maxsize=2, ttl_seconds=60)
+    cache.put(GENERAL, "a", 1)
+    cache.put(GENERAL, "b", 2)
+    cache.get(GENERAL, "a")
+    cache.put(GENERAL, "c", 3)
+
+    assert cache.get(GENERAL, "b") is None
+    assert cache.get(GENERAL, "a") == 1
+    assert cache.get(GENERAL, "c") == 3
+
+
+@pytest.mark.parametrize("question, personalized", [
+    ("What did I say earlier?", True),
+    ("show my photos", True),
+    ("show them again", True),
+    ("What is the capital of France?", False),
+    ("show me dogs on a beach", False),
+])
+def test_is_personalized(question, personalized):
+    assert is_personalized(question) is personalized
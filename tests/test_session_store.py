@@ -0,0 +1,59 @@
+import time
+from types import SimpleNamespace
+from app.services.session_store import SESSION_BASE_BYTES, SessionStore
+
+
+def make_session(*messages):
+    history = [SimpleNamespace(content=message) for message in messages]
+    return SimpleNamespace(session=SimpleNamespace(history=history))
+
+
+def test_get_returns_live_session_and_none_for_unknown_id():
+    store = SessionStore(ttl_seconds=60, max_sessions=10)
+    session = make_session()
+    session_id = store.create(session)
+
+    assert store.get(session_id) is session
+    assert store.get("unknown") is None
+    assert not store.was_removed("unknown")
+
+
+def test_least_recently_used_session_is_evicted_when_full():
+    store = SessionStore(ttl_seconds=60, max_sessions=2)
+    first = store.create(make_session())
+    second = store.create(make_session())
+    store.get(first)  # second is now the least recently used
+    third = store.create(make_session())
+
+    assert store.get(second) is None
+    assert store.was_removed(second)
+    assert store.get(first) is not None and store.get(third) is not None
+    assert store.evicted == 1
+
+
+def test_idle_sessions_expire():
+    store = SessionStore(ttl_seconds=0.05, max_sessions=10)
+    session_id = store.create(make_session())
+    time.sleep(0.1)
+
+    assert store.get(session_id) is None
+    assert store.was_removed(session_id)
+    assert store.expired == 1
+
+
+def test_stats_lists_largest_sessions_first():
+    store = SessionStore(ttl_seconds=60, max_sessions=10)
+    store.create(make_session("hi"))
+    store.create(make_session("x" * 10000, "y" * 10000))
+    store.create(make_session())
+
+    stats = store.stats(top=2)
+
+    assert stats["sessions"] == 3
+    assert [entry["messages"] for entry in stats["largest_sessions"]] == [2, 1]
+    assert all("session_id" not in entry for entry in stats["largest_sessions"])
+    assert stats["largest_sessions"][0]["messages"] == 2
+    assert stats["max_session_bytes"] == stats["largest_sessions"][0]["estimated_bytes"] > SESSION_BASE_BYTES
+    assert stats["estimated_bytes"] == sum(
+        entry["estimated_bytes"] for entry in store.stats(top=10)["largest_sessions"]
+    )
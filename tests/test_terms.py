@@ -0,0 +1,35 @@
+import pytest
+from app.utils.terms import index_terms, normalize_term, tokenize
+
+
+@pytest.mark.parametrize("term, expected", [
+    ("Cats", "cat"),
+    ("beaches", "beach"),
+    ("puppies", "puppy"),
+    ("boxes", "box"),
+    ("glass", "glass"),
+    ("bus", "bus"),
+    ("Red Cars!", "red car"),
+    ("  ", ""),
+])
+def test_normalize_term(term, expected):
+    assert normalize_term(term) == expected
+
+
+def test_index_terms_covers_phrase_and_words():
+    assert index_terms("Golden Retrievers") == {"golden retriever", "golden", "retriever"}
+    assert index_terms("!!") == set()
+
+
+def test_tokenize_drops_stopwords_and_keeps_repeats():
+    assert tokenize("Show me photos of the dogs and dogs on a beach") == ["dog", "dog", "beach"]
+
+
+def test_extract_exclusions():
+    pytest.importorskip("chromadb")
+    from app.utils.utility import ChatUtils
+
+    query, excluded = ChatUtils().extract_exclusions("dogs but not cats")
+
+    assert query == "dogs"
+    assert excluded == ["cat"]
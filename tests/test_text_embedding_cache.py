@@ -0,0 +1,27 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from app.services.embeddings import TextEmbeddingCache  # noqa: E402
+
+
+def test_snapshot_round_trip_with_normalized_keys(tmp_path):
+    path = str(tmp_path / "text_cache.npz")
+    cache = TextEmbeddingCache(path=path, model_name="clip", backend="torch")
+    cache.put_embedding("Show me  Dogs", np.ones(4))
+    cache.save()
+
+    restored = TextEmbeddingCache(path=path, model_name="clip", backend="torch")
+    assert np.array_equal(restored.get_embedding("show me dogs"), np.ones(4, dtype=np.float32))
+
+
+@pytest.mark.parametrize("model_name, backend", [("other-clip", "torch"), ("clip", "onnx"), ("clip", "torch-int8")])
+def test_snapshot_of_another_model_or_backend_is_ignored(tmp_path, model_name, backend):
+    path = str(tmp_path / "text_cache.npz")
+    cache = TextEmbeddingCache(path=path, model_name="clip", backend="torch")
+    cache.put_embedding("dogs", np.ones(4))
+    cache.save()
+
+    assert len(TextEmbeddingCache(path=path, model_name=model_name, backend=backend)) == 0
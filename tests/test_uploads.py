@@ -0,0 +1,100 @@
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.utils.paths import is_image_file, list_image_files
+from app.utils.uploads import (
+    publish_upload, sniff_image_type, staged_upload_path, sweep_staged_uploads, target_filename
+)
+
+JPEG_HEADER = b"\xff\xd8\xff\xe0\x00\x10JFIF"
+PNG_HEADER = b"\x89PNG\r\n\x1a\n\x00\x00"
+
+
+@pytest.mark.parametrize("header, expected", [
+    (JPEG_HEADER, "jpg"),
+    (PNG_HEADER, "png"),
+    (b"GIF89a", None),
+    (b"", None),
+])
+def test_sniff_image_type(header, expected):
+    assert sniff_image_type(header) == expected
+
+
+@pytest.mark.parametrize("filename, extension, expected", [
+    ("IMG_1.JPG", "jpg", "IMG_1.jpg"),
+    ("photo.JPEG", "jpg", "photo.jpeg"),
+    ("scan.png", "png", "scan.png"),
+    ("scan.png", "jpg", "scan.jpg"),
+    ("notes.txt", "png", "notes.png"),
+    ("../../etc/pass wd.jpg", "jpg", "pass_wd.jpg"),
+    ("..hidden.png", "png", "hidden.png"),
+])
+def test_target_filename(filename, extension, expected):
+    assert target_filename(filename, extension) == expected
+
+
+def test_target_filename_without_stem_gets_a_random_one():
+    name = target_filename("", "png")
+    assert name.endswith(".png") and len(name) > len(".png")
+
+
+def test_image_files_are_listed_case_insensitively(tmp_path):
+    for name in ("b.JPG", "a.png", "c.jpeg", "notes.txt", ".x.part", ".hidden.jpg"):
+        (tmp_path / name).write_bytes(b"")
+
+    assert is_image_file("IMG_1.JPG")
+    assert [os.path.basename(path) for path in list_image_files(str(tmp_path))] == ["a.png", "b.JPG", "c.jpeg"]
+
+
+def test_sweep_removes_only_old_staged_uploads(tmp_path):
+    old_part = staged_upload_path(str(tmp_path))
+    new_part = staged_upload_path(str(tmp_path))
+    image = tmp_path / "kept.jpg"
+    for path in (old_part, new_part, image):
+        open(path, "wb").close()
+    an_hour_ago = time.time() - 3600
+    os.utime(old_part, (an_hour_ago, an_hour_ago))
+    os.utime(image, (an_hour_ago, an_hour_ago))
+
+    assert sweep_staged_uploads(str(tmp_path), max_age_seconds=60) == 1
+    assert not os.path.exists(old_part)
+    assert os.path.exists(new_part) and image.exists()
+
+
+
+def stage(directory, content):
+    path = staged_upload_path(str(directory))
+    with open(path, "wb") as staged_file:
+        staged_file.write(content)
+    return path, hashlib.sha256(content).hexdigest()
+
+
+def test_publish_keeps_names_apart_for_other_content(tmp_path):
+    pytest.importorskip("PIL")
+    (tmp_path / "cat.JPG").write_bytes(b"old content")
+
+    tmp, digest = stage(tmp_path, b"old content")
+    assert publish_upload(tmp, str(tmp_path), "cat.jpg", digest) == "cat.JPG"
+    assert not os.path.exists(tmp)
+
+    tmp, digest = stage(tmp_path, b"new content")
+    assert publish_upload(tmp, str(tmp_path), "cat.png", digest) == f"cat-{digest[:12]}.png"
+    assert (tmp_path / f"cat-{digest[:12]}.png").read_bytes() == b"new content"
+    assert (tmp_path / "cat.JPG").read_bytes() == b"old content"
+
+    tmp, digest = stage(tmp_path, b"dog")
+    assert publish_upload(tmp, str(tmp_path), "dog.jpg", digest) == "dog.jpg"
+
+
+def test_concurrent_uploads_of_one_name_never_overwrite(tmp_path):
+    pytest.importorskip("PIL")
+    contents = [f"content {index}".encode() for index in range(8)]
+    staged = [stage(tmp_path, content) for content in contents]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        names = list(executor.map(lambda item: publish_upload(item[0], str(tmp_path), "same.jpg", item[1]), staged))
+
+    assert len(set(names)) == len(contents)
+    assert sorted((tmp_path / name).read_bytes() for name in names) == sorted(contents)
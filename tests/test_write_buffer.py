@@ -0,0 +1,82 @@
+import threading
+import pytest
+from app.vectrodb_models.write_buffer import WriteBuffer
+
+
+class RecordingWriter:
+    def __init__(self, fail_on=()):
+        self.batches = []
+        self.fail_on = set(fail_on)
+        self.written = threading.Event()
+
+    def __call__(self, batch):
+        if self.fail_on & set(batch):
+            raise RuntimeError("write failed")
+        self.batches.append(list(batch))
+        self.written.set()
+
+
+@pytest.fixture
+def closing():
+    buffers = []
+    yield buffers.append
+    for buffer in buffers:
+        buffer.close()
+
+
+def test_full_batch_is_written_on_add(closing):
+    writer = RecordingWriter()
+    buffer = WriteBuffer(writer, batch_size=3, max_delay=60)
+    closing(buffer)
+
+    buffer.add(1)
+    buffer.add(2)
+    assert writer.batches == [] and len(buffer) == 2
+    buffer.add(3)
+    assert writer.batches == [[1, 2, 3]] and len(buffer) == 0
+
+
+def test_records_are_written_after_max_delay(closing):
+    writer = RecordingWriter()
+    buffer = WriteBuffer(writer, batch_size=100, max_delay=0.05)
+    closing(buffer)
+
+    buffer.add("a")
+    assert writer.written.wait(2)
+    assert writer.batches == [["a"]]
+
+
+def test_close_writes_what_is_left():
+    writer = RecordingWriter()
+    buffer = WriteBuffer(writer, batch_size=5, max_delay=60)
+    for record in (1, 2, 3):
+        buffer.add(record)
+
+    buffer.close()
+    assert writer.batches == [[1, 2, 3]]
+
+
+def test_failed_writes_are_kept_for_the_caller(closing):
+    writer = RecordingWriter(fail_on={"bad"})
+    buffer = WriteBuffer(writer, batch_size=10, max_delay=60)
+    closing(buffer)
+
+    buffer.add("bad")
+    buffer.add("other")
+    buffer.flush()
+    assert buffer.take_failures() == [("bad", "write failed"), ("other", "write failed")]
+    assert buffer.take_failures() == []
+
+
+def test_on_written_reports_every_write(closing):
+    writer = RecordingWriter(fail_on={"bad"})
+    outcomes = []
+    buffer = WriteBuffer(writer, batch_size=2, max_delay=60,
+                         on_written=lambda records, error: outcomes.append((records, error)))
+    closing(buffer)
+
+    for record in ("a", "b", "bad"):
+        buffer.add(record)
+    buffer.flush()
+    assert outcomes == [(["a", "b"], None), (["bad"], "write failed")]
+    assert buffer.take_failures() == []